@@ -6,32 +6,15 @@ Main application factory and configuration
 from flask import Flask, session, g, request
 from datetime import timedelta
 import os
-from database import (
-    get_db,
-    init_db,
-    ensure_indexes_and_normalize,
-    ensure_audio_path_column,
-    ensure_drive_file_id_column,
-    ensure_chart_path_column,
-    ensure_repertoire_id_column,
-    ensure_release_date_column,
-    ensure_repertoire_sort_order_column,
-    ensure_repertoire_folder_columns,
-    ensure_performance_hints_column,
-    ensure_sync_history_table,
-    ensure_practice_targets_not_below_count,
-    ensure_repertoire_notes_column,
-    ensure_practice_date_log_table,
-    ensure_duration_column,
-    ensure_repertoire_copy_tracking_columns,
-    ensure_users_table,
-    ensure_remember_tokens_table,
-    ensure_default_admin,
-    ensure_repertoire_user_column,
-    ensure_song_user_column,
-    ensure_archive_repertoires,
-    ensure_settings_table,
-)
+from database import release_db
+from migrations import migrate
+from services.auto_bump import run_auto_bump
+from services.song_order import rebalance_crowded_repertoires
+from services.practice import prune_practice_events
+from utils.data_version import prune_song_change_log
+from services.jobs import sweep_jobs
+from services.chart_store import gc_charts
+from services.scheduler import register_periodic_task, start_scheduler
 
 # Import blueprints
 from blueprints.auth import auth, attach_current_user
@@ -41,6 +24,8 @@ from blueprints.skills import skills
 from blueprints.repertoires import repertoires_bp
 from blueprints.settings import settings_bp
 from blueprints.dashboard import dashboard_bp
+from blueprints.admin import admin_bp
+from blueprints.jobs import jobs_bp
 
 
 def create_app():
@@ -58,12 +43,8 @@ def create_app():
     
     # ==================== INITIALIZATION ====================
     
-    # Initialize database on first run
-    if not os.path.exists('songs.db'):
-        init_db()
-    
-    # Ensure all database constraints and columns exist
-    _ensure_database_schema(app)
+    # Create or upgrade the schema; a no-op when the database is already current
+    migrate()
     
     # ==================== REGISTER BLUEPRINTS ====================
     app.register_blueprint(auth, url_prefix='')
@@ -73,6 +54,48 @@ def create_app():
     app.register_blueprint(repertoires_bp, url_prefix='')
     app.register_blueprint(settings_bp, url_prefix='')
     app.register_blueprint(dashboard_bp, url_prefix='')
+    app.register_blueprint(admin_bp, url_prefix='')
+    app.register_blueprint(jobs_bp, url_prefix='')
+    
+    # ==================== BACKGROUND TASKS ====================
+    
+    # Practice targets are auto-bumped here instead of on every song list read
+    register_periodic_task(
+        'auto_bump_targets',
+        int(os.getenv('AUTO_BUMP_INTERVAL_SECONDS', '3600')),
+        run_auto_bump
+    )
+    # Sparse song order keys are respaced once moves have crowded them together
+    register_periodic_task(
+        'rebalance_song_order',
+        int(os.getenv('SONG_REBALANCE_INTERVAL_SECONDS', '3600')),
+        rebalance_crowded_repertoires
+    )
+    # Idempotency keys of batched practice events only need to outlive client retries
+    register_periodic_task(
+        'prune_practice_events',
+        int(os.getenv('PRACTICE_EVENT_PRUNE_INTERVAL_SECONDS', '86400')),
+        prune_practice_events
+    )
+    # Delta sync tombstones; clients older than the window get the full song list
+    register_periodic_task(
+        'prune_song_change_log',
+        int(os.getenv('SONG_CHANGE_LOG_PRUNE_INTERVAL_SECONDS', '86400')),
+        prune_song_change_log
+    )
+    # Jobs left unfinished by a restarted worker are marked failed; old ones are dropped
+    register_periodic_task(
+        'sweep_jobs',
+        int(os.getenv('JOB_SWEEP_INTERVAL_SECONDS', '300')),
+        sweep_jobs
+    )
+    # Charts no song references any more (undone syncs, replaced charts) are removed
+    register_periodic_task(
+        'gc_charts',
+        int(os.getenv('CHART_GC_INTERVAL_SECONDS', '86400')),
+        gc_charts
+    )
+    start_scheduler()
     
     # ==================== REQUEST HANDLERS ====================
     
@@ -83,129 +106,12 @@ def create_app():
     
     @app.teardown_appcontext
     def close_db(error):
-        """Close database connection at end of request."""
-        db = g.pop('db', None)
-        if db is not None:
-            db.close()
+        """Return the request's database connection to the pool."""
+        release_db(g.pop('db', None))
     
     return app
 
 
-def _ensure_database_schema(app):
-    """Ensure all database migrations and schema updates are applied."""
-    
-    with app.app_context():
-        try:
-            ensure_users_table()
-        except Exception:
-            pass
-        
-        try:
-            ensure_remember_tokens_table()
-        except Exception:
-            pass
-        
-        try:
-            admin_user_id = ensure_default_admin()
-        except Exception:
-            admin_user_id = None
-        
-        try:
-            ensure_repertoire_user_column(admin_user_id or ensure_default_admin())
-        except Exception:
-            pass
-        
-        try:
-            ensure_song_user_column(admin_user_id or ensure_default_admin())
-        except Exception:
-            pass
-        
-        try:
-            ensure_audio_path_column()
-        except Exception:
-            pass
-        
-        try:
-            ensure_drive_file_id_column()
-        except Exception:
-            pass
-        
-        try:
-            ensure_chart_path_column()
-        except Exception:
-            pass
-        
-        try:
-            ensure_repertoire_id_column()
-        except Exception:
-            pass
-        
-        try:
-            ensure_release_date_column()
-        except Exception:
-            pass
-        
-        try:
-            ensure_repertoire_sort_order_column()
-        except Exception:
-            pass
-        
-        try:
-            ensure_repertoire_folder_columns()
-        except Exception:
-            pass
-        
-        try:
-            ensure_performance_hints_column()
-        except Exception:
-            pass
-
-        try:
-            ensure_sync_history_table()
-        except Exception:
-            pass
-        
-        try:
-            ensure_repertoire_notes_column()
-        except Exception:
-            pass
-        
-        try:
-            ensure_indexes_and_normalize()
-        except Exception:
-            pass
-        
-        try:
-            ensure_practice_targets_not_below_count()
-        except Exception:
-            pass
-        
-        try:
-            ensure_practice_date_log_table()
-        except Exception:
-            pass
-        
-        try:
-            ensure_duration_column()
-        except Exception:
-            pass
-        
-        try:
-            ensure_repertoire_copy_tracking_columns()
-        except Exception:
-            pass
-        
-        try:
-            ensure_archive_repertoires()
-        except Exception:
-            pass
-
-        try:
-            ensure_settings_table()
-        except Exception:
-            pass
-
-
 # Create app instance for direct execution
 app = create_app()
 
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark the dashboard's per-day practice totals on a user with years of history.
+Compares the legacy practice_date_log/songs join against practice_daily_rollup.
+Usage: python -m benchmarks.dashboard_rollup [history_days]
+"""
+
+import sys
+import time
+
+from benchmarks.synthetic import use_temp_database, build_schema, populate_user
+
+
+def legacy_daily_totals(cursor, user_id, start_date, repertoire_id=None):
+    """Previous behaviour: aggregate the log joined to songs on every request."""
+    rep = 'AND s.repertoire_id = ?' if repertoire_id else ''
+    params = (user_id, start_date) + ((repertoire_id,) if repertoire_id else ())
+    return cursor.execute(f'''
+        SELECT pl.practice_date,
+               SUM(COALESCE(s.duration, 180) * pl.practice_count) AS total_seconds,
+               SUM(pl.practice_count) AS session_count
+        FROM practice_date_log pl
+        JOIN songs s ON pl.song_id = s.id
+        WHERE pl.user_id = ?
+        AND pl.practice_date >= ?
+        {rep}
+        GROUP BY pl.practice_date
+        ORDER BY pl.practice_date
+    ''', params).fetchall()
+
+
+def measure(label, fn, repeat=5):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    print(f'{label:<16} best: {min(timings) * 1000:8.2f} ms')
+    return [tuple(row) for row in result]
+
+
+def main():
+    history_days = int(sys.argv[1]) if len(sys.argv) > 1 else 4 * 365
+    path = use_temp_database()
+    user_id = build_schema()
+    repertoire_ids = populate_user(user_id, song_count=2000, history_days=history_days)
+    print(f'Synthetic database: {path} (2000 songs, {history_days} days of practice history)')
+
+    import database
+    from services.practice_rollup import daily_totals, rebuild_practice_rollup
+    with database.get_db() as conn:
+        cursor = conn.cursor()
+        start = time.perf_counter()
+        written = rebuild_practice_rollup(cursor)
+        print(f'Rollup rebuild: {written} rows in {(time.perf_counter() - start) * 1000:.2f} ms')
+
+        for start_date in ('0000-01-01', None):
+            # None = last twelve weeks, the activity heatmap default
+            if start_date is None:
+                start_date = cursor.execute("SELECT date('now', '-84 days')").fetchone()[0]
+            for repertoire_id in (None, repertoire_ids[0]):
+                print(f'since {start_date} / {"repertoire" if repertoire_id else "all songs"}')
+                before = measure('  before', lambda: legacy_daily_totals(
+                    cursor, user_id, start_date, repertoire_id))
+                after = measure('  after', lambda: daily_totals(
+                    cursor, user_id, start_date, repertoire_id))
+                print('  results identical:', before == after)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark GET /api/dashboard/summary aggregates on a user with years of practice history.
+Compares the legacy seven-query summary against the single CTE statement.
+Usage: python -m benchmarks.dashboard_summary [history_days]
+"""
+
+import sys
+import time
+
+from benchmarks.synthetic import use_temp_database, build_schema, populate_user, QueryCounter
+
+
+def legacy_summary(cursor, user_id, start_date, end_date, repertoire_id=None):
+    """Previous behaviour: one aggregate query per figure."""
+    rep = 'AND s.repertoire_id = ?' if repertoire_id else ''
+    rep_params = (repertoire_id,) if repertoire_id else ()
+    period = (user_id, start_date, end_date) + rep_params
+    join = 'JOIN songs s ON pl.song_id = s.id' if repertoire_id else ''
+    return {
+        'total_seconds': cursor.execute(f'''
+            SELECT COALESCE(SUM(s.duration * pl.practice_count), 0) FROM practice_date_log pl
+            JOIN songs s ON pl.song_id = s.id
+            WHERE pl.user_id = ? AND pl.practice_date >= ? AND pl.practice_date <= ? {rep}
+            AND s.duration IS NOT NULL
+        ''', period).fetchone()[0],
+        'songs_practiced': cursor.execute(f'''
+            SELECT COUNT(DISTINCT pl.song_id) FROM practice_date_log pl {join}
+            WHERE pl.user_id = ? AND pl.practice_date >= ? AND pl.practice_date <= ? {rep}
+        ''', period).fetchone()[0],
+        'practice_sessions': cursor.execute(f'''
+            SELECT COALESCE(SUM(pl.practice_count), 0) FROM practice_date_log pl {join}
+            WHERE pl.user_id = ? AND pl.practice_date >= ? AND pl.practice_date <= ? {rep}
+        ''', period).fetchone()[0],
+        'skills_mastered': cursor.execute(f'''
+            SELECT COUNT(*) FROM song_skills ss JOIN songs s ON ss.song_id = s.id
+            WHERE s.user_id = ? AND ss.is_mastered = 1 {rep}
+        ''', (user_id,) + rep_params).fetchone()[0],
+        'total_skills': cursor.execute(f'''
+            SELECT COUNT(*) FROM song_skills ss JOIN songs s ON ss.song_id = s.id
+            WHERE s.user_id = ? {rep}
+        ''', (user_id,) + rep_params).fetchone()[0],
+        'songs_completed': cursor.execute(f'''
+            SELECT COUNT(*) FROM songs s
+            WHERE s.user_id = ? AND s.practice_target > 0 AND s.practice_count >= s.practice_target {rep}
+        ''', (user_id,) + rep_params).fetchone()[0],
+        'total_songs': cursor.execute(f'''
+            SELECT COUNT(*) FROM songs s WHERE s.user_id = ? {rep}
+        ''', (user_id,) + rep_params).fetchone()[0],
+    }
+
+
+def measure(label, fn, conn, repeat=5):
+    counter = QueryCounter()
+    conn.set_trace_callback(counter)
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    conn.set_trace_callback(None)
+    print(f'{label:<16} queries/call: {counter.count // repeat:>3}   best: {min(timings) * 1000:8.2f} ms')
+    return result
+
+
+def main():
+    history_days = int(sys.argv[1]) if len(sys.argv) > 1 else 4 * 365
+    path = use_temp_database()
+    user_id = build_schema()
+    repertoire_ids = populate_user(user_id, song_count=2000, history_days=history_days)
+    print(f'Synthetic database: {path} (2000 songs, {history_days} days of practice history)')
+
+    import database
+    from blueprints.dashboard import _get_date_range, _summary_counts
+    with database.get_db() as conn:
+        cursor = conn.cursor()
+        log_rows = cursor.execute('SELECT COUNT(*) FROM practice_date_log').fetchone()[0]
+        print(f'practice_date_log rows: {log_rows}')
+        for period in ('month', 'all'):
+            start_date, end_date = _get_date_range(period)
+            for repertoire_id in (None, repertoire_ids[0]):
+                scope = f'{period}/{"repertoire" if repertoire_id else "all songs"}'
+                print(scope)
+                before = measure('  before', lambda: legacy_summary(
+                    cursor, user_id, start_date, end_date, repertoire_id), conn)
+                after = measure('  after', lambda: _summary_counts(
+                    cursor, user_id, start_date, end_date, repertoire_id), conn)
+                print('  results identical:', before == after)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark linking song titles to file names: the pairwise substring scan the
+folder sync used to do against services.matcher.MatchIndex.
+Usage: python -m benchmarks.fuzzy_match [songs] [files] [--sample N]
+  The pairwise scan is timed on a sample of songs (default 200) and
+  extrapolated; --sample 0 runs it over every song.
+"""
+
+import random
+import sys
+import time
+
+from services.matcher import MatchIndex, normalize
+
+WORDS = (
+    'love night heart dance fire rain blue road home dream light time summer girl baby '
+    'river moon star city wild gold rock soul street angel shadow sky sweet money king '
+    'queen train song world free fall rise run back down high lonely little crazy '
+    'hotel paradise thunder highway island desert ocean winter morning midnight'
+).split()
+ARTISTS = ['The %s %ss' % (a.title(), b.title()) for a, b in zip(WORDS[::2], WORDS[1::2])]
+
+
+def generate(song_count, file_count, seed=7):
+    """Songs as (title, artist); files as names without extension, some linked to songs."""
+    rng = random.Random(seed)
+    songs = []
+    for i in range(song_count):
+        title = ' '.join(rng.choice(WORDS).title() for _ in range(rng.randint(1, 4))) + f' {i}'
+        songs.append((title, rng.choice(ARTISTS)))
+    files = []
+    for title, artist in songs:
+        if len(files) < file_count // 2 and rng.random() < 0.8:
+            pattern = rng.choice(['{t}', '{a} - {t}', '{y} - {t} - {a}', '{t} (Live)', '{t} chords'])
+            files.append(pattern.format(t=title, a=artist, y=rng.randint(1960, 2020)))
+    while len(files) < file_count:
+        files.append(' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 6))) + f' take {len(files)}')
+    rng.shuffle(files)
+    return songs, files
+
+
+def pairwise(songs, files):
+    """The old sync step: first file whose lowercased name contains, or is part of, the title."""
+    lowered = [name.lower() for name in files]
+    found = {}
+    for title, artist in songs:
+        song_title, song_artist = title.lower(), artist.lower()
+        for name, original in zip(lowered, files):
+            if song_title in name or name in song_title or f'{song_artist} - {song_title}' in name:
+                found[title] = original
+                break
+    return found
+
+
+def indexed(songs, index):
+    found = {}
+    for title, _ in songs:
+        match = index.best_match(title)
+        if match:
+            found[title] = match.value
+    return found
+
+
+def main():
+    args = sys.argv[1:]
+    sample = 200
+    if '--sample' in args:
+        position = args.index('--sample')
+        sample = int(args[position + 1])
+        del args[position:position + 2]
+    song_count = int(args[0]) if args else 5000
+    file_count = int(args[1]) if len(args) > 1 else 20000
+
+    songs, files = generate(song_count, file_count)
+    print(f'{song_count} songs x {file_count} file names')
+
+    start = time.perf_counter()
+    index = MatchIndex((name, name) for name in files)
+    build = time.perf_counter() - start
+    start = time.perf_counter()
+    found = indexed(songs, index)
+    lookup = time.perf_counter() - start
+    print(f'indexed   build: {build * 1000:8.1f} ms   lookups: {lookup * 1000:8.1f} ms   '
+          f'matched: {len(found)}   index size: {len(index)}')
+
+    scanned = songs if sample <= 0 else songs[:sample]
+    start = time.perf_counter()
+    old = pairwise(scanned, files)
+    elapsed = (time.perf_counter() - start) * len(songs) / len(scanned)
+    note = '' if len(scanned) == len(songs) else f' (extrapolated from {len(scanned)} songs)'
+    print(f'pairwise  total: {elapsed * 1000:8.1f} ms{note}')
+    print(f'speedup: {elapsed / (build + lookup):.0f}x')
+
+    # Where both find something, the indexed match should name the same song
+    same = sum(1 for title in old if title in found and normalize(title) in normalize(found[title]))
+    print(f'sample agreement: pairwise matched {len(old)}/{len(scanned)}, '
+          f'indexed matched {sum(1 for title, _ in scanned if title in found)}/{len(scanned)}, '
+          f'indexed match contains the title for {same}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark skill loading for GET /api/songs on a synthetic 5k-song user.
+Compares the legacy per-song skills query against the set-based loader.
+Usage: python -m benchmarks.get_songs [song_count]
+"""
+
+import sys
+import time
+
+from benchmarks.synthetic import use_temp_database, build_schema, populate_user, QueryCounter
+
+
+def legacy_skills(cursor, songs):
+    """Previous behaviour: one skills LEFT JOIN song_skills query per song."""
+    result = {}
+    for song in songs:
+        skills = cursor.execute('''
+            SELECT s.id, s.name, ss.is_mastered
+            FROM skills s
+            LEFT JOIN song_skills ss ON s.id = ss.skill_id AND ss.song_id = ?
+            ORDER BY s.id
+        ''', (song['id'],)).fetchall()
+        result[song['id']] = [dict(skill) for skill in skills]
+    return result
+
+
+def set_based_skills(cursor, songs, user_id):
+    """Current behaviour: all skills for the user's songs in two queries."""
+    from blueprints.songs import load_song_skills, build_song_skills
+    all_skills, mastery = load_song_skills(cursor, user_id)
+    return {song['id']: build_song_skills(all_skills, mastery.get(song['id'], {})) for song in songs}
+
+
+def measure(label, fn, conn, repeat=3):
+    counter = QueryCounter()
+    conn.set_trace_callback(counter)
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    conn.set_trace_callback(None)
+    print(f'{label:<12} queries/call: {counter.count // repeat:>6}   best: {min(timings) * 1000:8.1f} ms')
+    return result
+
+
+def main():
+    song_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    path = use_temp_database()
+    user_id = build_schema()
+    populate_user(user_id, song_count=song_count)
+    print(f'Synthetic database: {path} ({song_count} songs)')
+
+    import database
+    with database.get_db() as conn:
+        cursor = conn.cursor()
+        songs = cursor.execute(
+            'SELECT * FROM songs WHERE user_id = ? ORDER BY repertoire_id, song_number ASC', (user_id,)
+        ).fetchall()
+
+        before = measure('before', lambda: legacy_skills(cursor, songs), conn)
+        after = measure('after', lambda: set_based_skills(cursor, songs, user_id), conn)
+
+    print('payloads identical:', before == after)
+
+    # End-to-end latency of the endpoint itself
+    from app import create_app
+    app = create_app()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+    timings = []
+    for _ in range(3):
+        start = time.perf_counter()
+        response = client.get('/api/songs')
+        timings.append(time.perf_counter() - start)
+    print(f'GET /api/songs: status {response.status_code}, {len(response.json)} songs, best {min(timings) * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark the folder sync job against its folder manifest: a first sync of a
+generated folder, a second one (which re-checks the songs the first changed),
+a sync with nothing changed, one after a few files were added or touched, and
+a full rescan with the manifest cleared (what every sync did before the manifest).
+The folders also hold alternate takes that never become songs, and the
+repertoire has songs no file matches, as real libraries do.
+Usage: python -m benchmarks.incremental_sync [audio files] [sheet files]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import use_temp_database, build_schema
+from benchmarks.sync_durations import write_mp3
+
+
+def generate_folders(root, audio_count, sheet_count):
+    mp3_folder = os.path.join(root, 'mp3')
+    sheet_folder = os.path.join(root, 'sheets')
+    os.makedirs(mp3_folder)
+    os.makedirs(sheet_folder)
+    for i in range(audio_count):
+        write_mp3(os.path.join(mp3_folder, f'Track {i:05d} - Bench Artist.mp3'), 1)
+        # Alternate takes: same title, so they stay unlinked
+        if i % 5 == 0:
+            write_mp3(os.path.join(mp3_folder, f'Track {i:05d} - Live.mp3'), 1)
+    for i in range(sheet_count):
+        with open(os.path.join(sheet_folder, f'Track {i:05d} chords.pdf'), 'wb') as f:
+            f.write(b'%PDF-1.4\n')
+    return mp3_folder, sheet_folder
+
+
+def main():
+    args = sys.argv[1:]
+    audio_count = int(args[0]) if args else 1500
+    sheet_count = int(args[1]) if len(args) > 1 else 500
+
+    path = use_temp_database()
+    user_id = build_schema()
+    root = tempfile.mkdtemp(prefix='songtrainer-sync-')
+    mp3_folder, sheet_folder = generate_folders(root, audio_count, sheet_count)
+    print(f'Synthetic database: {path}')
+    print(f'Generated {audio_count} MP3s and {sheet_count} sheets in {root}')
+
+    # The chart store lives under the working directory, fixed when it is imported
+    os.chdir(root)
+    import database
+    import migrations
+    migrations.migrate()
+    from services.folder_sync import SYNC_JOB, clear_manifest
+    from services.jobs import submit_job, wait_for_job, job_payload
+
+    with database.get_db() as db:
+        repertoire_id = db.execute(
+            '''INSERT INTO repertoires (name, user_id, mp3_folder, sheet_folder, date_created)
+               VALUES (?, ?, ?, ?, ?)''',
+            ('Incremental sync bench', user_id, mp3_folder, sheet_folder, time.strftime('%Y-%m-%dT%H:%M:%S'))
+        ).lastrowid
+        db.executemany(
+            '''INSERT INTO songs (title, artist, song_number, repertoire_id, user_id, priority,
+                                  practice_count, practice_target, date_added)
+               VALUES (?, ?, ?, ?, ?, 'mid', 0, 1, ?)''',
+            [(f'Unmatched Song {i}', 'Nobody', (i + 1) * database.SONG_NUMBER_GAP, repertoire_id, user_id,
+              time.strftime('%Y-%m-%dT%H:%M:%S')) for i in range(audio_count // 5)]
+        )
+
+    def run(label):
+        start = time.perf_counter()
+        job_id = submit_job(SYNC_JOB, user_id, repertoire_id, {'repertoire_id': repertoire_id})
+        wait_for_job(job_id)
+        elapsed = time.perf_counter() - start
+        with database.get_db() as db:
+            job = job_payload(db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone())
+        stats = job['progress']
+        print(f'{label:<12} {elapsed * 1000:9.1f} ms   changed: {stats["debug"]["mp3_files_changed"]:>5} audio '
+              f'{stats["debug"]["sheet_files_changed"]:>4} sheets   added: {stats["songs_added"]:>5}   '
+              f'linked: {stats["mp3_linked"]:>5} audio {stats["sheets_linked"]:>4} sheets   {job["status"]}')
+        return elapsed
+
+    run('first sync')
+    run('second sync')
+    unchanged = run('unchanged')
+
+    for i in range(5):
+        write_mp3(os.path.join(mp3_folder, f'New Track {i} - Bench Artist.mp3'), 1)
+    for i in range(5):
+        os.utime(os.path.join(mp3_folder, f'Track {i:05d} - Bench Artist.mp3'))
+    run('10 changed')
+
+    with database.get_db() as db:
+        clear_manifest(db.cursor(), repertoire_id)
+    rescan = run('full rescan')
+    print(f'unchanged folder vs full rescan: {rescan / unchanged:.0f}x faster')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark a rehearsal's worth of practice taps through the API.
+Compares one POST /api/songs/<id>/practice per tap against a single
+POST /api/practice/batch carrying all of them.
+Usage: python -m benchmarks.practice_batch [taps]
+"""
+
+import sys
+import time
+
+from benchmarks.synthetic import use_temp_database, build_schema, populate_user
+
+
+def measure(label, fn, conn):
+    statements = []
+    changes_before = conn.total_changes
+    conn.set_trace_callback(statements.append)
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    conn.set_trace_callback(None)
+    commits = sum(1 for sql in statements if sql.strip().upper() == 'COMMIT')
+    print(f'{label:<8} statements: {len(statements):>5}   commits: {commits:>4}   '
+          f'rows written: {conn.total_changes - changes_before:>5}   time: {elapsed * 1000:8.1f} ms')
+
+
+def main():
+    taps = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    path = use_temp_database()
+    user_id = build_schema()
+    repertoire_id = populate_user(user_id, song_count=300, repertoire_count=1, history_days=90)[0]
+    print(f'Synthetic database: {path} ({taps} taps over one 300-song setlist)')
+
+    import database
+    import migrations
+    migrations.migrate()
+    from app import create_app
+    app = create_app()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+
+    with database.get_db() as conn:
+        song_ids = [row['id'] for row in conn.execute(
+            'SELECT id FROM songs WHERE repertoire_id = ? ORDER BY song_number LIMIT 20', (repertoire_id,)
+        ).fetchall()]
+    tapped = [song_ids[i % len(song_ids)] for i in range(taps)]
+
+    # One pooled connection, so both runs are traced on it
+    pool = database.get_pool()
+    pool.close_all()
+    pool.max_size = 1
+    conn = pool.acquire()
+    pool.release(conn)
+
+    def single_requests():
+        for song_id in tapped:
+            client.post(f'/api/songs/{song_id}/practice')
+
+    def one_batch():
+        client.post('/api/practice/batch', json={'events': [
+            {'song_id': song_id, 'timestamp': None, 'client_event_id': f'bench-{i}'}
+            for i, song_id in enumerate(tapped)
+        ]})
+
+    measure('before', single_requests, conn)
+    measure('after', one_batch, conn)
+
+
+if __name__ == '__main__':
+    main()
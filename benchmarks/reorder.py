@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Benchmark a single drag-and-drop move in one synthetic setlist.
+Compares the legacy two-pass renumbering against sparse sort keys.
+Usage: python -m benchmarks.reorder [songs_per_setlist]
+"""
+
+import sys
+import time
+
+from benchmarks.synthetic import use_temp_database, build_schema, populate_user
+
+
+def legacy_reorder(cursor, ordered_ids):
+    """Previous behaviour: every song rewritten to base + i, then to i."""
+    base = 100000
+    for i, sid in enumerate(ordered_ids, start=1):
+        cursor.execute('UPDATE songs SET song_number = ? WHERE id = ?', (base + i, sid))
+    for i, sid in enumerate(ordered_ids, start=1):
+        cursor.execute('UPDATE songs SET song_number = ? WHERE id = ?', (i, sid))
+
+
+def measure(label, fn, conn):
+    before = conn.total_changes
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    conn.rollback()
+    print(f'{label:<8} rows written: {conn.total_changes - before:>5}   time: {elapsed * 1000:8.2f} ms')
+
+
+def main():
+    per_setlist = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    path = use_temp_database()
+    user_id = build_schema()
+    repertoire_id = populate_user(user_id, song_count=per_setlist, repertoire_count=1)[0]
+    print(f'Synthetic database: {path} ({per_setlist} songs in one setlist)')
+
+    import database
+    from services.song_order import apply_order
+    with database.get_db() as conn:
+        cursor = conn.cursor()
+        ids = [row['id'] for row in cursor.execute(
+            'SELECT id FROM songs WHERE repertoire_id = ? ORDER BY song_number', (repertoire_id,)
+        ).fetchall()]
+        # Drag the song in the middle up to the top
+        middle = len(ids) // 2
+        ordered = [ids[middle]] + ids[:middle] + ids[middle + 1:]
+
+        measure('before', lambda: legacy_reorder(cursor, ordered), conn)
+        measure('after', lambda: apply_order(cursor, repertoire_id, ordered), conn)
+
+
+if __name__ == '__main__':
+    main()
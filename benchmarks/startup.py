@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Benchmark worker boot schema work on a synthetic database.
+Compares the legacy per-boot ensure_* pass with the versioned migration runner
+once the schema is current.
+Usage: python -m benchmarks.startup [song_count]
+"""
+
+import sys
+import time
+
+from benchmarks.synthetic import use_temp_database, build_schema, populate_user
+
+
+def best_of(fn, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main():
+    song_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    path = use_temp_database()
+    user_id = build_schema()
+    populate_user(user_id, song_count=song_count)
+    print(f'Synthetic database: {path} ({song_count} songs)')
+
+    import migrations
+    legacy_ms = best_of(migrations.baseline_schema)
+
+    applied = migrations.migrate()
+    print(f'Initial migration applied versions {applied}')
+    current_ms = best_of(migrations.migrate, repeat=20)
+
+    from app import create_app
+    boot_ms = best_of(create_app)
+
+    print(f'legacy ensure_* pass per boot:   {legacy_ms:8.2f} ms')
+    print(f'migrate() with current schema:   {current_ms:8.2f} ms')
+    print(f'create_app() with current schema: {boot_ms:7.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark the folder sync job (POST /api/repertoires/<id>/sync) on a folder of
+generated MP3s.
+Compares probing durations one file at a time with the thread pool and with
+a warm media_metadata cache, and reports how long the SQLite write lock was
+held; the probe runs before the write transactions open, so that should stay
+small in every run.
+Usage: python -m benchmarks.sync_durations [tracks] [--latency-ms N]
+  --latency-ms adds a per-file delay to the probe, to mimic a network mount.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import use_temp_database, build_schema
+
+# MPEG-1 Layer III, 128 kbit/s, 44.1 kHz, no padding: 417-byte frames of 1152 samples
+MP3_FRAME_HEADER = b'\xff\xfb\x90\x00'
+MP3_FRAME_BYTES = 417
+MP3_FRAME_SECONDS = 1152 / 44100
+
+
+def write_mp3(path, seconds):
+    """Write a silent constant-bitrate MP3 that mutagen reports as `seconds` long."""
+    frame = MP3_FRAME_HEADER + bytes(MP3_FRAME_BYTES - len(MP3_FRAME_HEADER))
+    with open(path, 'wb') as f:
+        f.write(frame * int(seconds / MP3_FRAME_SECONDS + 1))
+
+
+def generate_folder(folder, tracks):
+    for i in range(tracks):
+        write_mp3(os.path.join(folder, f'{1970 + i % 50} - Track {i:04d} - Bench Artist.mp3'), 20 + i % 40)
+
+
+def lock_timer(conns):
+    """Trace callbacks recording how long each write transaction stays open."""
+    spans, started = [], []
+
+    def trace(sql):
+        statement = sql.strip().upper()
+        if statement.startswith('BEGIN'):
+            started.append(time.perf_counter())
+        elif statement in ('COMMIT', 'ROLLBACK') and started:
+            spans.append(time.perf_counter() - started.pop())
+    for conn in conns:
+        conn.set_trace_callback(trace)
+    return spans
+
+
+def main():
+    args = sys.argv[1:]
+    latency = 0.0
+    if '--latency-ms' in args:
+        index = args.index('--latency-ms')
+        latency = float(args[index + 1]) / 1000
+        del args[index:index + 2]
+    tracks = int(args[0]) if args else 200
+
+    path = use_temp_database()
+    user_id = build_schema()
+    folder = tempfile.mkdtemp(prefix='songtrainer-mp3-')
+    generate_folder(folder, tracks)
+    print(f'Synthetic database: {path}')
+    print(f'Generated {tracks} MP3s in {folder}' + (f' (+{latency * 1000:.0f} ms per probe)' if latency else ''))
+
+    import database
+    import migrations
+    import services.audio_metadata as audio_metadata
+    from services.jobs import wait_for_job
+    migrations.migrate()
+
+    if latency:
+        probe_audio = audio_metadata.probe_audio
+
+        def slow_probe(file_path):
+            time.sleep(latency)
+            return probe_audio(file_path)
+        audio_metadata.probe_audio = slow_probe
+
+    from app import create_app
+    app = create_app()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+
+    # Two pooled connections (the job's transaction and its cancellation
+    # checks), so every run is traced on them
+    pool = database.get_pool()
+    pool.close_all()
+    pool.max_size = 2
+    conns = [pool.acquire(), pool.acquire()]
+    for conn in conns:
+        pool.release(conn)
+
+    # Warm the page cache so no run pays for the first read from disk
+    for file_path in audio_metadata.list_audio_files(folder):
+        audio_metadata.content_hash(file_path)
+
+    results = []
+    runs = (('serial', 1, False), ('parallel', audio_metadata.METADATA_WORKERS, False),
+            ('cached', audio_metadata.METADATA_WORKERS, True))
+    for label, workers, keep_cache in runs:
+        if not keep_cache:
+            with database.get_db() as db:
+                db.execute('DELETE FROM media_metadata')
+        with database.get_db() as db:
+            repertoire_id = db.execute(
+                'INSERT INTO repertoires (name, user_id, mp3_folder, date_created) VALUES (?, ?, ?, ?)',
+                (f'Sync bench {label}', user_id, folder, time.strftime('%Y-%m-%dT%H:%M:%S'))
+            ).lastrowid
+        audio_metadata.METADATA_WORKERS = workers
+        spans = lock_timer(conns)
+        start = time.perf_counter()
+        job_id = client.post(f'/api/repertoires/{repertoire_id}/sync').get_json()['job_id']
+        wait_for_job(job_id)
+        elapsed = time.perf_counter() - start
+        for conn in conns:
+            conn.set_trace_callback(None)
+        stats = client.get(f'/api/jobs/{job_id}').get_json()['progress']
+        with database.get_db() as db:
+            timed = db.execute(
+                'SELECT COUNT(*) AS c FROM songs WHERE repertoire_id = ? AND duration IS NOT NULL',
+                (repertoire_id,)
+            ).fetchone()['c']
+        results.append(elapsed)
+        print(f'{label:<9} workers: {workers:>2}   songs added: {stats["songs_added"]:>4}   '
+              f'with duration: {timed:>4}   job: {elapsed * 1000:8.1f} ms   '
+              f'write lock held: {sum(spans) * 1000:8.1f} ms')
+    print(f'speedup: parallel {results[0] / results[1]:.1f}x, cached {results[0] / results[2]:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
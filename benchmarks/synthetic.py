@@ -0,0 +1,124 @@
+"""Helpers for building synthetic Songtrainer databases for benchmarks."""
+
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+import database
+
+
+def use_temp_database(name='bench.db'):
+    """Point the database module at a fresh file in a temporary directory and return its path."""
+    tmp_dir = tempfile.mkdtemp(prefix='songtrainer-bench-')
+    path = os.path.join(tmp_dir, name)
+    database.DATABASE = path
+    os.environ['DATA_DIR'] = tmp_dir
+    return path
+
+
+def build_schema():
+    """Create the full schema the way a booting app would."""
+    database.init_db()
+    admin_id = database.ensure_default_admin()
+    database.ensure_remember_tokens_table()
+    database.ensure_repertoire_user_column(admin_id)
+    database.ensure_song_user_column(admin_id)
+    database.ensure_audio_path_column()
+    database.ensure_drive_file_id_column()
+    database.ensure_chart_path_column()
+    database.ensure_release_date_column()
+    database.ensure_repertoire_folder_columns()
+    database.ensure_performance_hints_column()
+    database.ensure_repertoire_notes_column()
+    database.ensure_practice_date_log_table()
+    database.ensure_practice_daily_rollup_table()
+    database.ensure_duration_column()
+    database.ensure_repertoire_copy_tracking_columns()
+    database.ensure_settings_table()
+    database.ensure_covering_indexes()
+    return admin_id
+
+
+def populate_user(user_id, song_count=5000, repertoire_count=10, history_days=0, seed=42):
+    """
+    Add repertoires, songs, skill assignments and (optionally) practice history for a user.
+    Returns the list of created repertoire ids.
+    """
+    rng = random.Random(seed)
+    now = datetime.now()
+
+    with database.get_db() as conn:
+        cursor = conn.cursor()
+        skill_ids = [row['id'] for row in cursor.execute('SELECT id FROM skills ORDER BY id').fetchall()]
+
+        repertoire_ids = []
+        for i in range(repertoire_count):
+            cursor.execute(
+                'INSERT INTO repertoires (name, date_created, user_id, sort_order) VALUES (?, ?, ?, ?)',
+                (f'Bench Repertoire {i + 1}', now.isoformat(), user_id, i + 1)
+            )
+            repertoire_ids.append(cursor.lastrowid)
+
+        per_rep = max(1, song_count // repertoire_count)
+        song_rows = []
+        for i in range(song_count):
+            rep_id = repertoire_ids[min(i // per_rep, repertoire_count - 1)]
+            count = rng.randint(0, 12)
+            last = (now - timedelta(days=rng.randint(0, 200))).isoformat() if count else None
+            song_rows.append((
+                f'Song {i + 1}', f'Artist {i % 97}', i + 1, rep_id, user_id,
+                rng.choice(['low', 'mid', 'high']), count, max(1, count + rng.randint(-2, 4)),
+                last, now.isoformat(), rng.choice(['easy', 'normal', 'hard']), rng.choice([None, 150, 210, 240])
+            ))
+        cursor.executemany('''
+            INSERT INTO songs (title, artist, song_number, repertoire_id, user_id, priority,
+                               practice_count, practice_target, last_practiced, date_added, difficulty, duration)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', song_rows)
+
+        # song_number is a unique, gapped sort key per repertoire; respace within each repertoire
+        for rep_id in repertoire_ids:
+            rows = cursor.execute('SELECT id FROM songs WHERE repertoire_id = ? ORDER BY id', (rep_id,)).fetchall()
+            cursor.executemany(
+                'UPDATE songs SET song_number = ? WHERE id = ?',
+                [(-(n + 1) * database.SONG_NUMBER_GAP, row['id']) for n, row in enumerate(rows)]
+            )
+            cursor.execute('UPDATE songs SET song_number = -song_number WHERE repertoire_id = ?', (rep_id,))
+
+        song_ids = [row['id'] for row in cursor.execute('SELECT id FROM songs WHERE user_id = ?', (user_id,)).fetchall()]
+        cursor.executemany(
+            'INSERT INTO song_skills (song_id, skill_id, is_mastered) VALUES (?, ?, ?)',
+            [
+                (song_id, skill_id, rng.randint(0, 1))
+                for song_id in song_ids
+                for skill_id in skill_ids
+                if rng.random() < 0.75
+            ]
+        )
+
+        if history_days:
+            log_rows = []
+            today = now.date()
+            for day in range(history_days):
+                if rng.random() < 0.3:
+                    continue
+                date_str = (today - timedelta(days=day)).isoformat()
+                for song_id in rng.sample(song_ids, min(len(song_ids), rng.randint(1, 15))):
+                    log_rows.append((song_id, user_id, date_str, rng.randint(1, 4)))
+            cursor.executemany(
+                'INSERT INTO practice_date_log (song_id, user_id, practice_date, practice_count) VALUES (?, ?, ?, ?)',
+                log_rows
+            )
+
+    return repertoire_ids
+
+
+class QueryCounter:
+    """sqlite3 trace callback that counts executed statements."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, statement):
+        self.count += 1
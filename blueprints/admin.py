@@ -0,0 +1,79 @@
+"""Admin maintenance and diagnostics API."""
+
+from flask import Blueprint, jsonify, request
+from database import get_db, get_pool, normalize_song_numbers
+from utils.decorators import admin_required
+from services.streaks import check_user_streaks, rebuild_user_streaks
+from services.practice_rollup import check_practice_rollup, rebuild_practice_rollup
+
+admin_bp = Blueprint('admin', __name__)
+
+
+@admin_bp.route('/api/admin/db-pool', methods=['GET'])
+@admin_required
+def db_pool_stats():
+    """Return connection pool size, hit rate and wait-time counters for this worker."""
+    return jsonify(get_pool().stats())
+
+
+def _repertoire_ids_from_request():
+    """(repertoire_ids, None) from an optional JSON list of ids, or (None, 400 response) if malformed."""
+    data = request.get_json(silent=True) or {}
+    repertoire_ids = data.get('repertoire_ids')
+    if repertoire_ids is None:
+        return None, None
+    if not isinstance(repertoire_ids, list):
+        return None, (jsonify({'error': 'repertoire_ids must be a list'}), 400)
+    try:
+        return [int(rid) for rid in repertoire_ids], None
+    except (TypeError, ValueError):
+        return None, (jsonify({'error': 'repertoire_ids must be integers'}), 400)
+
+
+@admin_bp.route('/api/admin/normalize-song-numbers', methods=['POST'])
+@admin_required
+def normalize_song_numbers_endpoint():
+    """Respace song_number sort keys evenly; optionally limited to given repertoires."""
+    repertoire_ids, error = _repertoire_ids_from_request()
+    if error:
+        return error
+
+    with get_db() as conn:
+        changed, updated = normalize_song_numbers(conn.cursor(), repertoire_ids)
+
+    return jsonify({'repertoires': changed, 'songs_updated': updated})
+
+
+@admin_bp.route('/api/admin/streaks/check', methods=['GET'])
+@admin_required
+def check_streaks():
+    """Compare stored user_streaks with practice_date_log; ?rebuild=1 rewrites drifted users."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        mismatches = check_user_streaks(cursor)
+        rebuilt = 0
+        if mismatches and request.args.get('rebuild', type=int):
+            rebuilt = rebuild_user_streaks(cursor, [user_id for user_id, _, _ in mismatches])
+
+    return jsonify({
+        'mismatches': [
+            {'user_id': user_id, 'stored': stored, 'expected': expected}
+            for user_id, stored, expected in mismatches
+        ],
+        'rebuilt': rebuilt
+    })
+
+
+@admin_bp.route('/api/admin/practice-rollup', methods=['GET', 'POST'])
+@admin_required
+def practice_rollup():
+    """GET reports rollup rows that drifted from the log; POST rebuilds (optionally given repertoire_ids)."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        if request.method == 'GET':
+            return jsonify({'drift': check_practice_rollup(cursor)})
+
+        repertoire_ids, error = _repertoire_ids_from_request()
+        if error:
+            return error
+        return jsonify({'rows': rebuild_practice_rollup(cursor, repertoire_ids)})
@@ -5,6 +5,9 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
 from database import get_db
 from utils.decorators import login_required, admin_required
+from utils.user_cache import (
+    get_cached_user, invalidate_user, get_remember_token, remember_token_validated, forget_remember_token
+)
 import sqlite3
 import secrets
 import hashlib
@@ -29,18 +32,6 @@ def _serialize_user(row):
     return {'id': row['id'], 'email': row['email'], 'role': row['role']}
 
 
-def _load_user(user_id):
-    """Load user from database by ID."""
-    if not user_id:
-        return None
-    with get_db() as conn:
-        cursor = conn.cursor()
-        return cursor.execute(
-            'SELECT id, email, role FROM users WHERE id = ?',
-            (user_id,)
-        ).fetchone()
-
-
 def _clear_remember_token(token_cookie_value):
     """Delete a remember-me token from database."""
     if not token_cookie_value:
@@ -51,6 +42,7 @@ def _clear_remember_token(token_cookie_value):
     except Exception:
         return
 
+    forget_remember_token(token_id)
     token_hash = _hash_token(raw_token)
     with get_db() as conn:
         cursor = conn.cursor()
@@ -60,9 +52,10 @@ def _clear_remember_token(token_cookie_value):
         )
 
 
-def _login_user(user_id, remember_me=False):
+def _login_user(user_id, remember_me=False, auth_version=0):
     """Set session and optional remember-me cookie value (token string)."""
     session['user_id'] = user_id
+    session['user_version'] = auth_version
     session.permanent = True
 
     if not remember_me:
@@ -89,6 +82,7 @@ def _logout_user():
     token_cookie = request.cookies.get(REMEMBER_COOKIE_NAME)
     _clear_remember_token(token_cookie)
     session.pop('user_id', None)
+    session.pop('user_version', None)
 
 
 def _set_remember_cookie(response, token_value):
@@ -113,14 +107,17 @@ def attach_current_user():
     """Before-request handler to load current user from session or remember-me cookie."""
     g.current_user = None
 
-    # Load from session first
+    # Load from session first; the version stamp makes stale cached records reload
     user_id = session.get('user_id')
     if user_id:
-        user = _load_user(user_id)
+        user = get_cached_user(user_id, session.get('user_version', 0))
         if user:
+            if session.get('user_version') != user['auth_version']:
+                session['user_version'] = user['auth_version']
             g.current_user = user
             return
         session.pop('user_id', None)
+        session.pop('user_version', None)
 
     # Fallback to remember-me cookie
     remember_value = request.cookies.get(REMEMBER_COOKIE_NAME)
@@ -133,12 +130,15 @@ def attach_current_user():
     except Exception:
         return
 
-    with get_db() as conn:
-        cursor = conn.cursor()
-        token_row = cursor.execute(
-            'SELECT user_id, token_hash, expires_at FROM remember_tokens WHERE id = ?',
-            (token_id,)
-        ).fetchone()
+    token_row = get_remember_token(token_id)
+    cached = token_row is not None
+    if not cached:
+        with get_db() as conn:
+            cursor = conn.cursor()
+            token_row = cursor.execute(
+                'SELECT user_id, token_hash, expires_at FROM remember_tokens WHERE id = ?',
+                (token_id,)
+            ).fetchone()
 
     if not token_row:
         return
@@ -157,9 +157,13 @@ def attach_current_user():
         _clear_remember_token(remember_value)
         return
 
-    user = _load_user(token_row['user_id'])
+    if not cached:
+        remember_token_validated(token_id, token_row['user_id'], token_row['token_hash'], token_row['expires_at'])
+
+    user = get_cached_user(token_row['user_id'])
     if user:
         session['user_id'] = user['id']
+        session['user_version'] = user['auth_version']
         g.current_user = user
 
 
@@ -197,14 +201,14 @@ def api_login():
     with get_db() as conn:
         cursor = conn.cursor()
         user = cursor.execute(
-            'SELECT id, email, password_hash, role FROM users WHERE lower(email) = ?',
+            'SELECT id, email, password_hash, role, auth_version FROM users WHERE lower(email) = ?',
             (email,)
         ).fetchone()
 
     if not user or not check_password_hash(user['password_hash'], password):
         return jsonify({'error': 'Invalid credentials'}), 401
 
-    remember_value = _login_user(user['id'], remember_me=remember_me)
+    remember_value = _login_user(user['id'], remember_me=remember_me, auth_version=user['auth_version'])
     resp = jsonify({'user': _serialize_user(user)})
     _set_remember_cookie(resp, remember_value)
     return resp
@@ -299,10 +303,12 @@ def api_reset_confirm():
         new_hash = generate_password_hash(new_password)
         now = datetime.now().isoformat()
         cursor.execute(
-            'UPDATE users SET password_hash = ?, reset_token = NULL, reset_token_expires_at = NULL, updated_at = ? WHERE id = ?',
+            '''UPDATE users SET password_hash = ?, reset_token = NULL, reset_token_expires_at = NULL,
+               updated_at = ?, auth_version = auth_version + 1 WHERE id = ?''',
             (new_hash, now, user['id'])
         )
         cursor.execute('DELETE FROM remember_tokens WHERE user_id = ?', (user['id'],))
+    invalidate_user(user['id'])
 
     resp = jsonify({'message': 'Password reset successful. Please log in.'})
     _set_remember_cookie(resp, None)
@@ -413,6 +419,7 @@ def update_user(user_id):
             return jsonify({'message': 'No changes applied'})
         fields.append('updated_at = ?')
         values.append(datetime.now().isoformat())
+        fields.append('auth_version = auth_version + 1')
         values.append(user_id)
 
         try:
@@ -420,6 +427,7 @@ def update_user(user_id):
         except sqlite3.IntegrityError:
             return jsonify({'error': 'Email already exists'}), 400
 
+    invalidate_user(user_id)
     return jsonify({'message': 'User updated'})
 
 
@@ -435,6 +443,7 @@ def delete_user(user_id):
         deleted = cursor.execute('DELETE FROM users WHERE id = ?', (user_id,))
         if deleted.rowcount == 0:
             return jsonify({'error': 'User not found'}), 404
+    invalidate_user(user_id)
     return jsonify({'message': 'User deleted'})
 
 
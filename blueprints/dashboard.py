@@ -4,6 +4,8 @@ from flask import Blueprint, request, jsonify, g
 from database import get_db
 from utils.decorators import login_required
 from utils.permissions import resolve_scope_user_id
+from services.streaks import read_streaks
+from services.practice_rollup import daily_totals
 from datetime import datetime, timedelta
 from collections import defaultdict
 
@@ -24,6 +26,56 @@ def _get_date_range(period):
     return start.isoformat(), today.isoformat()
 
 
+def _summary_counts(cursor, user_id, start_date, end_date, repertoire_id=None):
+    """
+    All dashboard summary aggregates in one statement.
+    Practice figures come from practice_date_log within the date range; skill and
+    completion figures are current totals. Without a repertoire, log rows are
+    LEFT JOINed so sessions and distinct songs still count every log entry.
+    """
+    rep_condition = 'AND s.repertoire_id = ?' if repertoire_id else ''
+    rep_params = [repertoire_id] if repertoire_id else []
+    query = f'''
+        WITH period_log AS (
+            SELECT pl.song_id, pl.practice_count, s.duration
+            FROM practice_date_log pl
+            LEFT JOIN songs s ON pl.song_id = s.id
+            WHERE pl.user_id = ?
+            AND pl.practice_date >= ?
+            AND pl.practice_date <= ?
+            {rep_condition}
+        ),
+        practice AS (
+            SELECT COALESCE(SUM(duration * practice_count), 0) AS total_seconds,
+                   COUNT(DISTINCT song_id) AS songs_practiced,
+                   COALESCE(SUM(practice_count), 0) AS practice_sessions
+            FROM period_log
+        ),
+        song_totals AS (
+            SELECT COUNT(*) AS total_songs,
+                   COALESCE(SUM(s.practice_target > 0 AND s.practice_count >= s.practice_target), 0) AS songs_completed
+            FROM songs s
+            WHERE s.user_id = ?
+            {rep_condition}
+        ),
+        skill_totals AS (
+            SELECT COUNT(*) AS total_skills,
+                   COALESCE(SUM(ss.is_mastered = 1), 0) AS skills_mastered
+            FROM song_skills ss
+            JOIN songs s ON ss.song_id = s.id
+            WHERE s.user_id = ?
+            {rep_condition}
+        )
+        SELECT * FROM practice, song_totals, skill_totals
+    '''
+    params = (
+        [user_id, start_date, end_date] + rep_params
+        + [user_id] + rep_params
+        + [user_id] + rep_params
+    )
+    return dict(cursor.execute(query, params).fetchone())
+
+
 @dashboard_bp.route('/api/dashboard/summary', methods=['GET'])
 @login_required
 def get_summary():
@@ -38,147 +90,14 @@ def get_summary():
     with get_db() as conn:
         cursor = conn.cursor()
         
-        # Base conditions for repertoire filtering
-        rep_condition = "AND s.repertoire_id = ?" if repertoire_id else ""
-        rep_params = [repertoire_id] if repertoire_id else []
-        
-        # Total practice time (in seconds)
-        if repertoire_id:
-            time_query = '''
-                SELECT COALESCE(SUM(s.duration * pl.practice_count), 0) as total_seconds
-                FROM practice_date_log pl
-                JOIN songs s ON pl.song_id = s.id
-                WHERE pl.user_id = ?
-                AND pl.practice_date >= ?
-                AND pl.practice_date <= ?
-                AND s.repertoire_id = ?
-                AND s.duration IS NOT NULL
-            '''
-            time_result = cursor.execute(time_query, (scope_user_id, start_date, end_date, repertoire_id)).fetchone()
-        else:
-            time_query = '''
-                SELECT COALESCE(SUM(s.duration * pl.practice_count), 0) as total_seconds
-                FROM practice_date_log pl
-                JOIN songs s ON pl.song_id = s.id
-                WHERE pl.user_id = ?
-                AND pl.practice_date >= ?
-                AND pl.practice_date <= ?
-                AND s.duration IS NOT NULL
-            '''
-            time_result = cursor.execute(time_query, (scope_user_id, start_date, end_date)).fetchone()
-        
-        total_seconds = time_result['total_seconds'] or 0
-        
-        # Count distinct songs practiced
-        if repertoire_id:
-            songs_query = '''
-                SELECT COUNT(DISTINCT pl.song_id) as count
-                FROM practice_date_log pl
-                JOIN songs s ON pl.song_id = s.id
-                WHERE pl.user_id = ?
-                AND pl.practice_date >= ?
-                AND pl.practice_date <= ?
-                AND s.repertoire_id = ?
-            '''
-            songs_practiced = cursor.execute(songs_query, (scope_user_id, start_date, end_date, repertoire_id)).fetchone()['count']
-        else:
-            songs_query = '''
-                SELECT COUNT(DISTINCT song_id) as count
-                FROM practice_date_log
-                WHERE user_id = ?
-                AND practice_date >= ?
-                AND practice_date <= ?
-            '''
-            songs_practiced = cursor.execute(songs_query, (scope_user_id, start_date, end_date)).fetchone()['count']
-        
-        # Total practice sessions (sum of practice_count entries)
-        if repertoire_id:
-            sessions_query = '''
-                SELECT COALESCE(SUM(pl.practice_count), 0) as count
-                FROM practice_date_log pl
-                JOIN songs s ON pl.song_id = s.id
-                WHERE pl.user_id = ?
-                AND pl.practice_date >= ?
-                AND pl.practice_date <= ?
-                AND s.repertoire_id = ?
-            '''
-            practice_sessions = cursor.execute(sessions_query, (scope_user_id, start_date, end_date, repertoire_id)).fetchone()['count']
-        else:
-            sessions_query = '''
-                SELECT COALESCE(SUM(practice_count), 0) as count
-                FROM practice_date_log
-                WHERE user_id = ?
-                AND practice_date >= ?
-                AND practice_date <= ?
-            '''
-            practice_sessions = cursor.execute(sessions_query, (scope_user_id, start_date, end_date)).fetchone()['count']
-        
-        # Skills mastered (current total, not time-bound)
-        if repertoire_id:
-            skills_query = '''
-                SELECT COUNT(*) as mastered
-                FROM song_skills ss
-                JOIN songs s ON ss.song_id = s.id
-                WHERE s.user_id = ?
-                AND ss.is_mastered = 1
-                AND s.repertoire_id = ?
-            '''
-            skills_mastered = cursor.execute(skills_query, (scope_user_id, repertoire_id)).fetchone()['mastered']
-            
-            total_skills_query = '''
-                SELECT COUNT(*) as total
-                FROM song_skills ss
-                JOIN songs s ON ss.song_id = s.id
-                WHERE s.user_id = ?
-                AND s.repertoire_id = ?
-            '''
-            total_skills = cursor.execute(total_skills_query, (scope_user_id, repertoire_id)).fetchone()['total']
-        else:
-            skills_query = '''
-                SELECT COUNT(*) as mastered
-                FROM song_skills ss
-                JOIN songs s ON ss.song_id = s.id
-                WHERE s.user_id = ?
-                AND ss.is_mastered = 1
-            '''
-            skills_mastered = cursor.execute(skills_query, (scope_user_id,)).fetchone()['mastered']
-            
-            total_skills_query = '''
-                SELECT COUNT(*) as total
-                FROM song_skills ss
-                JOIN songs s ON ss.song_id = s.id
-                WHERE s.user_id = ?
-            '''
-            total_skills = cursor.execute(total_skills_query, (scope_user_id,)).fetchone()['total']
-        
-        # Songs completed (practice_count >= practice_target and target > 0)
-        if repertoire_id:
-            completed_query = '''
-                SELECT COUNT(*) as completed
-                FROM songs
-                WHERE user_id = ?
-                AND practice_target > 0
-                AND practice_count >= practice_target
-                AND repertoire_id = ?
-            '''
-            songs_completed = cursor.execute(completed_query, (scope_user_id, repertoire_id)).fetchone()['completed']
-            
-            total_songs_query = '''
-                SELECT COUNT(*) as total FROM songs WHERE user_id = ? AND repertoire_id = ?
-            '''
-            total_songs = cursor.execute(total_songs_query, (scope_user_id, repertoire_id)).fetchone()['total']
-        else:
-            completed_query = '''
-                SELECT COUNT(*) as completed
-                FROM songs
-                WHERE user_id = ?
-                AND practice_target > 0
-                AND practice_count >= practice_target
-            '''
-            songs_completed = cursor.execute(completed_query, (scope_user_id,)).fetchone()['completed']
-            
-            total_songs_query = 'SELECT COUNT(*) as total FROM songs WHERE user_id = ?'
-            total_songs = cursor.execute(total_songs_query, (scope_user_id,)).fetchone()['total']
+        counts = _summary_counts(cursor, scope_user_id, start_date, end_date, repertoire_id)
+        total_seconds = counts['total_seconds']
+        songs_practiced = counts['songs_practiced']
+        practice_sessions = counts['practice_sessions']
+        skills_mastered = counts['skills_mastered']
+        total_skills = counts['total_skills']
+        songs_completed = counts['songs_completed']
+        total_songs = counts['total_songs']
         
         # Format time
         hours = total_seconds // 3600
@@ -213,72 +132,12 @@ def get_summary():
 @dashboard_bp.route('/api/dashboard/streaks', methods=['GET'])
 @login_required
 def get_streaks():
-    """Get practice streak information."""
+    """Get practice streak information (a single user_streaks row)."""
     requested_user_id = request.args.get('user_id', type=int)
     scope_user_id = resolve_scope_user_id(get_db, requested_user_id)
     
     with get_db() as conn:
-        cursor = conn.cursor()
-        
-        # Get all distinct practice dates for user, ordered
-        dates_query = '''
-            SELECT DISTINCT practice_date
-            FROM practice_date_log
-            WHERE user_id = ?
-            ORDER BY practice_date DESC
-        '''
-        rows = cursor.execute(dates_query, (scope_user_id,)).fetchall()
-        practice_dates = [datetime.strptime(r['practice_date'], '%Y-%m-%d').date() for r in rows]
-        
-        if not practice_dates:
-            return jsonify({
-                'current_streak': 0,
-                'longest_streak': 0,
-                'last_practice_date': None,
-                'practiced_today': False
-            })
-        
-        today = datetime.now().date()
-        yesterday = today - timedelta(days=1)
-        
-        # Check if practiced today
-        practiced_today = practice_dates[0] == today if practice_dates else False
-        
-        # Calculate current streak
-        current_streak = 0
-        check_date = today if practiced_today else yesterday
-        
-        for pd in practice_dates:
-            if pd == check_date:
-                current_streak += 1
-                check_date -= timedelta(days=1)
-            elif pd < check_date:
-                break
-        
-        # If didn't practice today or yesterday, streak is 0
-        if not practiced_today and (not practice_dates or practice_dates[0] < yesterday):
-            current_streak = 0
-        
-        # Calculate longest streak
-        longest_streak = 0
-        streak = 0
-        prev_date = None
-        
-        for pd in sorted(practice_dates):
-            if prev_date is None or pd == prev_date + timedelta(days=1):
-                streak += 1
-            else:
-                longest_streak = max(longest_streak, streak)
-                streak = 1
-            prev_date = pd
-        longest_streak = max(longest_streak, streak)
-        
-        return jsonify({
-            'current_streak': current_streak,
-            'longest_streak': longest_streak,
-            'last_practice_date': practice_dates[0].isoformat() if practice_dates else None,
-            'practiced_today': practiced_today
-        })
+        return jsonify(read_streaks(conn.cursor(), scope_user_id))
 
 
 @dashboard_bp.route('/api/dashboard/activity', methods=['GET'])
@@ -297,34 +156,8 @@ def get_activity():
     with get_db() as conn:
         cursor = conn.cursor()
         
-        # Get practice data per day
-        if repertoire_id:
-            query = '''
-                SELECT pl.practice_date, 
-                       SUM(COALESCE(s.duration, 180) * pl.practice_count) as total_seconds,
-                       SUM(pl.practice_count) as session_count
-                FROM practice_date_log pl
-                JOIN songs s ON pl.song_id = s.id
-                WHERE pl.user_id = ?
-                AND pl.practice_date >= ?
-                AND s.repertoire_id = ?
-                GROUP BY pl.practice_date
-                ORDER BY pl.practice_date
-            '''
-            rows = cursor.execute(query, (scope_user_id, start_date.isoformat(), repertoire_id)).fetchall()
-        else:
-            query = '''
-                SELECT pl.practice_date, 
-                       SUM(COALESCE(s.duration, 180) * pl.practice_count) as total_seconds,
-                       SUM(pl.practice_count) as session_count
-                FROM practice_date_log pl
-                JOIN songs s ON pl.song_id = s.id
-                WHERE pl.user_id = ?
-                AND pl.practice_date >= ?
-                GROUP BY pl.practice_date
-                ORDER BY pl.practice_date
-            '''
-            rows = cursor.execute(query, (scope_user_id, start_date.isoformat())).fetchall()
+        # Practice time and sessions per day from the daily rollup
+        rows = daily_totals(cursor, scope_user_id, start_date.isoformat(), repertoire_id)
         
         # Build activity map
         activity = {}
@@ -398,32 +231,8 @@ def get_trends():
     with get_db() as conn:
         cursor = conn.cursor()
         
-        # Practice time trends
-        if repertoire_id:
-            time_query = '''
-                SELECT pl.practice_date,
-                       SUM(COALESCE(s.duration, 180) * pl.practice_count) as total_seconds
-                FROM practice_date_log pl
-                JOIN songs s ON pl.song_id = s.id
-                WHERE pl.user_id = ?
-                AND pl.practice_date >= ?
-                AND s.repertoire_id = ?
-                GROUP BY pl.practice_date
-                ORDER BY pl.practice_date
-            '''
-            time_rows = cursor.execute(time_query, (scope_user_id, start_date.isoformat(), repertoire_id)).fetchall()
-        else:
-            time_query = '''
-                SELECT pl.practice_date,
-                       SUM(COALESCE(s.duration, 180) * pl.practice_count) as total_seconds
-                FROM practice_date_log pl
-                JOIN songs s ON pl.song_id = s.id
-                WHERE pl.user_id = ?
-                AND pl.practice_date >= ?
-                GROUP BY pl.practice_date
-                ORDER BY pl.practice_date
-            '''
-            time_rows = cursor.execute(time_query, (scope_user_id, start_date.isoformat())).fetchall()
+        # Practice time trends from the daily rollup
+        time_rows = daily_totals(cursor, scope_user_id, start_date.isoformat(), repertoire_id)
         
         # Aggregate by period if yearly
         if period == 'year':
@@ -495,22 +304,39 @@ def get_repertoire_breakdown():
     with get_db() as conn:
         cursor = conn.cursor()
         
+        # Time and sessions come from the daily rollup; distinct songs over the whole
+        # period cannot be summed from per-day counts, so they still come from the log
         query = '''
             SELECT r.id, r.name,
-                   COALESCE(SUM(COALESCE(s.duration, 180) * pl.practice_count), 0) as total_seconds,
-                   COUNT(DISTINCT pl.song_id) as songs_practiced,
-                   COALESCE(SUM(pl.practice_count), 0) as sessions
+                   COALESCE(t.total_seconds, 0) as total_seconds,
+                   COALESCE(d.songs_practiced, 0) as songs_practiced,
+                   COALESCE(t.sessions, 0) as sessions
             FROM repertoires r
-            LEFT JOIN songs s ON s.repertoire_id = r.id AND s.user_id = ?
-            LEFT JOIN practice_date_log pl ON pl.song_id = s.id 
-                AND pl.user_id = ?
+            LEFT JOIN (
+                SELECT repertoire_id, SUM(seconds) as total_seconds, SUM(sessions) as sessions
+                FROM practice_daily_rollup
+                WHERE user_id = ?
+                AND practice_date >= ?
+                AND practice_date <= ?
+                GROUP BY repertoire_id
+            ) t ON t.repertoire_id = r.id
+            LEFT JOIN (
+                SELECT s.repertoire_id, COUNT(DISTINCT pl.song_id) as songs_practiced
+                FROM practice_date_log pl
+                JOIN songs s ON s.id = pl.song_id AND s.user_id = ?
+                WHERE pl.user_id = ?
                 AND pl.practice_date >= ?
                 AND pl.practice_date <= ?
+                GROUP BY s.repertoire_id
+            ) d ON d.repertoire_id = r.id
             WHERE r.user_id = ?
-            GROUP BY r.id, r.name
-            ORDER BY total_seconds DESC
+            ORDER BY total_seconds DESC, r.id
         '''
-        rows = cursor.execute(query, (scope_user_id, scope_user_id, start_date, end_date, scope_user_id)).fetchall()
+        rows = cursor.execute(query, (
+            scope_user_id, start_date, end_date,
+            scope_user_id, scope_user_id, start_date, end_date,
+            scope_user_id
+        )).fetchall()
         
         breakdown = []
         for row in rows:
@@ -0,0 +1,33 @@
+"""Background job status and cancellation blueprint."""
+
+from flask import Blueprint, jsonify
+from database import get_db
+from utils.decorators import login_required
+from utils.permissions import require_job
+from services.jobs import cancel_job, fail_orphaned_jobs, job_payload
+
+jobs_bp = Blueprint('jobs', __name__)
+
+
+@jobs_bp.route('/api/jobs/<int:job_id>', methods=['GET'])
+@login_required
+def get_job(job_id):
+    """Status, phase and progress of a background job"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        # A job whose process died reads as failed instead of running forever
+        fail_orphaned_jobs(cursor)
+        return jsonify(job_payload(require_job(cursor, job_id)))
+
+
+@jobs_bp.route('/api/jobs/<int:job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_background_job(job_id):
+    """Ask a queued or running job to stop; it rolls back its current step"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        require_job(cursor, job_id)
+    cancel_job(job_id)
+    with get_db() as conn:
+        cursor = conn.cursor()
+        return jsonify(job_payload(require_job(cursor, job_id))), 202
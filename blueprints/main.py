@@ -1,6 +1,6 @@
 """Main blueprint for top-level pages."""
 
-from flask import Blueprint, render_template
+from flask import Blueprint, render_template, send_from_directory, current_app
 from utils.decorators import login_required, admin_required
 
 main = Blueprint('main', __name__)
@@ -13,6 +13,14 @@ def index():
     return render_template('index.html')
 
 
+@main.route('/sw.js')
+def service_worker():
+    """Serve the service worker from the root so its scope covers the app and /api/."""
+    response = send_from_directory(current_app.static_folder, 'sw.js', mimetype='application/javascript', max_age=0)
+    response.headers['Service-Worker-Allowed'] = '/'
+    return response
+
+
 @main.route('/admin')
 @admin_required
 def admin():
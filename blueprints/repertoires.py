@@ -1,52 +1,30 @@
 """Repertoire management blueprint."""
 
 from flask import Blueprint, request, jsonify, g, send_file, abort
-from database import get_db
+from database import get_db, SONG_NUMBER_GAP
 from utils.decorators import login_required, admin_required
 from utils.permissions import resolve_scope_user_id, require_repertoire
-from utils.helpers import calculate_time_practiced_since, extract_mp3_duration
+from utils.helpers import calculate_time_practiced_since
+from utils.data_version import data_version_etag, not_modified, with_etag
+from services.song_order import POSITION_SQL, append_song_number
+from services.streaks import practice_log_users, rebuild_user_streaks
+from services.practice_rollup import rebuild_practice_rollup
+from services.audio_metadata import AUDIO_EXTENSIONS
+from services.matcher import MatchIndex
+from services.jobs import active_job, submit_job
+from services.folder_sync import SYNC_JOB, clear_manifest
+from services.chart_store import chart_hash_of
+from services.setlist_pdf import cached_setlist_pdf, render_setlist_pdf, setlist_cache_key, store_setlist_pdf
 from datetime import datetime
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER
-from io import BytesIO
 import os
-import glob
 import json
-import re
 import urllib.request
 import urllib.parse
 import time
-import shutil
 
 repertoires_bp = Blueprint('repertoires', __name__)
 
 
-def resolve_chart_path(chart_path):
-    """
-    Resolve a chart path to work on any platform (Windows/WSL/Linux/Ubuntu).
-    Handles Windows paths (e:\...), WSL paths (/mnt/e/...), and native Linux paths.
-    """
-    if not chart_path:
-        return None
-    
-    # Normalize backslashes to forward slashes
-    normalized = chart_path.replace('\\', '/')
-    
-    # If it's a Windows path (e.g., "e:/Drive/..."), convert to WSL
-    if ':' in normalized and not normalized.startswith('/'):
-        # Windows path like "e:/Drive/..." - convert to /mnt/e/Drive/...
-        drive_letter = normalized[0].lower()
-        rest = normalized[2:]  # Skip "e:/"
-        return f'/mnt/{drive_letter}{rest}'
-    
-    # Otherwise return as-is (could be WSL /mnt/e/... or native /home/... or /root/...)
-    return normalized
-
-
 @repertoires_bp.route('/api/repertoires', methods=['GET'])
 @login_required
 def get_repertoires():
@@ -57,6 +35,11 @@ def get_repertoires():
     with get_db() as conn:
         cursor = conn.cursor()
 
+        etag = data_version_etag(cursor, 'repertoires', scope_user_id)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+
         repertoires = cursor.execute(
             'SELECT * FROM repertoires WHERE user_id = ? ORDER BY COALESCE(sort_order, id), id',
             (scope_user_id,)
@@ -85,7 +68,7 @@ def get_repertoires():
 
             repertoires_list.append(rep_dict)
 
-        return jsonify(repertoires_list)
+        return with_etag(jsonify(repertoires_list), etag)
 
 
 @repertoires_bp.route('/api/repertoires/<int:repertoire_id>/time-practiced', methods=['GET'])
@@ -102,10 +85,9 @@ def get_repertoire_time_practiced(repertoire_id):
         # Find earliest practice date for this user in this repertoire
         earliest = cursor.execute(
             '''
-            SELECT MIN(pl.practice_date) AS first_date
-            FROM practice_date_log pl
-            JOIN songs s ON s.id = pl.song_id
-            WHERE pl.user_id = ? AND s.repertoire_id = ?
+            SELECT MIN(practice_date) AS first_date
+            FROM practice_daily_rollup
+            WHERE user_id = ? AND repertoire_id = ?
             ''',
             (scope_user_id, repertoire_id)
         ).fetchone()
@@ -255,8 +237,10 @@ def delete_repertoire(repertoire_id):
             (repertoire_id,)
         ).fetchone()
 
+        streak_users = practice_log_users(cursor, 'SELECT id FROM songs WHERE repertoire_id = ?', (repertoire_id,))
         cursor.execute('DELETE FROM songs WHERE repertoire_id = ?', (repertoire_id,))
         cursor.execute('DELETE FROM repertoires WHERE id = ?', (repertoire_id,))
+        rebuild_user_streaks(cursor, streak_users)
 
         return jsonify({
             'message': 'Repertoire deleted successfully',
@@ -289,12 +273,8 @@ def archive_repertoire(repertoire_id):
         
         archive_id = archive_rep['id']
         
-        # Get max song_number in Archive to append songs
-        max_number_row = cursor.execute(
-            'SELECT MAX(song_number) as max_num FROM songs WHERE repertoire_id = ?',
-            (archive_id,)
-        ).fetchone()
-        next_number = (max_number_row['max_num'] or 0) + 1
+        # Append songs after the last one in Archive
+        next_number = append_song_number(cursor, archive_id)
         
         # Get all songs from source repertoire
         songs = cursor.execute(
@@ -306,11 +286,12 @@ def archive_repertoire(repertoire_id):
         for i, song in enumerate(songs):
             cursor.execute(
                 'UPDATE songs SET repertoire_id = ?, song_number = ? WHERE id = ?',
-                (archive_id, next_number + i, song['id'])
+                (archive_id, next_number + i * SONG_NUMBER_GAP, song['id'])
             )
         
-        # Delete the now-empty repertoire
+        # Delete the now-empty repertoire (its rollup rows cascade away)
         cursor.execute('DELETE FROM repertoires WHERE id = ?', (repertoire_id,))
+        rebuild_practice_rollup(cursor, [archive_id])
         
         return jsonify({
             'message': f'Moved {len(songs)} song(s) to Archive and deleted repertoire "{source_rep["name"]}"',
@@ -375,9 +356,9 @@ def share_repertoire(repertoire_id):
             cursor.execute('''
                 INSERT INTO songs (
                     title, artist, repertoire_id, user_id, song_number,
-                    audio_path, chart_path, priority, practice_target,
+                    audio_path, chart_path, chart_hash, priority, practice_target,
                     release_date, notes, difficulty, date_added
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 song['title'],
                 song['artist'],
@@ -386,6 +367,7 @@ def share_repertoire(repertoire_id):
                 song['song_number'],
                 song['audio_path'],
                 song['chart_path'],
+                song['chart_hash'],
                 song['priority'],
                 1,  # Default practice_target, not copied
                 song['release_date'],
@@ -428,338 +410,20 @@ def reorder_repertoires():
 @repertoires_bp.route('/api/repertoires/<int:repertoire_id>/sync', methods=['POST'])
 @login_required
 def sync_repertoire_folders(repertoire_id):
-    """Scan MP3 folder, create songs from filenames, then link MP3s and sheets"""
+    """Start a folder sync in the background; poll the returned job for progress"""
     with get_db() as conn:
         cursor = conn.cursor()
-        
-        rep = require_repertoire(cursor, repertoire_id, g.current_user['id'])
-        
-        # Delete previous sync history for this repertoire
-        cursor.execute('DELETE FROM sync_history WHERE repertoire_id = ?', (repertoire_id,))
-        
-        sync_timestamp = datetime.now().isoformat()
-        
-        stats = {
-            'songs_added': 0,
-            'mp3_linked': 0,
-            'sheets_linked': 0,
-            'charts_migrated': 0,
-            'errors': [],
-            'debug': {
-                'songs_in_repertoire': 0,
-                'mp3_files_found': 0,
-                'sheet_files_found': 0,
-                'songlist_files_found': 0,
-                'external_charts_found': 0,
-                'songlist_folder_path': rep['songlist_folder'],
-                'mp3_folder_path': rep['mp3_folder'],
-                'sheet_folder_path': rep['sheet_folder']
-            }
-        }
-        
-        # Count existing songs
-        existing_songs_count = cursor.execute(
-            'SELECT COUNT(*) as cnt FROM songs WHERE repertoire_id = ?',
-            (repertoire_id,)
-        ).fetchone()['cnt']
-        stats['debug']['songs_in_repertoire'] = existing_songs_count
-        
-        # Step 1: Scan MP3 folder and create songs from MP3 filenames
-        if rep['mp3_folder'] and os.path.isdir(rep['mp3_folder']):
-            try:
-                # Get existing song titles and linked audio paths
-                existing_titles = {
-                    row['title'].lower() 
-                    for row in cursor.execute(
-                        'SELECT title FROM songs WHERE repertoire_id = ?',
-                        (repertoire_id,)
-                    ).fetchall()
-                }
-                linked_audio_paths = {
-                    row['audio_path']
-                    for row in cursor.execute(
-                        'SELECT audio_path FROM songs WHERE repertoire_id = ? AND audio_path IS NOT NULL',
-                        (repertoire_id,)
-                    ).fetchall()
-                }
-                
-                # Find all MP3 files
-                mp3_files = []
-                for ext in ['.mp3', '.m4a', '.aac', '.wav', '.flac', '.ogg']:
-                    mp3_files.extend(glob.glob(os.path.join(rep['mp3_folder'], f'*{ext}')))
-                
-                stats['debug']['mp3_files_found'] = len(mp3_files)
-                
-                # Create songs from MP3 filenames
-                for mp3_path in mp3_files:
-                    # Skip if this MP3 is already linked to a song
-                    if mp3_path in linked_audio_paths:
-                        continue
-                    
-                    filename = os.path.basename(mp3_path)
-                    name_no_ext = os.path.splitext(filename)[0]
-                    
-                    # Parse filename format: "YYYY - Title - Artist" or "Title - Artist" or "Title"
-                    release_year = None
-                    artist = 'Unknown'
-                    title = name_no_ext.strip()
-                    
-                    if ' - ' in name_no_ext:
-                        parts = name_no_ext.split(' - ')
-                        
-                        # Check if first part is a 4-digit year
-                        if len(parts) >= 2 and parts[0].strip().isdigit() and len(parts[0].strip()) == 4:
-                            release_year = parts[0].strip()
-                            # Format: "YYYY - Title - Artist" or "YYYY - Title"
-                            if len(parts) >= 3:
-                                title = parts[1].strip()
-                                artist = parts[2].strip()
-                            else:
-                                title = parts[1].strip()
-                                artist = 'Unknown'
-                        else:
-                            # Format: "Title - Artist" or just "Title"
-                            if len(parts) >= 2:
-                                title = parts[0].strip()
-                                artist = parts[1].strip()
-                            else:
-                                title = parts[0].strip()
-                                artist = 'Unknown'
-                    
-                    # Check if song already exists by title
-                    if title.lower() not in existing_titles:
-                        # Get next song number
-                        max_num = cursor.execute(
-                            'SELECT COALESCE(MAX(song_number), 0) as max FROM songs WHERE repertoire_id = ?',
-                            (repertoire_id,)
-                        ).fetchone()['max']
-                        
-                        # Extract duration from MP3
-                        duration = extract_mp3_duration(mp3_path)
-                        
-                        # Determine initial target based on default skills (+1)
-                        default_count_row = cursor.execute(
-                            'SELECT COUNT(*) AS c FROM repertoire_skills WHERE repertoire_id = ?',
-                            (repertoire_id,)
-                        ).fetchone()
-                        default_skill_count = default_count_row['c'] if default_count_row else 0
-                        initial_target = max(1, default_skill_count + 1)
+        require_repertoire(cursor, repertoire_id, g.current_user['id'])
+        # A second click while a sync runs reports the running job instead of starting another
+        job = active_job(cursor, SYNC_JOB, repertoire_id)
 
-                        # Create new song with MP3 linked
-                        cursor.execute('''
-                            INSERT INTO songs (
-                                title, artist, song_number, repertoire_id, user_id,
-                                priority, practice_count, practice_target, date_added, audio_path, release_date, duration
-                            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        ''', (
-                            title, artist, max_num + 1, repertoire_id, rep['user_id'],
-                            'mid', 0, initial_target, datetime.now().isoformat(), mp3_path, release_year, duration
-                        ))
-                        
-                        song_id = cursor.lastrowid
-                        
-                        # Record song creation in sync history
-                        cursor.execute('''
-                            INSERT INTO sync_history (
-                                repertoire_id, sync_timestamp, operation_type, song_id, field_name, old_value, new_value
-                            ) VALUES (?, ?, ?, ?, ?, ?, ?)
-                        ''', (repertoire_id, sync_timestamp, 'song_created', song_id, None, None, None))
-                        
-                        # Assign default skills
-                        default_skills = cursor.execute(
-                            'SELECT skill_id FROM repertoire_skills WHERE repertoire_id = ?',
-                            (repertoire_id,)
-                        ).fetchall()
-                        
-                        for skill in default_skills:
-                            cursor.execute(
-                                'INSERT INTO song_skills (song_id, skill_id, is_mastered) VALUES (?, ?, ?)',
-                                (song_id, skill['skill_id'], 0)
-                            )
-                        
-                        stats['songs_added'] += 1
-                        stats['mp3_linked'] += 1
-                        existing_titles.add(title.lower())
-            except Exception as e:
-                stats['errors'].append(f'MP3 scan error: {str(e)}')
-        
-        # Step 2: Link MP3s to existing songs that don't have audio yet
-        if rep['mp3_folder'] and os.path.isdir(rep['mp3_folder']):
-            try:
-                # Get songs without audio
-                songs = cursor.execute(
-                    'SELECT id, title, artist FROM songs WHERE repertoire_id = ? AND audio_path IS NULL',
-                    (repertoire_id,)
-                ).fetchall()
-                
-                if songs:
-                    # Find all MP3 files
-                    mp3_files = []
-                    for ext in ['.mp3', '.m4a', '.aac', '.wav', '.flac', '.ogg']:
-                        mp3_files.extend(glob.glob(os.path.join(rep['mp3_folder'], f'*{ext}')))
-                    
-                    for song in songs:
-                        song_title = song['title'].lower()
-                        song_artist = song['artist'].lower()
-                        
-                        for mp3_path in mp3_files:
-                            filename = os.path.basename(mp3_path).lower()
-                            name_no_ext = os.path.splitext(filename)[0]
-                            
-                            # Match if filename contains title or matches "artist - title" pattern
-                            if (song_title in name_no_ext or 
-                                name_no_ext in song_title or
-                                f'{song_artist} - {song_title}' in name_no_ext):
-                                
-                                # Extract duration from MP3
-                                duration = extract_mp3_duration(mp3_path)
-                                
-                                # Record old value before updating
-                                cursor.execute('''
-                                    INSERT INTO sync_history (
-                                        repertoire_id, sync_timestamp, operation_type, song_id, field_name, old_value, new_value
-                                    ) VALUES (?, ?, ?, ?, ?, ?, ?)
-                                ''', (repertoire_id, sync_timestamp, 'field_updated', song['id'], 'audio_path', None, mp3_path))
-                                
-                                cursor.execute(
-                                    'UPDATE songs SET audio_path = ?, duration = ? WHERE id = ?',
-                                    (mp3_path, duration, song['id'])
-                                )
-                                stats['mp3_linked'] += 1
-                                break
-            except Exception as e:
-                stats['errors'].append(f'MP3 linking error: {str(e)}')
-        
-        # Step 3: Link sheets to songs
-        if rep['sheet_folder'] and os.path.isdir(rep['sheet_folder']):
-            try:
-                # Get all songs without charts
-                songs = cursor.execute(
-                    'SELECT id, title, artist FROM songs WHERE repertoire_id = ? AND chart_path IS NULL',
-                    (repertoire_id,)
-                ).fetchall()
-                
-                sheet_files = []
-                for ext in ['.pdf', '.png', '.jpg', '.jpeg', '.gif', '.txt', '.doc', '.docx', '.odt']:
-                    sheet_files.extend(glob.glob(os.path.join(rep['sheet_folder'], f'*{ext}')))
-                
-                stats['debug']['sheet_files_found'] = len(sheet_files)
-                
-                # Ensure charts folder exists
-                charts_folder = os.path.join(os.getcwd(), 'charts')
-                os.makedirs(charts_folder, exist_ok=True)
-                
-                for song in songs:
-                    song_title = song['title'].lower()
-                    song_artist = song['artist'].lower()
-                    
-                    # Find all matching sheets for this song
-                    matching_sheets = []
-                    for sheet_path in sheet_files:
-                        filename = os.path.basename(sheet_path).lower()
-                        name_no_ext = os.path.splitext(filename)[0]
-                        
-                        if (song_title in name_no_ext or 
-                            name_no_ext in song_title or
-                            f'{song_artist} - {song_title}' in name_no_ext):
-                            matching_sheets.append((sheet_path, filename))
-                    
-                    # Prioritize: "chords" first, then "chart", then any match
-                    best_sheet = None
-                    if matching_sheets:
-                        # First priority: files with "chords" in name
-                        chords_sheets = [s for s in matching_sheets if 'chords' in s[1]]
-                        if chords_sheets:
-                            best_sheet = chords_sheets[0][0]
-                        else:
-                            # Second priority: files with "chart" in name
-                            chart_sheets = [s for s in matching_sheets if 'chart' in s[1]]
-                            if chart_sheets:
-                                best_sheet = chart_sheets[0][0]
-                            else:
-                                # Use first match
-                                best_sheet = matching_sheets[0][0]
-                    
-                    if best_sheet:
-                        # Copy chart to local charts folder
-                        ext = os.path.splitext(best_sheet)[1]
-                        safe_title = ''.join(c for c in song['title'] if c.isalnum() or c in (' ', '-', '_')).strip()
-                        dest_filename = f'{song["id"]}_{safe_title}{ext}'
-                        dest_path = os.path.join(charts_folder, dest_filename)
-                        
-                        # Copy the file
-                        shutil.copy2(best_sheet, dest_path)
-                        
-                        # Record old value before updating (None since chart_path was NULL)
-                        cursor.execute('''
-                            INSERT INTO sync_history (
-                                repertoire_id, sync_timestamp, operation_type, song_id, field_name, old_value, new_value
-                            ) VALUES (?, ?, ?, ?, ?, ?, ?)
-                        ''', (repertoire_id, sync_timestamp, 'field_updated', song['id'], 'chart_path', None, dest_path))
-                        
-                        cursor.execute(
-                            'UPDATE songs SET chart_path = ? WHERE id = ?',
-                            (dest_path, song['id'])
-                        )
-                        stats['sheets_linked'] += 1
-            except Exception as e:
-                stats['errors'].append(f'Sheet sync error: {str(e)}')
-        
-        # Step 4: Check existing charts and copy to local folder if needed
-        try:
-            # Get all songs with charts that are NOT in the charts folder
-            charts_folder = os.path.join(os.getcwd(), 'charts')
-            charts_folder_pattern = charts_folder + '%'
-            
-            songs_with_external_charts = cursor.execute('''
-                SELECT id, title, chart_path 
-                FROM songs 
-                WHERE repertoire_id = ? 
-                AND chart_path IS NOT NULL 
-                AND chart_path NOT LIKE ?
-            ''', (repertoire_id, charts_folder_pattern)).fetchall()
-            
-            stats['debug']['external_charts_found'] = len(songs_with_external_charts)
-            
-            os.makedirs(charts_folder, exist_ok=True)
-            
-            for song in songs_with_external_charts:
-                old_chart_path = song['chart_path']
-                
-                # Resolve the path to work on any platform (Windows/WSL/Linux/Ubuntu)
-                resolved_chart_path = resolve_chart_path(old_chart_path)
-                
-                # Check if the file exists
-                if not os.path.exists(resolved_chart_path):
-                    continue
-                
-                # Copy to charts folder
-                ext = os.path.splitext(resolved_chart_path)[1]
-                safe_title = ''.join(c for c in song['title'] if c.isalnum() or c in (' ', '-', '_')).strip()
-                dest_filename = f'{song["id"]}_{safe_title}{ext}'
-                dest_path = os.path.join(charts_folder, dest_filename)
-                
-                # Copy the file
-                shutil.copy2(resolved_chart_path, dest_path)
-                
-                # Record the change
-                cursor.execute('''
-                    INSERT INTO sync_history (
-                        repertoire_id, sync_timestamp, operation_type, song_id, field_name, old_value, new_value
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (repertoire_id, sync_timestamp, 'chart_moved', song['id'], 'chart_path', old_chart_path, dest_path))
-                
-                # Update the database
-                cursor.execute(
-                    'UPDATE songs SET chart_path = ? WHERE id = ?',
-                    (dest_path, song['id'])
-                )
-                stats['charts_migrated'] += 1
-                
-        except Exception as e:
-            stats['errors'].append(f'Chart migration error: {str(e)}')
-        
-        return jsonify(stats)
+    if job:
+        job_id, status = job['id'], job['status']
+    else:
+        job_id = submit_job(SYNC_JOB, g.current_user['id'], repertoire_id, {'repertoire_id': repertoire_id})
+        status = 'queued'
+
+    return jsonify({'job_id': job_id, 'status': status, 'status_url': f'/api/jobs/{job_id}'}), 202
 
 
 @repertoires_bp.route('/api/repertoires/<int:repertoire_id>/undo-sync', methods=['POST'])
@@ -783,11 +447,14 @@ def undo_sync_repertoire(repertoire_id):
             'songs_deleted': 0,
             'audio_unlinked': 0,
             'charts_unlinked': 0,
-            'charts_restored': 0,
-            'files_deleted': 0
+            'charts_restored': 0
         }
         
-        charts_folder = os.path.join(os.getcwd(), 'charts')
+        streak_users = practice_log_users(
+            cursor,
+            "SELECT song_id FROM sync_history WHERE repertoire_id = ? AND operation_type = 'song_created'",
+            (repertoire_id,)
+        )
         
         # Reverse the operations
         for record in history:
@@ -806,38 +473,28 @@ def undo_sync_repertoire(repertoire_id):
                     stats['audio_unlinked'] += 1
                 
                 elif record['field_name'] == 'chart_path':
-                    # Delete the file from charts folder if it was created during sync
-                    if record['new_value'] and record['new_value'].startswith(charts_folder):
-                        try:
-                            if os.path.exists(record['new_value']):
-                                os.remove(record['new_value'])
-                                stats['files_deleted'] += 1
-                        except Exception as e:
-                            print(f"Error deleting file {record['new_value']}: {e}")
-                    
+                    # Only the reference goes; the stored chart is left to the chart store GC
                     cursor.execute(
-                        'UPDATE songs SET chart_path = ? WHERE id = ?',
-                        (record['old_value'], record['song_id'])
+                        'UPDATE songs SET chart_path = ?, chart_hash = ? WHERE id = ?',
+                        (record['old_value'], chart_hash_of(record['old_value']), record['song_id'])
                     )
                     stats['charts_unlinked'] += 1
             
             elif record['operation_type'] == 'chart_moved':
-                # Restore original chart path and delete copied file
-                if record['new_value'] and os.path.exists(record['new_value']):
-                    try:
-                        os.remove(record['new_value'])
-                        stats['files_deleted'] += 1
-                    except Exception as e:
-                        print(f"Error deleting file {record['new_value']}: {e}")
-                
+                # Point the song back at its original chart
                 cursor.execute(
-                    'UPDATE songs SET chart_path = ? WHERE id = ?',
-                    (record['old_value'], record['song_id'])
+                    'UPDATE songs SET chart_path = ?, chart_hash = ? WHERE id = ?',
+                    (record['old_value'], chart_hash_of(record['old_value']), record['song_id'])
                 )
                 stats['charts_restored'] += 1
         
         # Clear the sync history after undoing
         cursor.execute('DELETE FROM sync_history WHERE repertoire_id = ?', (repertoire_id,))
+        # Files whose songs were removed must be imported again by the next sync
+        clear_manifest(cursor, repertoire_id)
+        rebuild_user_streaks(cursor, streak_users)
+        # Deleted songs and restored durations both change the practice totals
+        rebuild_practice_rollup(cursor, [repertoire_id])
         
         return jsonify(stats)
 
@@ -951,20 +608,22 @@ def add_skills_to_all_songs(repertoire_id):
         })
 
 
-@repertoires_bp.route('/api/repertoires/<int:repertoire_id>/setlist-pdf', methods=['POST'])
+@repertoires_bp.route('/api/repertoires/<int:repertoire_id>/setlist-pdf', methods=['GET', 'POST'])
 @login_required
 def generate_setlist_pdf(repertoire_id):
-    """Generate a PDF setlist for a repertoire"""
-    data = request.json or {}
+    """Generate a PDF setlist for a repertoire.
+    Parameters come as JSON (POST) or in the query string (GET). PDFs are served from
+    the setlist cache when the range, title and songs are unchanged, with the cache key
+    as ETag, so GET requests revalidate with 304.
+    """
+    data = (request.get_json(silent=True) or {}) if request.method == 'POST' else request.args
     min_song_number = data.get('min_song_number', None)
     max_song_number = data.get('max_song_number', None)
     custom_title = data.get('custom_title', None)
     
-    # Convert to integers if provided
-    if min_song_number is not None:
-        min_song_number = int(min_song_number)
-    if max_song_number is not None:
-        max_song_number = int(max_song_number)
+    # Convert to integers if provided (query strings send empty fields as '')
+    min_song_number = int(min_song_number) if min_song_number not in (None, '') else None
+    max_song_number = int(max_song_number) if max_song_number not in (None, '') else None
     
     with get_db() as conn:
         cursor = conn.cursor()
@@ -978,8 +637,13 @@ def generate_setlist_pdf(repertoire_id):
         if not repertoire or (g.current_user['role'] != 'admin' and repertoire['user_id'] != g.current_user['id']):
             return jsonify({'error': 'Repertoire not found'}), 404
         
-        # Get songs within the range
-        query = 'SELECT song_number, title, performance_hints FROM songs WHERE repertoire_id = ?'
+        # Get songs within the range of positions (song_number itself is a sparse sort key)
+        query = f'''
+            SELECT song_number, title, performance_hints FROM (
+                SELECT {POSITION_SQL} AS song_number, title, performance_hints
+                FROM songs WHERE repertoire_id = ?
+            ) WHERE 1 = 1
+        '''
         params = [repertoire_id]
         
         if min_song_number is not None:
@@ -995,95 +659,30 @@ def generate_setlist_pdf(repertoire_id):
         
         if not songs:
             return jsonify({'error': 'No songs found'}), 404
-        
-        # Create PDF in memory
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=2*cm, bottomMargin=2*cm)
-        
-        # Container for PDF elements
-        elements = []
-        
-        # Styles
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=28,
-            textColor=colors.HexColor('#2c3e50'),
-            spaceAfter=30,
-            alignment=TA_CENTER,
-            fontName='Helvetica-Bold'
-        )
-        
-        # Song title style - black text
-        song_style = ParagraphStyle(
-            'SongTitle',
-            parent=styles['Normal'],
-            fontSize=20,
-            textColor=colors.black,
-            fontName='Helvetica'
-        )
-        
-        # Performance hints style - black text
-        hints_style = ParagraphStyle(
-            'PerformanceHints',
-            parent=styles['Normal'],
-            fontSize=14,
-            textColor=colors.black
-        )
-        
-        # Add title (use custom title if provided, otherwise repertoire name)
-        title_text = custom_title if custom_title else repertoire['name']
-        elements.append(Paragraph(title_text, title_style))
-        elements.append(Spacer(1, 0.5*cm))
-        
-        # Create setlist table data
-        table_data = []
-        for song in songs:
-            # Song title cell: ♠ Song Title ♠
-            song_title = f"♠ {song['title']} ♠"
-            song_title_paragraph = Paragraph(song_title, song_style)
 
-            # Performance hints cell (if any)
-            hints_paragraph = ""
-            if song['performance_hints']:
-                hints = song['performance_hints']
-                hints = re.sub(r'\*\*([^*]+)\*\*', r'\1', hints)
-                hints_paragraph = Paragraph(hints, hints_style)
-
-            table_data.append([
-                str(song['song_number']),
-                song_title_paragraph,
-                hints_paragraph
-            ])
-        
-        # Create table with three columns: number, title, hints
-        table = Table(table_data, colWidths=[2*cm, 10*cm, 6*cm])
-        table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (0, -1), 'CENTER'),
-            ('ALIGN', (1, 0), (2, -1), 'LEFT'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 20),
-            ('TOPPADDING', (0, 0), (-1, -1), 20),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')])
-        ]))
-        elements.append(table)
-        
-        # Build PDF
-        doc.build(elements)
-        
-        # Prepare response
-        buffer.seek(0)
-        today = datetime.now().strftime('%Y%m%d')
-        filename = f"{title_text.replace(' ', '_')}_setlist_{today}.pdf"
-        
-        return send_file(
-            buffer,
-            as_attachment=True,
-            download_name=filename,
-            mimetype='application/pdf'
-        )
+    # Add title (use custom title if provided, otherwise repertoire name)
+    title_text = custom_title if custom_title else repertoire['name']
+    key = setlist_cache_key(repertoire_id, min_song_number, max_song_number, custom_title, title_text, songs)
+    
+    # Rendering only happens when something in the setlist changed
+    path = cached_setlist_pdf(key)
+    if path is None:
+        path = store_setlist_pdf(key, render_setlist_pdf(title_text, songs))
+    
+    today = datetime.now().strftime('%Y%m%d')
+    filename = f"{title_text.replace(' ', '_')}_setlist_{today}.pdf"
+    
+    response = send_file(
+        path,
+        as_attachment=True,
+        download_name=filename,
+        mimetype='application/pdf',
+        conditional=True,
+        etag=key
+    )
+    # Always revalidate: the same URL gets a new PDF once songs change
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 @repertoires_bp.route('/api/repertoires/<int:repertoire_id>/import-drive-ids', methods=['POST'])
@@ -1114,16 +713,8 @@ def import_drive_ids(repertoire_id):
             (repertoire_id,)
         ).fetchall()
         
-        # Create a mapping of normalized titles to song IDs
-        # Normalize by removing extensions, lowercasing, stripping whitespace
-        title_to_song = {}
-        for song in songs:
-            # Normalize the song title
-            normalized = song['title'].lower().strip()
-            title_to_song[normalized] = song['id']
-            # Also try without common suffixes
-            if normalized.endswith(' (live)'):
-                title_to_song[normalized.replace(' (live)', '')] = song['id']
+        # Index normalized titles once; "(live)" and other bracketed suffixes normalize away
+        title_index = MatchIndex((song['title'], song['id']) for song in songs)
         
         matched = 0
         not_found = []
@@ -1135,23 +726,14 @@ def import_drive_ids(repertoire_id):
             if not filename or not drive_id:
                 continue
             
-            # Normalize filename (remove extension, lowercase, strip)
-            normalized_filename = filename.lower().strip()
             # Remove common audio extensions
-            for ext in ['.mp3', '.m4a', '.wav', '.flac', '.ogg', '.aac']:
-                if normalized_filename.endswith(ext):
-                    normalized_filename = normalized_filename[:-len(ext)]
-                    break
-            
-            # Try to find matching song
-            song_id = title_to_song.get(normalized_filename)
+            name = filename.strip()
+            if os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS:
+                name = os.path.splitext(name)[0]
             
-            # If not found, try partial matching
-            if not song_id:
-                for title, sid in title_to_song.items():
-                    if normalized_filename in title or title in normalized_filename:
-                        song_id = sid
-                        break
+            # Exact title first, otherwise the closest partial match
+            match = title_index.best_match(name)
+            song_id = match.value if match else None
             
             if song_id:
                 cursor.execute(
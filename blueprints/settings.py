@@ -3,6 +3,7 @@
 from flask import Blueprint, request, jsonify
 from database import get_db
 from utils.decorators import admin_required, login_required
+from services.auto_bump import load_difficulty_thresholds, bump_due_targets
 
 settings_bp = Blueprint('settings', __name__)
 
@@ -13,16 +14,7 @@ def get_difficulty_thresholds():
     """Return the practice auto-bump thresholds (days) per difficulty."""
     with get_db() as conn:
         cursor = conn.cursor()
-        rows = cursor.execute(
-            'SELECT key, value FROM settings WHERE key IN (?, ?, ?)',
-            ('threshold_easy_days', 'threshold_normal_days', 'threshold_hard_days')
-        ).fetchall()
-        m = {r['key']: int(r['value']) for r in rows}
-        return jsonify({
-            'easy': m.get('threshold_easy_days', 90),
-            'normal': m.get('threshold_normal_days', 60),
-            'hard': m.get('threshold_hard_days', 30),
-        })
+        return jsonify(load_difficulty_thresholds(cursor))
 
 
 @settings_bp.route('/api/settings/difficulty-thresholds', methods=['PUT'])
@@ -49,4 +41,6 @@ def update_difficulty_thresholds():
         cursor.execute('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)', ('threshold_easy_days', str(easy)))
         cursor.execute('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)', ('threshold_normal_days', str(normal)))
         cursor.execute('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)', ('threshold_hard_days', str(hard)))
+        # Apply the new thresholds right away instead of waiting for the next scheduled run
+        bump_due_targets(cursor)
         return jsonify({'message': 'Thresholds updated', 'easy': easy, 'normal': normal, 'hard': hard})
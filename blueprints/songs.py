@@ -1,11 +1,23 @@
-from flask import Blueprint, request, jsonify, Response, send_file, g, abort
+from flask import Blueprint, request, jsonify, send_file, g, abort, redirect, url_for
 from database import get_db
 from utils.decorators import login_required, admin_required
-from utils.permissions import resolve_scope_user_id, require_song, require_repertoire
-from utils.helpers import extract_mp3_duration
+from utils.permissions import resolve_scope_user_id, require_song, require_repertoire, accessible_song_ids
+from services.audio_metadata import audio_duration
+from services.chart_store import store_chart
+from services.chart_preview import can_preview, request_preview
+from utils.data_version import (
+    data_version_etag, not_modified, with_etag, read_data_versions, version_token, parse_version_token,
+    change_log_floor
+)
+from services.streaks import practice_log_users, rebuild_user_streaks
+from services.practice_rollup import rebuild_practice_rollup
+from services.practice import MAX_BATCH_EVENTS, apply_practice_events, parse_event_time, song_states
+from services.song_order import (
+    POSITION_SQL, append_song_number, song_number_at, song_position, move_song, apply_order
+)
 from datetime import datetime
 import os
-import shutil
+
 
 try:
     from mutagen.mp3 import MP3
@@ -17,7 +29,18 @@ songs_bp = Blueprint('songs', __name__)
 
 UPLOAD_FOLDER = os.path.join(os.getcwd(), 'uploads')
 ALLOWED_EXTS = {'.mp3', '.m4a', '.aac', '.wav', '.flac', '.ogg'}
+# Explicit so playback does not depend on the host's mimetypes registry
+AUDIO_MIMETYPES = {
+    '.mp3': 'audio/mpeg',
+    '.m4a': 'audio/mp4',
+    '.aac': 'audio/aac',
+    '.wav': 'audio/wav',
+    '.flac': 'audio/flac',
+    '.ogg': 'audio/ogg',
+}
 ALLOWED_CHART_EXTS = {'.pdf', '.png', '.jpg', '.jpeg', '.gif', '.txt', '.doc', '.docx', '.odt'}
+# Preview URLs are versioned by the chart's content hash
+CHART_PREVIEW_CACHE_CONTROL = 'private, max-age=31536000, immutable'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 # ==================== HELPER FUNCTIONS ====================
@@ -52,88 +75,173 @@ def resolve_chart_path(chart_path):
     # Otherwise return as-is (could be WSL /mnt/e/... or native /home/... or /root/...)
     return normalized
 
+def load_song_skills(cursor, scope_user_id, repertoire_id=None, song_ids=None):
+    """
+    Load skill mastery for all songs in scope with a constant number of queries.
+    Returns (skills, mastery) where skills is the ordered list of all skills and
+    mastery maps song_id -> {skill_id: is_mastered} for assigned skills only.
+    """
+    skills = cursor.execute('SELECT id, name FROM skills ORDER BY id').fetchall()
+
+    query = '''
+        SELECT ss.song_id, ss.skill_id, ss.is_mastered
+        FROM song_skills ss
+        JOIN songs s ON s.id = ss.song_id
+        WHERE s.user_id = ?
+    '''
+    params = [scope_user_id]
+    if repertoire_id:
+        query += ' AND s.repertoire_id = ?'
+        params.append(repertoire_id)
+    if song_ids is not None:
+        if not song_ids:
+            return skills, {}
+        query += ' AND s.id IN (%s)' % ','.join('?' * len(song_ids))
+        params.extend(song_ids)
+
+    mastery = {}
+    for row in cursor.execute(query, params):
+        mastery.setdefault(row['song_id'], {})[row['skill_id']] = row['is_mastered']
+    return skills, mastery
+
+
+def build_song_skills(skills, song_mastery):
+    """Build the per-song skills list (all skills, is_mastered None when unassigned)."""
+    return [
+        {'id': skill['id'], 'name': skill['name'], 'is_mastered': song_mastery.get(skill['id'])}
+        for skill in skills
+    ]
+
+
+def build_song_payload(song, position, all_skills, mastery):
+    """Serialize a songs row the way GET /api/songs returns it."""
+    song_dict = dict(song)
+    # song_number is a sparse sort key; clients see the 1..N position
+    song_dict['song_number'] = position
+    song_dict.pop('position', None)
+    song_dict.pop('updated_version', None)
+
+    skills = build_song_skills(all_skills, mastery.get(song['id'], {}))
+    song_dict['skills'] = skills
+
+    total_skills = len([s for s in skills if s['is_mastered'] is not None])
+    mastered_skills = len([s for s in skills if s['is_mastered'] == 1])
+    song_dict['skills_progress'] = (mastered_skills / total_skills * 100) if total_skills > 0 else 0
+    song_dict['practice_progress'] = (song_dict['practice_count'] / song_dict['practice_target'] * 100) if song_dict['practice_target'] > 0 else 0
+    return song_dict
+
+
+def list_songs(cursor, scope_user_id, repertoire_id=None):
+    """All songs of the scoped user (optionally one repertoire) as API payloads."""
+    if repertoire_id:
+        songs = cursor.execute(
+            f'''SELECT *, {POSITION_SQL} AS position FROM songs
+                WHERE user_id = ? AND repertoire_id = ? ORDER BY song_number ASC''',
+            (scope_user_id, repertoire_id)
+        ).fetchall()
+    else:
+        songs = cursor.execute(
+            f'''SELECT *, {POSITION_SQL} AS position FROM songs
+                WHERE user_id = ? ORDER BY repertoire_id, song_number ASC''',
+            (scope_user_id,)
+        ).fetchall()
+
+    # Load all skill assignments for the selected songs at once instead of per song
+    all_skills, mastery = load_song_skills(cursor, scope_user_id, repertoire_id)
+    return [build_song_payload(song, song['position'], all_skills, mastery) for song in songs]
+
+
+def songs_delta(cursor, scope_user_id, repertoire_id, since, current):
+    """
+    Changes to the song list since the (user, global) version pair `since`.
+    Returns changed rows in scope, ids to drop (deleted or moved out of scope) and
+    the positions of every song in repertoires whose ranking may have shifted.
+    Falls back to the full list when the shared skills list changed meanwhile, or
+    when tombstones the client has not seen were already pruned.
+    """
+    since_user, since_global = since
+    if (since_global != current[1] or since_user > current[0]
+            or since_user < change_log_floor(cursor, scope_user_id)):
+        return {'full': True, 'songs': list_songs(cursor, scope_user_id, repertoire_id),
+                'deleted': [], 'positions': {}}
+
+    changed = cursor.execute(
+        'SELECT * FROM songs WHERE user_id = ? AND updated_version > ?',
+        (scope_user_id, since_user)
+    ).fetchall()
+    log = cursor.execute(
+        'SELECT song_id, repertoire_id, deleted FROM song_change_log WHERE user_id = ? AND version > ?',
+        (scope_user_id, since_user)
+    ).fetchall()
+
+    affected = {row['repertoire_id'] for row in changed} | {row['repertoire_id'] for row in log}
+    affected.discard(None)
+    if repertoire_id:
+        affected &= {repertoire_id}
+    positions = {}
+    if affected:
+        affected = sorted(affected)
+        rows = cursor.execute(
+            f'''SELECT id, {POSITION_SQL} AS position FROM songs
+                WHERE user_id = ? AND repertoire_id IN ({','.join('?' * len(affected))})''',
+            [scope_user_id] + affected
+        ).fetchall()
+        positions = {row['id']: row['position'] for row in rows}
+
+    in_scope = [row for row in changed if not repertoire_id or row['repertoire_id'] == repertoire_id]
+    removed = {row['song_id'] for row in log if row['deleted']}
+    removed |= {row['id'] for row in changed if repertoire_id and row['repertoire_id'] != repertoire_id}
+
+    all_skills, mastery = load_song_skills(cursor, scope_user_id, song_ids=[row['id'] for row in in_scope])
+    return {
+        'full': False,
+        'songs': [
+            build_song_payload(row, positions.get(row['id']), all_skills, mastery)
+            for row in in_scope
+        ],
+        'deleted': sorted(removed),
+        'positions': positions,
+    }
+
 # ==================== SONGS API ====================
 
 @songs_bp.route('/api/songs', methods=['GET'])
 @login_required
 def get_songs():
-    """Get all songs for the scoped user, optionally filtered by repertoire"""
+    """
+    Get all songs for the scoped user, optionally filtered by repertoire.
+    With ?since=<version> (the X-Data-Version of an earlier response) only the
+    changes since then are returned, together with the new version.
+    """
     repertoire_id = request.args.get('repertoire_id', type=int)
     requested_user_id = request.args.get('user_id', type=int)
+    since = request.args.get('since')
     scope_user_id = resolve_scope_user_id(get_db, requested_user_id)
 
-    # Auto-bump targets for full bars that have aged past difficulty-based thresholds
-    now = datetime.now()
-
     with get_db() as conn:
         cursor = conn.cursor()
 
-        # Load difficulty thresholds from settings table (admin configurable)
-        try:
-            rows = cursor.execute(
-                'SELECT key, value FROM settings WHERE key IN (?, ?, ?)',
-                ('threshold_easy_days', 'threshold_normal_days', 'threshold_hard_days')
-            ).fetchall()
-            settings_map = {row['key']: int(row['value']) for row in rows}
-        except Exception:
-            settings_map = {}
-
-        difficulty_threshold_days = {
-            'easy': settings_map.get('threshold_easy_days', 90),
-            'normal': settings_map.get('threshold_normal_days', 60),
-            'hard': settings_map.get('threshold_hard_days', 30),
-        }
-
         if repertoire_id:
             require_repertoire(cursor, repertoire_id, scope_user_id)
-            songs = cursor.execute(
-                '''SELECT * FROM songs WHERE user_id = ? AND repertoire_id = ? ORDER BY song_number ASC''',
-                (scope_user_id, repertoire_id)
-            ).fetchall()
-        else:
-            songs = cursor.execute(
-                '''SELECT * FROM songs WHERE user_id = ? ORDER BY repertoire_id, song_number ASC''',
-                (scope_user_id,)
-            ).fetchall()
 
-        songs_list = []
-        for song in songs:
-            song_dict = dict(song)
-
-            practice_target = song_dict.get('practice_target') or 0
-            practice_count = song_dict.get('practice_count') or 0
-            last_practiced = song_dict.get('last_practiced')
-            difficulty = song_dict.get('difficulty') or 'normal'
-            threshold_days = difficulty_threshold_days.get(difficulty, difficulty_threshold_days['normal'])
-
-            if practice_target > 0 and practice_count >= practice_target and last_practiced:
-                try:
-                    last_practiced_dt = datetime.fromisoformat(last_practiced)
-                    days_since = (now - last_practiced_dt).days
-                    if days_since >= threshold_days:
-                        new_target = practice_target + 1
-                        cursor.execute('UPDATE songs SET practice_target = ? WHERE id = ?', (new_target, song_dict['id']))
-                        song_dict['practice_target'] = new_target
-                except Exception:
-                    pass
-
-            skills = cursor.execute('''
-                SELECT s.id, s.name, ss.is_mastered
-                FROM skills s
-                LEFT JOIN song_skills ss ON s.id = ss.skill_id AND ss.song_id = ?
-                ORDER BY s.id
-            ''', (song['id'],)).fetchall()
-
-            song_dict['skills'] = [dict(skill) for skill in skills]
-
-            total_skills = len([s for s in skills if s['is_mastered'] is not None])
-            mastered_skills = len([s for s in skills if s['is_mastered'] == 1])
-            song_dict['skills_progress'] = (mastered_skills / total_skills * 100) if total_skills > 0 else 0
-            song_dict['practice_progress'] = (song_dict['practice_count'] / song_dict['practice_target'] * 100) if song_dict['practice_target'] > 0 else 0
-
-            songs_list.append(song_dict)
-
-        return jsonify(songs_list)
+        versions = read_data_versions(cursor, scope_user_id)
+        if since is not None:
+            try:
+                since_versions = parse_version_token(since)
+            except ValueError:
+                return jsonify({'error': 'Invalid since version'}), 400
+            delta = songs_delta(cursor, scope_user_id, repertoire_id, since_versions, versions)
+            delta['version'] = version_token(versions)
+            return jsonify(delta)
+
+        etag = data_version_etag(cursor, 'songs', scope_user_id, repertoire_id or 'all', versions=versions)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+
+        response = with_etag(jsonify(list_songs(cursor, scope_user_id, repertoire_id)), etag)
+        response.headers['X-Data-Version'] = version_token(versions)
+        return response
 
 @songs_bp.route('/api/songs', methods=['POST'])
 @login_required
@@ -161,13 +269,18 @@ def create_song():
         except Exception:
             initial_target = data.get('practice_target', 0) or 1
 
+        if data.get('song_number') is not None:
+            song_number = song_number_at(cursor, repertoire['id'], data['song_number'])
+        else:
+            song_number = append_song_number(cursor, repertoire['id'])
+
         cursor.execute('''
             INSERT INTO songs (title, artist, song_number, repertoire_id, user_id, priority, practice_target, date_added, release_date, notes, performance_hints, drive_file_id)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
             data['title'],
             data['artist'],
-            data.get('song_number', 1),
+            song_number,
             repertoire['id'],
             user_id,
             data.get('priority', 'mid'),
@@ -215,11 +328,12 @@ def archive_song(song_id):
         if song['repertoire_id'] == archive_id:
             return jsonify({'message': 'Song is already in Archive'}), 200
         
-        # Move the song to Archive
+        # Move the song to the end of Archive
         cursor.execute(
-            'UPDATE songs SET repertoire_id = ? WHERE id = ?',
-            (archive_id, song_id)
+            'UPDATE songs SET repertoire_id = ?, song_number = ? WHERE id = ?',
+            (archive_id, append_song_number(cursor, archive_id), song_id)
         )
+        rebuild_practice_rollup(cursor, [song['repertoire_id'], archive_id])
         
         return jsonify({'message': 'Song moved to Archive'}), 200
 
@@ -233,7 +347,7 @@ def update_song(song_id):
         cursor = conn.cursor()
 
         song_row = require_song(cursor, song_id, g.current_user['id'])
-        old_number = song_row['song_number']
+        old_number = song_position(cursor, song_row)
         old_repertoire_id = song_row['repertoire_id']
         
         # Check if repertoire_id is being changed
@@ -247,24 +361,20 @@ def update_song(song_id):
             if not new_rep:
                 return jsonify({'error': 'Repertoire not found'}), 404
             
-            # Get the max song_number in the target repertoire and append
-            max_number_row = cursor.execute(
-                'SELECT MAX(song_number) as max_num FROM songs WHERE repertoire_id = ?',
-                (new_repertoire_id,)
-            ).fetchone()
-            new_number = (max_number_row['max_num'] or 0) + 1
+            # Append after the last song in the target repertoire
+            new_number = append_song_number(cursor, new_repertoire_id)
             
             # Update the repertoire_id and song_number
             cursor.execute(
                 'UPDATE songs SET repertoire_id = ?, song_number = ? WHERE id = ?',
                 (new_repertoire_id, new_number, song_id)
             )
+            rebuild_practice_rollup(cursor, [old_repertoire_id, new_repertoire_id])
             
             # Return early - moving between repertoires is a complete operation
             return jsonify({'message': 'Song moved successfully'}), 200
         
         # Normal update within same repertoire
-        repertoire_id = old_repertoire_id
         new_number = data.get('song_number', old_number)
         if not isinstance(new_number, int):
             try:
@@ -273,33 +383,20 @@ def update_song(song_id):
                 new_number = old_number
 
         if old_number != new_number:
-            rows = cursor.execute(
-                'SELECT id FROM songs WHERE repertoire_id = ? ORDER BY song_number ASC, id ASC',
-                (repertoire_id,)
-            ).fetchall()
-            ids = [r['id'] for r in rows if r['id'] != song_id]
-            max_count = len(ids) + 1
-            new_number = max(1, min(new_number, max_count))
-            ids.insert(new_number - 1, song_id)
-
-            base = 100000
-            for i, sid in enumerate(ids, start=1):
-                cursor.execute('UPDATE songs SET song_number = ? WHERE id = ?', (base + i, sid))
-            for i, sid in enumerate(ids, start=1):
-                cursor.execute('UPDATE songs SET song_number = ? WHERE id = ?', (i, sid))
+            # Only this song's sort key changes; its neighbours stay put
+            move_song(cursor, song_row, new_number)
 
         target = data.get('practice_target', 0)
         target = max(1, target) if target else 1  # Enforce minimum of 1
         
         cursor.execute('''
             UPDATE songs
-            SET title = ?, artist = ?, song_number = ?, priority = ?, 
+            SET title = ?, artist = ?, priority = ?, 
                 practice_target = ?, release_date = ?, notes = ?, performance_hints = ?, drive_file_id = ?
             WHERE id = ?
         ''', (
             data.get('title'),
             data.get('artist'),
-            new_number,
             data.get('priority', 'mid'),
             target,
             data.get('release_date'),
@@ -347,8 +444,12 @@ def delete_song(song_id):
     """Delete a song"""
     with get_db() as conn:
         cursor = conn.cursor()
-        require_song(cursor, song_id, g.current_user['id'])
+        song = require_song(cursor, song_id, g.current_user['id'])
+        streak_users = practice_log_users(cursor, '?', (song_id,))
         cursor.execute('DELETE FROM songs WHERE id = ?', (song_id,))
+        # The song's practice log rows cascade away; streaks and rollup follow the log
+        rebuild_user_streaks(cursor, streak_users)
+        rebuild_practice_rollup(cursor, [song['repertoire_id']])
 
         return jsonify({'message': 'Song deleted successfully'})
 
@@ -357,65 +458,76 @@ def delete_song(song_id):
 @songs_bp.route('/api/songs/<int:song_id>/practice', methods=['POST'])
 @login_required
 def practice_song(song_id):
-    """Mark a song as practiced (increment counter and update last practiced)"""
+    """
+    Mark a song as practiced (increment counter and update last practiced).
+    An optional client_event_id (JSON body or Idempotency-Key header) makes retries safe.
+    """
+    data = request.get_json(silent=True) or {}
+    event_id = data.get('client_event_id') or request.headers.get('Idempotency-Key')
+    if event_id is not None and (not isinstance(event_id, str) or len(event_id) > 128):
+        return jsonify({'error': 'client_event_id must be a string'}), 400
+
     with get_db() as conn:
         cursor = conn.cursor()
         require_song(cursor, song_id, g.current_user['id'])
+        statuses, _ = apply_practice_events(cursor, g.current_user['id'], [
+            {'song_id': song_id, 'practiced_at': datetime.now(), 'client_event_id': event_id or None}
+        ])
 
-        now = datetime.now().isoformat()
-
-        # Increment practice count
-        cursor.execute(
-            'UPDATE songs SET practice_count = practice_count + 1, last_practiced = ? WHERE id = ?',
-            (now, song_id)
-        )
+        if statuses == ['duplicate']:
+            return jsonify({'message': 'Practice already recorded'})
+        return jsonify({'message': 'Practice recorded successfully'})
 
-        # Fetch updated counts and skill status
-        updated = cursor.execute(
-            'SELECT practice_count, practice_target FROM songs WHERE id = ?',
-            (song_id,)
-        ).fetchone()
+@songs_bp.route('/api/practice/batch', methods=['POST'])
+@login_required
+def practice_batch():
+    """
+    Record a batch of practice taps in one transaction.
+    Body: {"events": [{"song_id", "timestamp", "client_event_id"}, ...]}. Replaying an
+    event with a client_event_id that was already applied is a no-op.
+    """
+    data = request.get_json(silent=True) or {}
+    raw_events = data.get('events')
+    if not isinstance(raw_events, list) or not raw_events:
+        return jsonify({'error': 'events must be a non-empty list'}), 400
+    if len(raw_events) > MAX_BATCH_EVENTS:
+        return jsonify({'error': f'At most {MAX_BATCH_EVENTS} events per batch'}), 400
 
-        # Count not mastered skills for this song
-        not_mastered_count = cursor.execute('''
-            SELECT COUNT(*) as count FROM song_skills
-            WHERE song_id = ? AND is_mastered = 0
-        ''', (song_id,)).fetchone()['count']
-
-        # Ensure practice_target never falls behind practice_count
-        # This prevents practice progress from exceeding 100%
-        if updated:
-            new_practice_count = updated['practice_count']
-            current_target = updated['practice_target'] or 0
-            
-            # If count exceeds target, bump target to match count
-            if new_practice_count > current_target:
-                cursor.execute(
-                    'UPDATE songs SET practice_target = ? WHERE id = ?',
-                    (new_practice_count, song_id)
-                )
-            # If there are unmastered skills, ensure target is at least (count + unmastered)
-            elif not_mastered_count > 0 and current_target <= (new_practice_count + not_mastered_count):
-                new_target = current_target + 1
-                cursor.execute(
-                    'UPDATE songs SET practice_target = ? WHERE id = ?',
-                    (new_target, song_id)
-                )
+    now = datetime.now()
+    events = []
+    for raw in raw_events:
+        if not isinstance(raw, dict):
+            return jsonify({'error': 'Each event must be an object'}), 400
+        song_id = raw.get('song_id')
+        event_id = raw.get('client_event_id')
+        if not isinstance(song_id, int) or isinstance(song_id, bool):
+            return jsonify({'error': 'song_id must be an integer'}), 400
+        if event_id is not None and (not isinstance(event_id, str) or not event_id or len(event_id) > 128):
+            return jsonify({'error': 'client_event_id must be a non-empty string'}), 400
+        try:
+            practiced_at = parse_event_time(raw.get('timestamp'), now)
+        except (TypeError, ValueError, OverflowError, OSError):
+            return jsonify({'error': f'Invalid timestamp for song {song_id}'}), 400
+        events.append({'song_id': song_id, 'practiced_at': practiced_at, 'client_event_id': event_id})
 
-        cursor.execute(
-            'INSERT INTO practice_sessions (song_id, practiced_at) VALUES (?, ?)',
-            (song_id, now)
+    with get_db() as conn:
+        cursor = conn.cursor()
+        allowed = accessible_song_ids(cursor, [e['song_id'] for e in events], g.current_user['id'])
+        statuses, song_ids = apply_practice_events(
+            cursor, g.current_user['id'], [e for e in events if e['song_id'] in allowed], now
         )
-
-        # Log daily practice count for effort tracking
-        practice_date = datetime.now().strftime('%Y-%m-%d')
-        cursor.execute('''
-            INSERT INTO practice_date_log (song_id, user_id, practice_date, practice_count)
-            VALUES (?, ?, ?, 1)
-            ON CONFLICT(song_id, user_id, practice_date) DO UPDATE SET practice_count = practice_count + 1
-        ''', (song_id, g.current_user['id'], practice_date))
-
-        return jsonify({'message': 'Practice recorded successfully'})
+        # Deleted or foreign songs are reported so an outbox can drop those events
+        applied_statuses = iter(statuses)
+        results = [
+            {
+                'client_event_id': e['client_event_id'],
+                'song_id': e['song_id'],
+                'status': next(applied_statuses) if e['song_id'] in allowed else 'rejected'
+            }
+            for e in events
+        ]
+
+        return jsonify({'events': results, 'songs': song_states(cursor, song_ids)})
 
 @songs_bp.route('/api/songs/<int:song_id>/target/increase', methods=['POST'])
 @login_required
@@ -443,7 +555,12 @@ def increase_target(song_id):
 @songs_bp.route('/api/songs/<int:song_id>/skills/<int:skill_id>/toggle', methods=['POST'])
 @login_required
 def toggle_skill(song_id, skill_id):
-    """Toggle skill mastery status"""
+    """
+    Toggle skill mastery status.
+    With {"is_mastered": true|false} the skill is set to that state instead, so a
+    replayed request (e.g. from the offline outbox) does not flip it back.
+    """
+    data = request.get_json(silent=True) or {}
     with get_db() as conn:
         cursor = conn.cursor()
         require_song(cursor, song_id, g.current_user['id'])
@@ -456,7 +573,12 @@ def toggle_skill(song_id, skill_id):
         if result is None:
             return jsonify({'error': 'Skill not assigned to this song'}), 404
 
-        new_status = 0 if result['is_mastered'] == 1 else 1
+        if 'is_mastered' in data:
+            new_status = 1 if data['is_mastered'] else 0
+            if new_status == result['is_mastered']:
+                return jsonify({'is_mastered': new_status})
+        else:
+            new_status = 0 if result['is_mastered'] == 1 else 1
 
         cursor.execute(
             'UPDATE song_skills SET is_mastered = ? WHERE song_id = ? AND skill_id = ?',
@@ -542,7 +664,7 @@ def toggle_difficulty(song_id):
 @songs_bp.route('/api/songs/reorder', methods=['POST'])
 @login_required
 def reorder_songs():
-    """Reorder songs by array of song IDs in desired order; song_number becomes 1..N within repertoire."""
+    """Reorder songs by array of song IDs in desired order; only songs that moved are rewritten."""
     data = request.json or {}
     ordered_ids = data.get('ordered_ids', [])
     repertoire_id = data.get('repertoire_id')
@@ -557,30 +679,33 @@ def reorder_songs():
         if repertoire_id:
             require_repertoire(cursor, repertoire_id, scope_user_id)
             existing = cursor.execute(
-                'SELECT id FROM songs WHERE repertoire_id = ? AND user_id = ? ORDER BY song_number ASC, id ASC',
+                'SELECT id, repertoire_id FROM songs WHERE repertoire_id = ? AND user_id = ? ORDER BY song_number ASC, id ASC',
                 (repertoire_id, scope_user_id)
             ).fetchall()
         else:
             existing = cursor.execute(
-                'SELECT id FROM songs WHERE user_id = ? ORDER BY song_number ASC, id ASC',
+                'SELECT id, repertoire_id FROM songs WHERE user_id = ? ORDER BY song_number ASC, id ASC',
                 (scope_user_id,)
             ).fetchall()
         
-        existing_ids = [row['id'] for row in existing]
-        if not existing_ids:
+        song_repertoires = {row['id']: row['repertoire_id'] for row in existing}
+        if not song_repertoires:
             return jsonify({'error': 'No songs available to reorder'}), 400
 
+        if any(sid not in song_repertoires for sid in ordered_ids):
+            return jsonify({'error': 'Invalid song id in ordered_ids'}), 400
+
+        ordered_ids = list(dict.fromkeys(ordered_ids))
         seen = set(ordered_ids)
-        remaining = [sid for sid in existing_ids if sid not in seen]
+        remaining = [row['id'] for row in existing if row['id'] not in seen]
         full_order = ordered_ids + remaining
 
-        base = 100000
-        for i, sid in enumerate(full_order, start=1):
-            if sid not in existing_ids:
-                return jsonify({'error': 'Invalid song id in ordered_ids'}), 400
-            cursor.execute('UPDATE songs SET song_number = ? WHERE id = ?', (base + i, sid))
-        for i, sid in enumerate(full_order, start=1):
-            cursor.execute('UPDATE songs SET song_number = ? WHERE id = ?', (i, sid))
+        # Each repertoire keeps its own sequence, in the relative order given
+        per_repertoire = {}
+        for sid in full_order:
+            per_repertoire.setdefault(song_repertoires[sid], []).append(sid)
+        for rep_id, ids in per_repertoire.items():
+            apply_order(cursor, rep_id, ids)
 
         return jsonify({'message': 'Order updated', 'count': len(full_order)})
 
@@ -589,7 +714,11 @@ def reorder_songs():
 @songs_bp.route('/media/<int:song_id>')
 @login_required
 def media(song_id):
-    """Serve the linked audio file for a song, if present."""
+    """Stream the linked audio file for a song, if present.
+
+    send_file streams from disk in chunks and answers Range requests with
+    206 Partial Content and If-None-Match / If-Modified-Since with 304.
+    """
     with get_db() as conn:
         cur = conn.cursor()
         song = require_song(cur, song_id, g.current_user['id'])
@@ -599,11 +728,16 @@ def media(song_id):
         wsl_path = windows_path_to_wsl(path)
         if not os.path.isfile(wsl_path):
             abort(404)
-        with open(wsl_path, 'rb') as f:
-            data = f.read()
-        response = Response(data, mimetype='audio/mpeg')
-        response.headers['Content-Disposition'] = f'attachment; filename="{os.path.basename(path)}"'
-        return response
+        ext = os.path.splitext(wsl_path)[1].lower()
+        return send_file(
+            wsl_path,
+            mimetype=AUDIO_MIMETYPES.get(ext, 'application/octet-stream'),
+            as_attachment=True,
+            download_name=os.path.basename(path),
+            conditional=True,
+            etag=True,
+            max_age=0,
+        )
 
 @songs_bp.route('/chart/<int:song_id>')
 @login_required
@@ -618,7 +752,64 @@ def chart(song_id):
         wsl_path = windows_path_to_wsl(path)
         if not os.path.isfile(wsl_path):
             abort(404)
-        return send_file(wsl_path, as_attachment=False, download_name=os.path.basename(path))
+        # Store blobs are named by hash; offer the song title instead
+        download_name = os.path.basename(path)
+        if song['chart_hash']:
+            download_name = song['title'] + os.path.splitext(path)[1]
+        return send_file(wsl_path, as_attachment=False, download_name=download_name)
+
+@songs_bp.route('/chart/<int:song_id>/preview')
+@login_required
+def chart_preview(song_id):
+    """Serve the rendered preview of a song's chart: the PDF, or one page image with ?page=N.
+    URLs carry the chart's content hash (?v=) and never change content, so they are cached
+    for good; requests for any other version redirect to the current one. Charts without a
+    preview, or whose preview is still rendering, redirect to the original file.
+    """
+    with get_db() as conn:
+        song = require_song(conn.cursor(), song_id, g.current_user['id'])
+    digest = song['chart_hash']
+    if not digest or not can_preview(song['chart_path']):
+        return redirect(url_for('songs.chart', song_id=song_id))
+
+    page = request.args.get('page', type=int)
+    if request.args.get('v') != digest:
+        return redirect(url_for('songs.chart_preview', song_id=song_id, v=digest, page=page))
+    # Rendered in the background on first view; never waited for here
+    preview, _ = request_preview(song['chart_path'], digest)
+    if preview is None:
+        return redirect(url_for('songs.chart', song_id=song_id))
+    if page is None:
+        path, download_name = preview['pdf'], song['title'] + '.pdf'
+    elif 1 <= page <= len(preview['pages']):
+        path = preview['pages'][page - 1]
+        download_name = f"{song['title']} {page}{os.path.splitext(path)[1]}"
+    else:
+        abort(404)
+    response = send_file(path, as_attachment=False, download_name=download_name, conditional=True, etag=True)
+    response.headers['Cache-Control'] = CHART_PREVIEW_CACHE_CONTROL
+    return response
+
+@songs_bp.route('/api/songs/<int:song_id>/chart/preview')
+@login_required
+def chart_preview_info(song_id):
+    """URLs of a chart's rendered PDF and page images; 202 with pending while it renders."""
+    with get_db() as conn:
+        song = require_song(conn.cursor(), song_id, g.current_user['id'])
+    digest = song['chart_hash']
+    preview, pending = request_preview(song['chart_path'], digest) if digest else (None, False)
+    if pending:
+        return jsonify({'pending': True}), 202
+    if preview is None:
+        return jsonify({'error': 'No preview available for this chart'}), 404
+    return jsonify({
+        'pending': False,
+        'pdf': url_for('songs.chart_preview', song_id=song_id, v=digest),
+        'pages': [
+            url_for('songs.chart_preview', song_id=song_id, v=digest, page=page)
+            for page in range(1, len(preview['pages']) + 1)
+        ],
+    })
 
 @songs_bp.route('/api/songs/<int:song_id>/audio', methods=['POST', 'DELETE'])
 @login_required
@@ -633,6 +824,8 @@ def manage_audio(song_id):
 
         if request.method == 'DELETE':
             cur.execute('UPDATE songs SET audio_path = NULL, duration = NULL WHERE id = ?', (song_id,))
+            if exist['duration'] is not None:
+                rebuild_practice_rollup(cur, [exist['repertoire_id']])
             return jsonify({'message': 'Audio link removed'})
 
         # POST - link to file path
@@ -651,10 +844,12 @@ def manage_audio(song_id):
         if not os.path.exists(file_path):
             return jsonify({'error': 'File not found at specified path'}), 404
         
-        # Extract duration from MP3 if possible
-        duration = extract_mp3_duration(file_path) if ext in {'.mp3', '.m4a', '.aac', '.wav', '.flac', '.ogg'} else None
+        # Duration from the media metadata cache, probing the file if it is new or changed
+        duration = audio_duration(file_path)
         
         cur.execute('UPDATE songs SET audio_path = ?, duration = ? WHERE id = ?', (file_path, duration, song_id))
+        if duration != exist['duration']:
+            rebuild_practice_rollup(cur, [exist['repertoire_id']])
         response = {'message': 'Audio linked', 'audio_path': file_path}
         if duration:
             response['duration'] = duration
@@ -664,7 +859,7 @@ def manage_audio(song_id):
 @login_required
 def manage_chart(song_id):
     """Attach or remove chart for a song.
-    POST with JSON field 'file_path' to copy file to charts/ folder.
+    POST with JSON field 'file_path' to store the file in the chart store.
     DELETE to unlink existing chart_path.
     """
     with get_db() as conn:
@@ -672,10 +867,10 @@ def manage_chart(song_id):
         exist = require_song(cur, song_id, g.current_user['id'])
 
         if request.method == 'DELETE':
-            cur.execute('UPDATE songs SET chart_path = NULL WHERE id = ?', (song_id,))
+            cur.execute('UPDATE songs SET chart_path = NULL, chart_hash = NULL WHERE id = ?', (song_id,))
             return jsonify({'message': 'Chart link removed'})
 
-        # POST - copy file to charts folder
+        # POST - store file in the chart store
         data = request.json
         if not data or 'file_path' not in data:
             return jsonify({'error': 'No file_path provided'}), 400
@@ -691,19 +886,9 @@ def manage_chart(song_id):
         if not os.path.exists(file_path):
             return jsonify({'error': 'File not found at specified path'}), 404
         
-        # Copy file to charts folder
-        charts_folder = os.path.join(os.getcwd(), 'charts')
-        os.makedirs(charts_folder, exist_ok=True)
-        
-        # Get song title for filename
-        song = cur.execute('SELECT title FROM songs WHERE id = ?', (song_id,)).fetchone()
-        safe_title = ''.join(c for c in song['title'] if c.isalnum() or c in (' ', '-', '_')).strip()
-        dest_filename = f'{song_id}_{safe_title}{ext}'
-        dest_path = os.path.join(charts_folder, dest_filename)
-        
-        # Copy the file
-        shutil.copy2(file_path, dest_path)
+        # Stored once by content: re-importing the same chart writes nothing
+        dest_path, digest = store_chart(file_path)
         
         # Update database with local path
-        cur.execute('UPDATE songs SET chart_path = ? WHERE id = ?', (dest_path, song_id))
+        cur.execute('UPDATE songs SET chart_path = ?, chart_hash = ? WHERE id = ?', (dest_path, digest, song_id))
         return jsonify({'message': 'Chart uploaded', 'chart_path': dest_path})
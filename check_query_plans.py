@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+EXPLAIN QUERY PLAN regression check for the hot API endpoints.
+
+Builds a migrated synthetic database, calls each endpoint through the Flask
+test client, captures every statement it runs and explains it. Exits with
+status 1 if any statement scans a whole table instead of searching an index.
+
+Usage: python check_query_plans.py [--verbose]
+"""
+
+import re
+import sqlite3
+import sys
+import threading
+
+from benchmarks.synthetic import use_temp_database, populate_user
+
+# Lookup tables small enough that a scan is the right plan
+SCAN_ALLOWED_TABLES = {'skills', 'settings'}
+
+# (method, url[, json body]); {rep} is replaced by a repertoire id, {song} by a song id,
+# {version} by a delta sync token a few changes behind
+HOT_ENDPOINTS = [
+    ('GET', '/api/songs'),
+    ('GET', '/api/songs?repertoire_id={rep}'),
+    ('GET', '/api/songs?since={version}'),
+    ('GET', '/api/repertoires'),
+    ('GET', '/api/repertoires/{rep}/time-practiced'),
+    ('GET', '/api/dashboard/summary?period=all'),
+    ('GET', '/api/dashboard/summary?period=month&repertoire_id={rep}'),
+    ('GET', '/api/dashboard/streaks'),
+    ('GET', '/api/dashboard/activity'),
+    ('GET', '/api/dashboard/activity?repertoire_id={rep}'),
+    ('GET', '/api/dashboard/trends?period=year'),
+    ('GET', '/api/dashboard/trends?period=month&repertoire_id={rep}'),
+    ('GET', '/api/dashboard/repertoire-breakdown?period=year'),
+    ('POST', '/api/songs/{song}/practice'),
+    ('POST', '/api/practice/batch', {'events': [
+        {'song_id': '{song}', 'timestamp': None, 'client_event_id': 'plan-check-1'},
+        {'song_id': '{song}', 'timestamp': None, 'client_event_id': 'plan-check-2'},
+    ]}),
+]
+
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+SQL_KEYWORDS = {
+    'WHERE', 'JOIN', 'LEFT', 'INNER', 'CROSS', 'ON', 'USING', 'GROUP', 'ORDER',
+    'LIMIT', 'SET', 'VALUES', 'AND', 'OR', 'UNION', 'EXCEPT', 'WINDOW',
+}
+TABLE_REF = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+
+
+def table_aliases(sql, tables):
+    """Map every name a base table goes by in `sql` (itself or its alias) to the table."""
+    names = {}
+    for table, alias in TABLE_REF.findall(sql):
+        if table not in tables:
+            continue
+        names[table] = table
+        if alias and alias.upper() not in SQL_KEYWORDS:
+            names[alias] = table
+    return names
+
+
+def full_scans(conn, sql, tables):
+    """Return (plan, [scanned tables]) for one statement."""
+    plan = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}').fetchall()]
+    names = table_aliases(sql, tables)
+    scanned = []
+    for detail in plan:
+        match = re.match(r'SCAN (\w+)', detail)
+        if not match or match.group(1) not in names:
+            continue
+        table = names[match.group(1)]
+        if table not in SCAN_ALLOWED_TABLES:
+            scanned.append(table)
+    return plan, scanned
+
+
+def fill_template(value, **ids):
+    """Substitute {rep}/{song} in a URL or JSON body; a bare placeholder becomes an int."""
+    if isinstance(value, dict):
+        return {k: fill_template(v, **ids) for k, v in value.items()}
+    if isinstance(value, list):
+        return [fill_template(v, **ids) for v in value]
+    if isinstance(value, str):
+        if value in ('{rep}', '{song}'):
+            return int(value.format(**ids))
+        return value.format(**ids)
+    return value
+
+
+def capture_statements(client, method, url, body=None):
+    """Run one request and return the SQL statements it executed."""
+    import database
+    statements = []
+    pool = database.get_pool()
+    conn = pool.acquire()
+    # Only statements from this thread; the scheduler thread may borrow the connection too
+    conn.set_trace_callback(
+        lambda sql: statements.append(sql) if threading.current_thread() is threading.main_thread() else None
+    )
+    pool.release(conn)
+    try:
+        response = client.open(url, method=method, json=body)
+    finally:
+        conn.set_trace_callback(None)
+    if response.status_code >= 400:
+        raise RuntimeError(f'{method} {url} returned {response.status_code}')
+    return [sql.strip() for sql in statements if sql.lstrip().upper().startswith(EXPLAINABLE)]
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    verbose = '--verbose' in argv
+
+    path = use_temp_database('plans.db')
+
+    import database
+    import migrations
+    # One pooled connection, so every request runs on the traced connection
+    database.get_pool().max_size = 1
+    migrations.migrate()
+    with database.get_db() as conn:
+        admin_id = conn.execute("SELECT id FROM users WHERE role = 'admin' ORDER BY id LIMIT 1").fetchone()['id']
+    repertoire_ids = populate_user(admin_id, song_count=2000, history_days=365)
+    from services.practice_rollup import rebuild_practice_rollup
+    from services.streaks import rebuild_user_streaks
+    with database.get_db() as conn:
+        rebuild_practice_rollup(conn.cursor())
+        rebuild_user_streaks(conn.cursor())
+        song_id = conn.execute(
+            'SELECT id FROM songs WHERE repertoire_id = ? ORDER BY song_number LIMIT 1',
+            (repertoire_ids[0],)
+        ).fetchone()['id']
+        from utils.data_version import read_data_versions, version_token
+        user_version, global_version = read_data_versions(conn.cursor(), admin_id)
+        version = version_token((max(user_version - 10, 0), global_version))
+    print(f'Synthetic database: {path} (schema version {migrations.get_schema_version()})')
+
+    from app import app
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = admin_id
+
+    explain_conn = sqlite3.connect(path)
+    tables = {row[0] for row in explain_conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+    failures = 0
+    for method, url_template, *body in HOT_ENDPOINTS:
+        ids = {'rep': repertoire_ids[0], 'song': song_id, 'version': version}
+        url = fill_template(url_template, **ids)
+        statements = capture_statements(client, method, url, fill_template(body[0], **ids) if body else None)
+        endpoint_failures = []
+        for sql in statements:
+            plan, scanned = full_scans(explain_conn, sql, tables)
+            if scanned:
+                endpoint_failures.append((sql, plan, scanned))
+            elif verbose:
+                print(f'  ok {" ".join(sql.split())[:100]}')
+                for detail in plan:
+                    print(f'       {detail}')
+        status = 'FAIL' if endpoint_failures else 'ok'
+        print(f'{status:<4} {method} {url_template} ({len(statements)} statements)')
+        for sql, plan, scanned in endpoint_failures:
+            print(f'     full scan of {", ".join(sorted(set(scanned)))}:')
+            print(f'       {" ".join(sql.split())[:200]}')
+            for detail in plan:
+                print(f'       | {detail}')
+        failures += len(endpoint_failures)
+
+    explain_conn.close()
+    print(f'{failures} statement(s) with full table scans')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,10 @@
 import os
 import sqlite3
+import threading
+import time
 from datetime import datetime
 from contextlib import contextmanager
+from flask import g, has_app_context
 from werkzeug.security import generate_password_hash
 
 # Use data directory for persistent storage in Docker
@@ -12,19 +15,207 @@ DATABASE = os.path.join(DATA_DIR, 'songs.db')
 DEFAULT_ADMIN_EMAIL = os.getenv('ADMIN_EMAIL', 'admin@example.com')
 DEFAULT_ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD', 'admin123')
 
+# Connection pool tuning (per worker process)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '8'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+DB_BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', '5000'))
+DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', str(256 * 1024 * 1024)))
+DB_CACHE_SIZE_KB = int(os.getenv('DB_CACHE_SIZE_KB', '20000'))
+
+# songs.song_number is a sparse sort key spaced this far apart so a move can
+# land between two neighbours; the API exposes the 1..N rank instead.
+SONG_NUMBER_GAP = 1024
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection that tracks get_db() nesting so only the outermost block commits."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.depth = 0
+        self.pool = None
+
+
+def _configure_connection(conn):
+    """Apply per-connection settings once, when the connection is created."""
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}')
+    conn.execute(f'PRAGMA mmap_size={DB_MMAP_SIZE}')
+    conn.execute(f'PRAGMA cache_size=-{DB_CACHE_SIZE_KB}')
+    conn.execute('PRAGMA foreign_keys=ON')
+
+
+class ConnectionPool:
+    """Thread-safe pool of configured SQLite connections for one database file."""
+
+    def __init__(self, database, max_size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT):
+        self.database = database
+        self.max_size = max(1, max_size)
+        self.timeout = timeout
+        self._idle = []
+        self._open = 0
+        self._cond = threading.Condition()
+        self._pid = os.getpid()
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.acquired = 0
+        self.hits = 0
+        self.created = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.timeouts = 0
+
+    def _check_fork(self):
+        # Connections must never be shared across processes (e.g. after a gunicorn fork)
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._idle = []
+            self._open = 0
+            self._reset_counters()
+
+    def acquire(self):
+        """Return an idle connection, open a new one, or wait until one is released."""
+        with self._cond:
+            self._check_fork()
+            self.acquired += 1
+            if not self._idle and self._open >= self.max_size:
+                self.waits += 1
+                started = time.monotonic()
+                deadline = started + self.timeout
+                while not self._idle and self._open >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        self.wait_time += time.monotonic() - started
+                        raise sqlite3.OperationalError('Timed out waiting for a pooled database connection')
+                    self._cond.wait(remaining)
+                self.wait_time += time.monotonic() - started
+            if self._idle:
+                self.hits += 1
+                return self._idle.pop()
+            self._open += 1
+            self.created += 1
+
+        try:
+            conn = sqlite3.connect(self.database, factory=PooledConnection, check_same_thread=False)
+            _configure_connection(conn)
+            conn.pool = self
+            return conn
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn):
+        """Return a connection to the pool, rolling back anything left uncommitted."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.depth = 0
+        except sqlite3.Error:
+            self.discard(conn)
+            return
+        with self._cond:
+            if self._pid != os.getpid():
+                return
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def discard(self, conn):
+        """Close a broken connection and free its slot."""
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._cond:
+            if self._pid == os.getpid():
+                self._open = max(0, self._open - 1)
+            self._cond.notify()
+
+    def close_all(self):
+        """Close all idle connections (used when the database path changes)."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open = max(0, self._open - len(idle))
+        for conn in idle:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    def stats(self):
+        """Pool size, hit rate and wait-time counters."""
+        with self._cond:
+            return {
+                'database': self.database,
+                'max_size': self.max_size,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._open - len(self._idle),
+                'acquired': self.acquired,
+                'hits': self.hits,
+                'created': self.created,
+                'hit_rate': round(self.hits / self.acquired, 4) if self.acquired else 0,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'wait_time_total_ms': round(self.wait_time * 1000, 2),
+                'wait_time_avg_ms': round(self.wait_time * 1000 / self.waits, 2) if self.waits else 0,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the connection pool for the current DATABASE path."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.database != DATABASE:
+            if _pool is not None:
+                _pool.close_all()
+            _pool = ConnectionPool(DATABASE)
+        return _pool
+
+
+def release_db(conn):
+    """Return a request-scoped connection to the pool (called on app context teardown)."""
+    if conn is not None:
+        conn.pool.release(conn)
+
+
 @contextmanager
 def get_db():
-    """Context manager for database connections"""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
+    """
+    Context manager for database connections.
+    Connections come from a per-process pool. Inside a Flask app context one
+    connection is reused for the whole request and returned on teardown.
+    The outermost block commits on success and rolls back on error.
+    """
+    request_scoped = has_app_context()
+    conn = g.get('db') if request_scoped else None
+    if conn is None:
+        conn = get_pool().acquire()
+        if request_scoped:
+            g.db = conn
+
+    conn.depth += 1
     try:
         yield conn
-        conn.commit()
+        if conn.depth == 1:
+            conn.commit()
     except Exception:
-        conn.rollback()
+        if conn.depth == 1:
+            conn.rollback()
         raise
     finally:
-        conn.close()
+        conn.depth -= 1
+        if not request_scoped:
+            conn.pool.release(conn)
 
 
 def _ensure_admin_user(cursor):
@@ -401,6 +592,57 @@ def ensure_repertoire_sort_order_column():
                 cursor.execute('UPDATE repertoires SET sort_order = ? WHERE id = ?', (i, row['id']))
             print('Added sort_order column to repertoires and initialized ordering')
 
+def normalize_song_numbers(cursor, repertoire_ids=None):
+    """Respace song_number to rank * SONG_NUMBER_GAP in repertoires that drifted.
+
+    Detection is one window-function pass; only rows whose key is off are
+    rewritten, in two bulk statements. Returns (repertoire_ids, songs_updated).
+    """
+    scope = ''
+    params = []
+    if repertoire_ids is not None:
+        repertoire_ids = list(repertoire_ids)
+        if not repertoire_ids:
+            return [], 0
+        scope = 'WHERE repertoire_id IN (%s)' % ','.join('?' * len(repertoire_ids))
+        params = repertoire_ids
+
+    cursor.execute('DROP TABLE IF EXISTS temp.song_renumber')
+    cursor.execute(f'''
+        CREATE TEMP TABLE song_renumber AS
+        SELECT id, repertoire_id, rn FROM (
+            SELECT id, repertoire_id, song_number,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY repertoire_id ORDER BY song_number ASC, id ASC
+                   ) * ? AS rn
+            FROM songs
+            {scope}
+        )
+        WHERE song_number IS NOT rn
+    ''', [SONG_NUMBER_GAP] + params)
+    try:
+        changed = [row[0] for row in cursor.execute(
+            'SELECT DISTINCT repertoire_id FROM temp.song_renumber ORDER BY repertoire_id'
+        ).fetchall()]
+        if not changed:
+            return [], 0
+
+        # Park moved rows on negative numbers first so the unique
+        # (repertoire_id, song_number) index never sees a transient clash.
+        cursor.execute('''
+            UPDATE songs
+            SET song_number = -(SELECT rn FROM temp.song_renumber r WHERE r.id = songs.id)
+            WHERE id IN (SELECT id FROM temp.song_renumber)
+        ''')
+        updated = cursor.rowcount
+        cursor.execute('''
+            UPDATE songs SET song_number = -song_number
+            WHERE id IN (SELECT id FROM temp.song_renumber)
+        ''')
+        return changed, updated
+    finally:
+        cursor.execute('DROP TABLE IF EXISTS temp.song_renumber')
+
 def ensure_indexes_and_normalize():
     """Create necessary indexes and normalize song_number to be 1..N sequential per repertoire."""
     with get_db() as conn:
@@ -411,20 +653,14 @@ def ensure_indexes_and_normalize():
             ON songs (repertoire_id, song_number)
         ''')
 
-        # Normalize ordering per repertoire: sort by current song_number, then id as tiebreaker
-        repertoires = cursor.execute('SELECT id FROM repertoires').fetchall()
-        for rep in repertoires:
-            rows = cursor.execute(
-                'SELECT id FROM songs WHERE repertoire_id = ? ORDER BY song_number ASC, id ASC',
-                (rep['id'],)
-            ).fetchall()
-            for i, row in enumerate(rows, start=1):
-                cursor.execute(
-                    'UPDATE songs SET song_number = ? WHERE id = ?',
-                    (i, row['id'])
-                )
+        changed, updated = normalize_song_numbers(cursor)
+        print(f"Indexes ensured; renumbered {updated} songs in {len(changed)} repertoires.")
 
-        print("Indexes ensured and song numbers normalized per repertoire.")
+def ensure_gapped_song_numbers():
+    """Spread existing 1..N song numbers out into gapped sort keys."""
+    with get_db() as conn:
+        changed, updated = normalize_song_numbers(conn.cursor())
+        print(f"Respaced song_number keys for {updated} songs in {len(changed)} repertoires")
 
 def ensure_repertoire_folder_columns():
     """Ensure repertoires table has folder path columns for songlist, mp3, and sheet."""
@@ -550,6 +786,387 @@ def ensure_settings_table():
         conn.commit()
 
 
+
+def ensure_auto_bump_index():
+    """Ensure the partial index used by the background target auto-bump exists."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        # Only full bars are ever eligible, so index just those rows by difficulty and age
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_songs_bump_eligible
+            ON songs (difficulty, last_practiced)
+            WHERE practice_target > 0 AND practice_count >= practice_target
+        ''')
+
+def ensure_user_auth_version_column():
+    """Ensure users have an auth_version stamp, bumped whenever the account changes."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cols = {c['name'] for c in cursor.execute('PRAGMA table_info(users)').fetchall()}
+        if 'auth_version' not in cols:
+            cursor.execute('ALTER TABLE users ADD COLUMN auth_version INTEGER NOT NULL DEFAULT 1')
+            print('Added auth_version column to users table')
+
+def ensure_user_streaks_table():
+    """Ensure user_streaks exists: one row per user with the run ending at last_date."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_streaks (
+                user_id INTEGER PRIMARY KEY,
+                current_streak INTEGER NOT NULL DEFAULT 0,
+                longest_streak INTEGER NOT NULL DEFAULT 0,
+                last_date TEXT,
+                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+            )
+        ''')
+
+def ensure_practice_daily_rollup_table():
+    """Ensure practice_daily_rollup exists: per user, repertoire and day practice totals."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        # seconds counts unknown durations as 180s (charts); measured_seconds only known ones
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS practice_daily_rollup (
+                user_id INTEGER NOT NULL,
+                repertoire_id INTEGER NOT NULL,
+                practice_date TEXT NOT NULL,
+                seconds INTEGER NOT NULL DEFAULT 0,
+                measured_seconds INTEGER NOT NULL DEFAULT 0,
+                sessions INTEGER NOT NULL DEFAULT 0,
+                distinct_songs INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, repertoire_id, practice_date),
+                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+                FOREIGN KEY (repertoire_id) REFERENCES repertoires (id) ON DELETE CASCADE
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_practice_daily_rollup_user_date
+            ON practice_daily_rollup (user_id, practice_date)
+        ''')
+
+def ensure_covering_indexes():
+    """Ensure composite indexes shaped for the dashboard, song list and repertoire queries."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        # Per-user date ranges read song_id and practice_count straight from the index
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_practice_date_log_user_date
+            ON practice_date_log (user_id, practice_date, song_id, practice_count)
+        ''')
+        # Song lists are per user, grouped by repertoire in sort key order
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_songs_user_repertoire_number
+            ON songs (user_id, repertoire_id, song_number)
+        ''')
+        # Daily totals across all repertoires without touching the table rows
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_practice_daily_rollup_user_date_totals
+            ON practice_daily_rollup (user_id, practice_date, seconds, sessions)
+        ''')
+        # Superseded: prefixes of the indexes above, of UNIQUE(song_id, ...), or unused
+        for name in (
+            'idx_practice_date_log_user',
+            'idx_practice_date_log_song',
+            'idx_practice_date_log_date',
+            'idx_songs_user_id',
+            'idx_practice_daily_rollup_user_date',
+        ):
+            cursor.execute(f'DROP INDEX IF EXISTS {name}')
+
+def ensure_practice_events_table():
+    """Ensure practice_events exists: client event ids already applied, for idempotent replays."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS practice_events (
+                user_id INTEGER NOT NULL,
+                client_event_id TEXT NOT NULL,
+                song_id INTEGER NOT NULL,
+                practiced_at TEXT NOT NULL,
+                received_at TEXT NOT NULL,
+                PRIMARY KEY (user_id, client_event_id),
+                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_practice_events_received
+            ON practice_events (received_at)
+        ''')
+
+# Row 0 of data_versions is shared by all users (the global skills list)
+GLOBAL_DATA_VERSION_USER = 0
+
+# (table, owning user of a NEW/OLD row) for every table the list APIs read
+DATA_VERSION_SOURCES = [
+    ('songs', '{row}.user_id'),
+    ('repertoires', '{row}.user_id'),
+    ('song_skills', '(SELECT user_id FROM songs WHERE id = {row}.song_id)'),
+    ('repertoire_skills', '(SELECT user_id FROM repertoires WHERE id = {row}.repertoire_id)'),
+    ('skills', str(GLOBAL_DATA_VERSION_USER)),
+]
+
+
+def ensure_data_version_triggers():
+    """
+    Ensure data_versions exists and every write to list data bumps the owner's counter.
+    Triggers cover all write paths, including the standalone maintenance scripts.
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS data_versions (
+                user_id INTEGER PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        bump = '''
+            INSERT INTO data_versions (user_id, version)
+            SELECT owner_id, 1 FROM (SELECT {owner} AS owner_id) WHERE owner_id IS NOT NULL
+            ON CONFLICT(user_id) DO UPDATE SET version = version + 1;
+        '''
+        for table, owner in DATA_VERSION_SOURCES:
+            for event, rows in (('INSERT', ['NEW']), ('UPDATE', ['OLD', 'NEW']), ('DELETE', ['OLD'])):
+                # An update that moves a row to another user bumps both users
+                body = ''.join(bump.format(owner=owner.format(row=row)) for row in rows)
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_data_version_{event.lower()}
+                    AFTER {event} ON {table}
+                    BEGIN
+                        {body}
+                    END
+                ''')
+
+def ensure_song_change_tracking():
+    """
+    Ensure songs carry updated_version (the owner's data version of their last change)
+    and song_change_log records deletes as tombstones and the repertoire a song left.
+    Replaces the plain data version triggers on songs and song_skills with ones that
+    also stamp the affected song. Re-running it replaces the change triggers.
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cols = {c['name'] for c in cursor.execute('PRAGMA table_info(songs)').fetchall()}
+        if 'updated_version' not in cols:
+            cursor.execute('ALTER TABLE songs ADD COLUMN updated_version INTEGER NOT NULL DEFAULT 0')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_songs_user_updated_version
+            ON songs (user_id, updated_version)
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS song_change_log (
+                user_id INTEGER NOT NULL,
+                version INTEGER NOT NULL,
+                song_id INTEGER NOT NULL,
+                repertoire_id INTEGER,
+                deleted INTEGER NOT NULL DEFAULT 0,
+                changed_at TEXT
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_song_change_log_user_version
+            ON song_change_log (user_id, version)
+        ''')
+
+        for table in ('songs', 'song_skills'):
+            for event in ('insert', 'update', 'delete'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS trg_{table}_data_version_{event}')
+
+        bump = '''
+            INSERT INTO data_versions (user_id, version)
+            SELECT owner_id, 1 FROM (SELECT {owner} AS owner_id) WHERE owner_id IS NOT NULL
+            ON CONFLICT(user_id) DO UPDATE SET version = version + 1;
+        '''
+        # Stamping writes updated_version, which the songs update trigger ignores
+        stamp = '''
+            UPDATE songs SET updated_version = (
+                SELECT version FROM data_versions WHERE user_id = songs.user_id
+            ) WHERE id = {song_id};
+        '''
+        log = '''
+            INSERT INTO song_change_log (user_id, version, song_id, repertoire_id, deleted, changed_at)
+            SELECT {row}.user_id, version, {row}.id, {row}.repertoire_id, {deleted},
+                   strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime')
+            FROM data_versions WHERE user_id = {row}.user_id AND {condition};
+        '''
+        owner = '(SELECT user_id FROM songs WHERE id = {row}.song_id)'
+        triggers = {
+            'trg_songs_change_insert': (
+                'AFTER INSERT ON songs',
+                bump.format(owner='NEW.user_id') + stamp.format(song_id='NEW.id')
+            ),
+            'trg_songs_change_update': (
+                'AFTER UPDATE ON songs WHEN NEW.updated_version IS OLD.updated_version',
+                bump.format(owner='OLD.user_id')
+                + bump.format(owner='NEW.user_id')
+                + stamp.format(song_id='NEW.id')
+                # Leaving a user is a delete for them; leaving a repertoire re-ranks it
+                + log.format(row='OLD', deleted=1, condition='OLD.user_id IS NOT NEW.user_id')
+                + log.format(row='OLD', deleted=0, condition=(
+                    'OLD.user_id IS NEW.user_id AND OLD.repertoire_id IS NOT NEW.repertoire_id'
+                ))
+            ),
+            'trg_songs_change_delete': (
+                'AFTER DELETE ON songs',
+                bump.format(owner='OLD.user_id')
+                + log.format(row='OLD', deleted=1, condition='1')
+            ),
+            'trg_song_skills_change_insert': (
+                'AFTER INSERT ON song_skills',
+                bump.format(owner=owner.format(row='NEW')) + stamp.format(song_id='NEW.song_id')
+            ),
+            'trg_song_skills_change_update': (
+                'AFTER UPDATE ON song_skills',
+                bump.format(owner=owner.format(row='NEW')) + stamp.format(song_id='NEW.song_id')
+            ),
+            'trg_song_skills_change_delete': (
+                'AFTER DELETE ON song_skills',
+                bump.format(owner=owner.format(row='OLD')) + stamp.format(song_id='OLD.song_id')
+            ),
+        }
+        for name, (event, body) in triggers.items():
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(f'''
+                CREATE TRIGGER {name}
+                {event}
+                BEGIN
+                    {body}
+                END
+            ''')
+
+def ensure_media_metadata_table():
+    """Ensure media_metadata exists: probed audio details per file version (path, size, mtime)."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS media_metadata (
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                duration INTEGER,
+                bitrate INTEGER,
+                sample_rate INTEGER,
+                codec TEXT,
+                content_hash TEXT,
+                probed_at TEXT NOT NULL,
+                PRIMARY KEY (path, size, mtime_ns)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_media_metadata_hash
+            ON media_metadata (content_hash)
+        ''')
+
+def ensure_jobs_table():
+    """Ensure jobs exists: background work (folder sync, ...) with its status and progress."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
+                repertoire_id INTEGER,
+                params TEXT NOT NULL DEFAULT '{}',
+                status TEXT NOT NULL DEFAULT 'queued',
+                phase TEXT,
+                progress TEXT,
+                error TEXT,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                pid INTEGER,
+                heartbeat_at TEXT,
+                created_at TEXT NOT NULL,
+                started_at TEXT,
+                finished_at TEXT,
+                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+            )
+        ''')
+        # Looking up the active job of a repertoire, and sweeping unfinished jobs
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_jobs_status_kind_repertoire
+            ON jobs (status, kind, repertoire_id)
+        ''')
+
+
+def ensure_folder_manifest_tables():
+    """
+    Ensure folder_manifest (the files a repertoire's last clean folder sync saw)
+    and folder_sync_state (the owner's data version at that sync) exist.
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS folder_manifest (
+                repertoire_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                PRIMARY KEY (repertoire_id, kind, path),
+                FOREIGN KEY (repertoire_id) REFERENCES repertoires (id) ON DELETE CASCADE
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS folder_sync_state (
+                repertoire_id INTEGER PRIMARY KEY,
+                song_version INTEGER NOT NULL,
+                synced_at TEXT NOT NULL,
+                FOREIGN KEY (repertoire_id) REFERENCES repertoires (id) ON DELETE CASCADE
+            )
+        ''')
+
+
+def ensure_chart_hash_column():
+    """Ensure songs.chart_hash (SHA-256 of the chart blob in the chart store) exists and is indexed."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cols = {c['name'] for c in cursor.execute('PRAGMA table_info(songs)').fetchall()}
+        if 'chart_hash' not in cols:
+            cursor.execute('ALTER TABLE songs ADD COLUMN chart_hash TEXT')
+        # Chart store GC collects every referenced hash
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_songs_chart_hash
+            ON songs (chart_hash) WHERE chart_hash IS NOT NULL
+        ''')
+
+
+def ensure_song_change_log_retention():
+    """
+    Ensure song_change_log rows carry changed_at so old ones can be pruned, and
+    song_change_log_floor holds per user the highest version pruned: a delta from
+    before it would miss tombstones, so it falls back to the full list.
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cols = {c['name'] for c in cursor.execute('PRAGMA table_info(song_change_log)').fetchall()}
+        if 'changed_at' not in cols:
+            cursor.execute('ALTER TABLE song_change_log ADD COLUMN changed_at TEXT')
+            # Existing rows get a full retention window from now
+            cursor.execute('UPDATE song_change_log SET changed_at = ?', (datetime.now().isoformat(),))
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_song_change_log_changed_at
+            ON song_change_log (changed_at)
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS song_change_log_floor (
+                user_id INTEGER PRIMARY KEY,
+                version INTEGER NOT NULL
+            )
+        ''')
+    # Replace the change triggers with ones that stamp changed_at
+    ensure_song_change_tracking()
+
+
+
+def ensure_job_heartbeat_column():
+    """Ensure jobs.heartbeat_at exists: refreshed while the owning process is alive."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cols = {c['name'] for c in cursor.execute('PRAGMA table_info(jobs)').fetchall()}
+        if 'heartbeat_at' not in cols:
+            cursor.execute('ALTER TABLE jobs ADD COLUMN heartbeat_at TEXT')
+
+
 if __name__ == '__main__':
     init_db()
     ensure_users_table()
@@ -632,4 +1249,4 @@ def ensure_repertoire_copy_tracking_columns():
         
         if 'copied_date' not in colnames:
             cursor.execute('ALTER TABLE repertoires ADD COLUMN copied_date TEXT')
-            print('Added copied_date column to repertoires table')
\ No newline at end of file
+            print('Added copied_date column to repertoires table')
@@ -1,22 +1,17 @@
 #!/usr/bin/env python3
 """
-Download all linked charts from songs to the local charts/ folder.
-This allows easy deployment and portability of the app.
+Download all linked charts from songs to the local chart store (charts/store).
+This allows easy deployment and portability of the app. Identical charts are
+stored once.
 """
 
 import os
-import shutil
-from pathlib import Path
 from database import get_db
-
-CHARTS_FOLDER = os.path.join(os.getcwd(), 'charts')
+from services.chart_store import chart_hash_of, store_chart
 
 def download_charts():
     """Download all linked chart files to local charts folder"""
     
-    # Ensure charts folder exists
-    os.makedirs(CHARTS_FOLDER, exist_ok=True)
-    
     with get_db() as conn:
         cursor = conn.cursor()
         
@@ -38,6 +33,11 @@ def download_charts():
             title = song['title']
             chart_path = song['chart_path']
             
+            # Already in the store
+            if chart_hash_of(chart_path):
+                skipped += 1
+                continue
+            
             # Skip if file doesn't exist
             if not os.path.exists(chart_path):
                 print(f'❌ SKIP: {title} - File not found: {chart_path}')
@@ -45,25 +45,16 @@ def download_charts():
                 continue
             
             try:
-                # Get file extension
-                _, ext = os.path.splitext(chart_path)
-                
-                # Create destination filename: song_id_title.extension
-                # Replace problematic characters
-                safe_title = ''.join(c for c in title if c.isalnum() or c in (' ', '-', '_')).strip()
-                dest_filename = f'{song_id}_{safe_title}{ext}'
-                dest_path = os.path.join(CHARTS_FOLDER, dest_filename)
-                
-                # Copy file
-                shutil.copy2(chart_path, dest_path)
+                # Store by content; a chart already stored is not copied again
+                dest_path, digest = store_chart(chart_path)
                 
                 # Update database to point to local chart
                 cursor.execute(
-                    'UPDATE songs SET chart_path = ? WHERE id = ?',
-                    (dest_path, song_id)
+                    'UPDATE songs SET chart_path = ?, chart_hash = ? WHERE id = ?',
+                    (dest_path, digest, song_id)
                 )
                 
-                print(f'✅ Downloaded: {title} -> {dest_filename}')
+                print(f'✅ Downloaded: {title} -> {os.path.basename(dest_path)}')
                 downloaded += 1
                 
             except Exception as e:
@@ -77,6 +68,6 @@ def download_charts():
         print(f'Total: {downloaded + skipped + errors}')
 
 if __name__ == '__main__':
-    print('Downloading all linked charts to local charts/ folder...\n')
+    print('Downloading all linked charts to the local chart store...\n')
     download_charts()
     print('\nDone!')
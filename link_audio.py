@@ -1,29 +1,13 @@
 import os
 import sys
-import re
 from pathlib import Path
 from database import get_db, ensure_audio_path_column
+from services.matcher import MatchIndex, normalize
+from services.audio_metadata import extract_durations
+from services.practice_rollup import rebuild_practice_rollup
 
 SUPPORTED_EXTS = {'.mp3', '.m4a', '.aac', '.wav', '.flac', '.ogg'}
 
-SEP_VARIANTS = [" – ", " - ", " — "]
-
-
-def normalize(text: str) -> str:
-    if not text:
-        return ''
-    text = text.lower()
-    # Replace separators with spaces
-    for sep in SEP_VARIANTS:
-        text = text.replace(sep, ' ')
-    # Remove anything in parentheses/brackets
-    text = re.sub(r"[\(\[][^\)\]]*[\)\]]", " ", text)
-    # Replace non-alnum with spaces
-    text = re.sub(r"[^a-z0-9]+", " ", text)
-    # Collapse spaces
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
-
 
 def scan_files(root: Path):
     files = []
@@ -49,14 +33,10 @@ def main():
     audio_files = scan_files(base)
     print(f"Found {len(audio_files)} audio files")
 
-    # Build index by normalized filename (without extension)
-    file_index = {}
-    for f in audio_files:
-        key = normalize(f.stem)
-        if key:
-            file_index.setdefault(key, []).append(f)
+    # Index normalized filenames (without extension) once; lookups no longer scan every file
+    file_index = MatchIndex((f.stem, f) for f in audio_files)
 
-    linked = 0
+    links = {}
     ambiguous = 0
     missing = 0
 
@@ -64,38 +44,41 @@ def main():
         cur = conn.cursor()
         songs = cur.execute('SELECT id, title, artist FROM songs').fetchall()
         for song in songs:
-            title_key = normalize(song['title'])
-            artist_key = normalize(song['artist'])
-
-            candidates = []
-            # direct title match
-            if title_key in file_index:
-                candidates.extend(file_index[title_key])
+            # direct title match, then title + artist combined
+            candidates = [m.value for m in file_index.exact(song['title'])]
+            combined = file_index.exact(f"{song['title']} {song['artist']}")
+            candidates.extend(m.value for m in combined if m.value not in candidates)
 
-            # title + artist combined
-            combined_key = normalize(f"{song['title']} {song['artist']}")
-            if combined_key in file_index:
-                candidates.extend(x for x in file_index[combined_key] if x not in candidates)
-
-            # fuzzy: filename contains title tokens and artist tokens
+            # fuzzy: filename contains the title and the artist (or one of its tokens)
             if not candidates:
-                for k, flist in file_index.items():
-                    if title_key and title_key in k:
-                        if artist_key and (artist_key in k or any(tok in k for tok in artist_key.split())):
-                            candidates.extend(x for x in flist if x not in candidates)
+                artist_key = normalize(song['artist'])
+                candidates = [
+                    m.value for m in file_index.containing(song['title'])
+                    if artist_key and (artist_key in m.name or any(tok in m.name for tok in artist_key.split()))
+                ]
 
             # Decide
             if len(candidates) == 1:
-                path = str(candidates[0])
-                cur.execute('UPDATE songs SET audio_path = ? WHERE id = ?', (path, song['id']))
-                linked += 1
+                links[song['id']] = str(candidates[0])
             elif len(candidates) > 1:
                 # ambiguous, leave unset
                 ambiguous += 1
             else:
                 missing += 1
 
-    print(f"Linking done. Linked: {linked}, Ambiguous: {ambiguous}, Missing: {missing}")
+    # Durations come from the media metadata cache; only new or changed files are probed
+    durations = extract_durations(links.values())
+
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.executemany(
+            'UPDATE songs SET audio_path = ?, duration = COALESCE(?, duration) WHERE id = ?',
+            [(path, durations[path], song_id) for song_id, path in links.items()]
+        )
+        if any(durations.values()):
+            rebuild_practice_rollup(cur)
+
+    print(f"Linking done. Linked: {len(links)}, Ambiguous: {ambiguous}, Missing: {missing}")
 
 
 if __name__ == '__main__':
@@ -1,29 +1,11 @@
 import os
 import sys
-import re
 from pathlib import Path
 from database import get_db, ensure_chart_path_column
+from services.matcher import MatchIndex
 
 SUPPORTED_EXTS = {'.pdf', '.png', '.jpg', '.jpeg', '.gif', '.txt', '.doc', '.docx'}
 
-SEP_VARIANTS = [" – ", " - ", " — "]
-
-
-def normalize(text: str) -> str:
-    if not text:
-        return ''
-    text = text.lower()
-    # Replace separators with spaces
-    for sep in SEP_VARIANTS:
-        text = text.replace(sep, ' ')
-    # Remove anything in parentheses/brackets
-    text = re.sub(r"[\(\[][^\)\]]*[\)\]]", " ", text)
-    # Replace non-alnum with spaces
-    text = re.sub(r"[^a-z0-9]+", " ", text)
-    # Collapse spaces
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
-
 
 def scan_files(root: Path):
     files = []
@@ -63,12 +45,8 @@ def main():
     chart_files = scan_files(base)
     print(f"Found {len(chart_files)} chart files")
 
-    # Build index by normalized filename (without extension)
-    file_index = {}
-    for f in chart_files:
-        key = normalize(f.stem)
-        if key:
-            file_index.setdefault(key, []).append(f)
+    # Index normalized filenames (without extension) once; lookups no longer scan every file
+    file_index = MatchIndex((f.stem, f) for f in chart_files)
 
     linked = 0
     ambiguous = 0
@@ -78,24 +56,15 @@ def main():
         cur = conn.cursor()
         songs = cur.execute('SELECT id, title, artist FROM songs').fetchall()
         for song in songs:
-            title_key = normalize(song['title'])
-            artist_key = normalize(song['artist'])
-
-            candidates = []
-            # direct title match
-            if title_key in file_index:
-                candidates.extend(file_index[title_key])
-
-            # title + artist combined
-            combined_key = normalize(f"{song['title']} {song['artist']}")
-            if combined_key in file_index:
-                candidates.extend(x for x in file_index[combined_key] if x not in candidates)
+            # direct title match, then title + artist combined
+            candidates = [m.value for m in file_index.exact(song['title'])]
+            combined = file_index.exact(f"{song['title']} {song['artist']}")
+            candidates.extend(m.value for m in combined if m.value not in candidates)
 
-            # fuzzy: filename contains title tokens
+            # fuzzy: filename contains the title, closest names first
             if not candidates:
-                for k, flist in file_index.items():
-                    if title_key and title_key in k:
-                        candidates.extend(x for x in flist if x not in candidates)
+                matches = sorted(file_index.containing(song['title']), key=lambda m: -m.score)
+                candidates = [m.value for m in matches]
 
             # Decide
             if len(candidates) == 1:
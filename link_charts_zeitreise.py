@@ -3,42 +3,23 @@
 Link chart files from textsheets folder to Zumgugger repertoire songs
 """
 import os
-import re
 from database import get_db
+from services.matcher import MatchIndex, best_of, normalize
 
 CHARTS_DIR = r"e:\Drive\Music Sync\Projekte\Zeitreise\textsheets"
 
-def normalize_for_matching(text):
-    """Normalize text for fuzzy matching"""
-    # Convert to lowercase
-    text = text.lower()
-    # Remove apostrophes and special characters
-    text = re.sub(r"['\"]", "", text)
-    # Replace multiple spaces with single space
-    text = re.sub(r'\s+', ' ', text)
-    # Strip whitespace
-    return text.strip()
-
-def find_chart_file(title, artist, year, chart_files):
+def find_chart_file(title, artist, year, chart_index):
     """Try to find matching chart file for a song"""
-    # Normalize song info
-    norm_title = normalize_for_matching(title)
-    norm_artist = normalize_for_matching(artist)
+    # Strategy 1: Match by title
+    matches = chart_index.containing(title)
     
-    # Try different matching strategies
-    for chart_file in chart_files:
-        norm_chart = normalize_for_matching(chart_file)
-        
-        # Strategy 1: Match by title
-        if norm_title in norm_chart:
-            return chart_file
-        
-        # Strategy 2: Match by year and partial title (first few words)
-        title_words = norm_title.split()[:3]  # First 3 words of title
-        if year in chart_file and all(word in norm_chart for word in title_words):
-            return chart_file
+    # Strategy 2: Match by year and partial title (first few words)
+    title_words = normalize(title).split()[:3]  # First 3 words of title
+    if title_words:
+        matches += chart_index.containing_all(([year] if year else []) + title_words)
     
-    return None
+    best = best_of(matches)
+    return best.value if best else None
 
 def main():
     # Get list of chart files (convert Windows path to WSL path for listing)
@@ -50,6 +31,7 @@ def main():
     
     chart_files = [f for f in os.listdir(charts_dir_wsl) if f.endswith('.odt')]
     print(f"Found {len(chart_files)} chart files")
+    chart_index = MatchIndex((os.path.splitext(f)[0], f) for f in chart_files)
     
     with get_db() as conn:
         cursor = conn.cursor()
@@ -77,7 +59,7 @@ def main():
                 song['title'], 
                 song['artist'], 
                 song['release_date'] or '', 
-                chart_files
+                chart_index
             )
             
             if chart_file:
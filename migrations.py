@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations keyed on PRAGMA user_version.
+
+Each migration runs once per database. Workers booting against a current
+schema only read user_version and return. Pending steps are applied under
+an exclusive file lock so concurrent workers never migrate in parallel.
+
+Usage: python migrations.py [--status]
+"""
+
+import os
+import sys
+import traceback
+from contextlib import contextmanager
+
+import database
+from database import (
+    get_db,
+    init_db,
+    ensure_indexes_and_normalize,
+    ensure_audio_path_column,
+    ensure_drive_file_id_column,
+    ensure_chart_path_column,
+    ensure_repertoire_id_column,
+    ensure_release_date_column,
+    ensure_repertoire_sort_order_column,
+    ensure_repertoire_folder_columns,
+    ensure_performance_hints_column,
+    ensure_sync_history_table,
+    ensure_practice_targets_not_below_count,
+    ensure_repertoire_notes_column,
+    ensure_practice_date_log_table,
+    ensure_duration_column,
+    ensure_repertoire_copy_tracking_columns,
+    ensure_users_table,
+    ensure_remember_tokens_table,
+    ensure_default_admin,
+    ensure_repertoire_user_column,
+    ensure_song_user_column,
+    ensure_archive_repertoires,
+    ensure_settings_table,
+    ensure_auto_bump_index,
+    ensure_gapped_song_numbers,
+    ensure_user_auth_version_column,
+    ensure_user_streaks_table,
+    ensure_practice_daily_rollup_table,
+    ensure_covering_indexes,
+    ensure_practice_events_table,
+    ensure_data_version_triggers,
+    ensure_song_change_tracking,
+    ensure_media_metadata_table,
+    ensure_jobs_table,
+    ensure_folder_manifest_tables,
+    ensure_chart_hash_column,
+    ensure_song_change_log_retention,
+    ensure_job_heartbeat_column,
+)
+from services.streaks import rebuild_user_streaks
+from services.practice_rollup import rebuild_practice_rollup
+from services.chart_store import migrate_legacy_charts
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:  # Windows development machines
+    FCNTL_AVAILABLE = False
+
+
+# ==================== MIGRATION STEPS ====================
+
+def baseline_schema():
+    """
+    Bring a pre-versioning database (user_version 0) up to date by running the
+    legacy ensure_* helpers in their historical order. Failures are reported and
+    skipped, exactly like the old per-boot schema check did.
+    """
+    with get_db() as conn:
+        has_songs = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'songs'"
+        ).fetchone()
+    if not has_songs:
+        init_db()
+
+    admin_user_id = None
+    steps = [
+        ensure_users_table,
+        ensure_remember_tokens_table,
+        ensure_default_admin,
+        lambda: ensure_repertoire_user_column(admin_user_id or ensure_default_admin()),
+        lambda: ensure_song_user_column(admin_user_id or ensure_default_admin()),
+        ensure_audio_path_column,
+        ensure_drive_file_id_column,
+        ensure_chart_path_column,
+        ensure_repertoire_id_column,
+        ensure_release_date_column,
+        ensure_repertoire_sort_order_column,
+        ensure_repertoire_folder_columns,
+        ensure_performance_hints_column,
+        ensure_sync_history_table,
+        ensure_repertoire_notes_column,
+        ensure_indexes_and_normalize,
+        ensure_practice_targets_not_below_count,
+        ensure_practice_date_log_table,
+        ensure_duration_column,
+        ensure_repertoire_copy_tracking_columns,
+        ensure_archive_repertoires,
+        ensure_settings_table,
+    ]
+    for step in steps:
+        try:
+            result = step()
+            if step is ensure_default_admin:
+                admin_user_id = result
+        except Exception:
+            print('Baseline migration step failed:')
+            traceback.print_exc()
+
+
+def user_streaks_with_backfill():
+    """Create user_streaks and fill it from the existing practice_date_log."""
+    ensure_user_streaks_table()
+    with get_db() as conn:
+        print(f'Backfilled streaks for {rebuild_user_streaks(conn.cursor())} user(s)')
+
+
+def practice_rollup_with_backfill():
+    """Create practice_daily_rollup and fill it from the existing practice_date_log."""
+    ensure_practice_daily_rollup_table()
+    with get_db() as conn:
+        print(f'Backfilled {rebuild_practice_rollup(conn.cursor())} practice rollup row(s)')
+
+
+def chart_store_with_migration():
+    """Add songs.chart_hash and move the per-song chart copies into the chart store."""
+    ensure_chart_hash_column()
+    migrate_legacy_charts()
+
+
+# (version, description, function) - append new steps, never reorder or renumber
+MIGRATIONS = [
+    (1, 'Baseline schema from legacy ensure_* helpers', baseline_schema),
+    (2, 'Partial index for practice target auto-bump', ensure_auto_bump_index),
+    (3, 'Gapped song_number sort keys', ensure_gapped_song_numbers),
+    (4, 'Auth version stamp on users', ensure_user_auth_version_column),
+    (5, 'Incrementally maintained user_streaks', user_streaks_with_backfill),
+    (6, 'Daily practice rollup', practice_rollup_with_backfill),
+    (7, 'Composite covering indexes for hot queries', ensure_covering_indexes),
+    (8, 'Idempotency keys for batched practice events', ensure_practice_events_table),
+    (9, 'Per-user data version counters for list ETags', ensure_data_version_triggers),
+    (10, 'Per-song updated_version and change log for delta sync', ensure_song_change_tracking),
+    (11, 'Audio metadata cache keyed by file version', ensure_media_metadata_table),
+    (12, 'Background jobs with progress and cancellation', ensure_jobs_table),
+    (13, 'Per-repertoire folder manifests for incremental sync', ensure_folder_manifest_tables),
+    (14, 'Content-addressed chart store', chart_store_with_migration),
+    (15, 'Retention window for song change log tombstones', ensure_song_change_log_retention),
+    (16, 'Heartbeats for background jobs', ensure_job_heartbeat_column),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# ==================== RUNNER ====================
+
+def get_schema_version():
+    """Return the database's PRAGMA user_version."""
+    with get_db() as conn:
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def _set_schema_version(version):
+    with get_db() as conn:
+        conn.execute(f'PRAGMA user_version = {int(version)}')
+
+
+@contextmanager
+def _migration_lock():
+    """Exclusive lock next to the database file, held while migrations are applied."""
+    if not FCNTL_AVAILABLE:
+        yield
+        return
+    lock_path = database.DATABASE + '.migrate.lock'
+    with open(lock_path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def pending_migrations(current_version):
+    """Migrations with a version above current_version, in order."""
+    return [m for m in MIGRATIONS if m[0] > current_version]
+
+
+def migrate():
+    """
+    Apply pending migrations and return the list of applied versions.
+    Returns immediately (one PRAGMA read) when the schema is current.
+    """
+    if get_schema_version() >= LATEST_VERSION:
+        return []
+
+    applied = []
+    with _migration_lock():
+        # Another worker may have finished while we waited for the lock
+        for version, description, step in pending_migrations(get_schema_version()):
+            print(f'Applying migration {version}: {description}')
+            step()
+            _set_schema_version(version)
+            applied.append(version)
+    return applied
+
+
+def main():
+    if '--status' in sys.argv:
+        current = get_schema_version()
+        print(f'Database: {database.DATABASE}')
+        print(f'Schema version: {current} (latest {LATEST_VERSION})')
+        for version, description, _ in pending_migrations(current):
+            print(f'  pending {version}: {description}')
+        return
+    applied = migrate()
+    print(f'Applied migrations: {applied}' if applied else 'Schema is up to date')
+
+
+if __name__ == '__main__':
+    main()
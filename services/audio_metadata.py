@@ -0,0 +1,269 @@
+"""
+Audio file discovery and metadata probing, cached in media_metadata.
+
+Rows are keyed on (realpath, size, mtime_ns): a file that is rewritten or
+replaced gets a new key, so stale metadata is never returned and the old row
+is dropped when the new version is stored.
+
+Usage: python -m services.audio_metadata [--recursive] [--prune] <folder>...
+"""
+
+import glob
+import hashlib
+import json
+import os
+import shutil
+import stat
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from database import get_db
+
+try:
+    import mutagen
+    MUTAGEN_AVAILABLE = True
+except ImportError:
+    MUTAGEN_AVAILABLE = False
+
+AUDIO_EXTENSIONS = ['.mp3', '.m4a', '.aac', '.wav', '.flac', '.ogg']
+
+# Probing is dominated by file reads (often on a network mount), so threads overlap well
+METADATA_WORKERS = int(os.getenv('SYNC_METADATA_WORKERS', '8'))
+
+# ffprobe is optional; it covers files mutagen cannot parse
+FFPROBE = shutil.which('ffprobe')
+FFPROBE_TIMEOUT = 10
+
+HASH_CHUNK_BYTES = 1024 * 1024
+# Keeps IN (...) lists well below SQLite's bound parameter limit
+LOOKUP_CHUNK = 500
+
+METADATA_FIELDS = ('duration', 'bitrate', 'sample_rate', 'codec', 'content_hash')
+
+
+def list_audio_files(folder):
+    """Audio files directly inside `folder`, grouped by extension like the sync has always listed them."""
+    if not folder or not os.path.isdir(folder):
+        return []
+    files = []
+    for ext in AUDIO_EXTENSIONS:
+        files.extend(glob.glob(os.path.join(folder, f'*{ext}')))
+    return files
+
+
+def walk_audio_files(folder):
+    """Audio files anywhere below `folder`, any extension case."""
+    files = []
+    for root, _, names in os.walk(folder):
+        files.extend(
+            os.path.join(root, name) for name in sorted(names)
+            if os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS
+        )
+    return files
+
+
+def file_version(path):
+    """Return the cache key (realpath, size, mtime_ns) of a regular file, or None."""
+    if not path:
+        return None
+    try:
+        real_path = os.path.realpath(path)
+        st = os.stat(real_path)
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    return real_path, st.st_size, st.st_mtime_ns
+
+
+def content_hash(path):
+    """SHA-256 hex digest of the file contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _probe_mutagen(path):
+    if not MUTAGEN_AVAILABLE:
+        return {}
+    try:
+        audio = mutagen.File(path)
+    except Exception:
+        return {}
+    if audio is None or audio.info is None:
+        return {}
+    info = audio.info
+    return {
+        'duration': int(getattr(info, 'length', 0) or 0) or None,
+        'bitrate': getattr(info, 'bitrate', None) or None,
+        'sample_rate': getattr(info, 'sample_rate', None) or None,
+        'codec': getattr(info, 'codec', None) or type(audio).__name__.lower(),
+    }
+
+
+def _probe_ffprobe(path):
+    if not FFPROBE:
+        return {}
+    try:
+        result = subprocess.run(
+            [FFPROBE, '-v', 'error', '-select_streams', 'a:0',
+             '-show_entries', 'format=duration,bit_rate:stream=codec_name,sample_rate',
+             '-of', 'json', path],
+            capture_output=True, text=True, timeout=FFPROBE_TIMEOUT
+        )
+        if result.returncode != 0:
+            return {}
+        data = json.loads(result.stdout)
+    except Exception:
+        return {}
+    fmt = data.get('format', {})
+    stream = (data.get('streams') or [{}])[0]
+    try:
+        return {
+            'duration': int(float(fmt.get('duration') or 0)) or None,
+            'bitrate': int(fmt.get('bit_rate') or 0) or None,
+            'sample_rate': int(stream.get('sample_rate') or 0) or None,
+            'codec': stream.get('codec_name'),
+        }
+    except ValueError:
+        return {}
+
+
+def probe_audio(path):
+    """Read metadata for one file straight from disk (mutagen, then ffprobe). Returns None if unreadable."""
+    metadata = dict.fromkeys(METADATA_FIELDS)
+    metadata.update(_probe_mutagen(path))
+    if not metadata['duration']:
+        metadata.update({key: value for key, value in _probe_ffprobe(path).items() if value})
+    try:
+        metadata['content_hash'] = content_hash(path)
+    except OSError:
+        return None
+    return metadata
+
+
+def _cached_metadata(versions):
+    """{version: metadata} for the file versions already in media_metadata."""
+    paths = sorted({version[0] for version in versions})
+    found = {}
+    with get_db() as conn:
+        for start in range(0, len(paths), LOOKUP_CHUNK):
+            chunk = paths[start:start + LOOKUP_CHUNK]
+            rows = conn.execute(
+                f'''SELECT path, size, mtime_ns, {', '.join(METADATA_FIELDS)} FROM media_metadata
+                    WHERE path IN ({','.join('?' * len(chunk))})''',
+                chunk
+            ).fetchall()
+            for row in rows:
+                found[(row['path'], row['size'], row['mtime_ns'])] = {field: row[field] for field in METADATA_FIELDS}
+    return {version: found[version] for version in versions if version in found}
+
+
+def _probe_version(version):
+    metadata = probe_audio(version[0])
+    # Changed while we read it: use the result now, but do not cache it under the old key
+    return metadata, file_version(version[0]) == version
+
+
+def _probe_and_store(versions, max_workers=None):
+    """Probe file versions in a bounded thread pool, then store them in one short transaction."""
+    versions = sorted(versions)
+    if not versions:
+        return {}
+    workers = max(1, min(max_workers or METADATA_WORKERS, len(versions)))
+    if workers == 1:
+        results = [_probe_version(version) for version in versions]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='audio-metadata') as pool:
+            results = list(pool.map(_probe_version, versions))
+
+    probed = {version: metadata for version, (metadata, _) in zip(versions, results)}
+    rows = [
+        version + tuple(metadata[field] for field in METADATA_FIELDS)
+        for version, (metadata, stable) in zip(versions, results)
+        if metadata is not None and stable
+    ]
+    if rows:
+        probed_at = datetime.now().isoformat()
+        with get_db() as conn:
+            conn.executemany(
+                'DELETE FROM media_metadata WHERE path = ? AND (size != ? OR mtime_ns != ?)',
+                [row[:3] for row in rows]
+            )
+            conn.executemany(
+                f'''INSERT OR REPLACE INTO media_metadata (path, size, mtime_ns, {', '.join(METADATA_FIELDS)}, probed_at)
+                    VALUES ({','.join('?' * (3 + len(METADATA_FIELDS)))}, ?)''',
+                [row + (probed_at,) for row in rows]
+            )
+    return probed
+
+
+def get_media_metadata(paths, max_workers=None):
+    """
+    Return {path: metadata dict or None} for `paths`. Cached rows are used when
+    the file's realpath, size and mtime still match; everything else is probed.
+    """
+    versions = {path: file_version(path) for path in dict.fromkeys(paths)}
+    known = {version for version in versions.values() if version}
+    metadata = _cached_metadata(known) if known else {}
+    metadata.update(_probe_and_store(known - set(metadata), max_workers))
+    return {path: metadata.get(version) if version else None for path, version in versions.items()}
+
+
+def extract_durations(paths, max_workers=None):
+    """Return {path: duration in seconds or None} for `paths`, probing uncached files in parallel."""
+    return {
+        path: metadata['duration'] if metadata else None
+        for path, metadata in get_media_metadata(paths, max_workers).items()
+    }
+
+
+def audio_duration(path):
+    """Duration in seconds of one audio file, or None."""
+    return extract_durations([path])[path]
+
+
+def prune_media_metadata():
+    """Drop rows whose file is gone or has changed since it was probed. Returns rows deleted."""
+    with get_db() as conn:
+        rows = conn.execute('SELECT path, size, mtime_ns FROM media_metadata').fetchall()
+        stale = [tuple(row) for row in rows if file_version(row['path']) != tuple(row)]
+        conn.executemany('DELETE FROM media_metadata WHERE path = ? AND size = ? AND mtime_ns = ?', stale)
+    return len(stale)
+
+
+def main(argv=None):
+    """Pre-warm media_metadata for every audio file in the given folders; --prune drops stale rows."""
+    argv = sys.argv[1:] if argv is None else argv
+    recursive = '--recursive' in argv
+    folders = [arg for arg in argv if not arg.startswith('--')]
+    if '--prune' in argv:
+        print(f'Pruned {prune_media_metadata()} stale media_metadata row(s)')
+    if not folders:
+        if '--prune' not in argv:
+            print(__doc__.strip().splitlines()[-1])
+            return 2
+        return 0
+
+    paths = []
+    for folder in folders:
+        if not os.path.isdir(folder):
+            print(f'Not a folder: {folder}')
+            return 2
+        paths.extend(walk_audio_files(folder) if recursive else list_audio_files(folder))
+
+    versions = {version for version in map(file_version, paths) if version}
+    cached = _cached_metadata(versions)
+    probed = _probe_and_store(versions - set(cached))
+    failed = sum(1 for metadata in probed.values() if not metadata or not metadata['duration'])
+    print(f'{len(versions)} audio file(s): {len(cached)} already cached, '
+          f'{len(probed)} probed, {failed} without a duration')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
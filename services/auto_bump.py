@@ -0,0 +1,73 @@
+"""Auto-bump practice targets for full bars that aged past their difficulty threshold."""
+
+from datetime import datetime, timedelta
+
+THRESHOLD_KEYS = {
+    'easy': 'threshold_easy_days',
+    'normal': 'threshold_normal_days',
+    'hard': 'threshold_hard_days',
+}
+DEFAULT_THRESHOLD_DAYS = {'easy': 90, 'normal': 60, 'hard': 30}
+
+
+def load_difficulty_thresholds(cursor):
+    """Return {difficulty: days} from the settings table, falling back to defaults."""
+    try:
+        rows = cursor.execute(
+            'SELECT key, value FROM settings WHERE key IN (?, ?, ?)',
+            tuple(THRESHOLD_KEYS.values())
+        ).fetchall()
+        settings_map = {row['key']: int(row['value']) for row in rows}
+    except Exception:
+        settings_map = {}
+
+    return {
+        difficulty: settings_map.get(key, DEFAULT_THRESHOLD_DAYS[difficulty])
+        for difficulty, key in THRESHOLD_KEYS.items()
+    }
+
+
+def bump_due_targets(cursor, now=None):
+    """
+    Raise practice_target by one for every song whose bar is full and whose
+    last practice is at least the difficulty threshold ago.
+    Uses the partial index idx_songs_bump_eligible so only eligible rows are visited.
+    Returns the number of songs bumped.
+    """
+    now = now or datetime.now()
+    thresholds = load_difficulty_thresholds(cursor)
+
+    bumped = 0
+    for difficulty, days in thresholds.items():
+        cutoff = (now - timedelta(days=days)).isoformat()
+        if difficulty == 'normal':
+            # Songs without a difficulty, or with one that is not known, are treated as 'normal'
+            others = [d for d in THRESHOLD_KEYS if d != 'normal']
+            difficulty_clause = f"(difficulty IS NULL OR difficulty NOT IN ({', '.join('?' * len(others))}))"
+            params = (*others, cutoff)
+        else:
+            difficulty_clause = 'difficulty = ?'
+            params = (difficulty, cutoff)
+        cursor.execute(f'''
+            UPDATE songs
+               SET practice_target = practice_target + 1
+             WHERE practice_target > 0 AND practice_count >= practice_target
+               AND {difficulty_clause}
+               AND last_practiced <= ?
+        ''', params)
+        bumped += cursor.rowcount
+    return bumped
+
+
+def run_auto_bump():
+    """Scheduled entry point: bump all due targets in one short write transaction."""
+    from database import get_db
+    with get_db() as conn:
+        bumped = bump_due_targets(conn.cursor())
+    if bumped:
+        print(f'Auto-bumped practice_target for {bumped} song(s)')
+    return bumped
+
+
+if __name__ == '__main__':
+    run_auto_bump()
@@ -0,0 +1,247 @@
+"""
+Rendered previews of stored charts: a PDF and page images.
+
+Phones cannot open .odt/.docx charts, so each stored chart is converted once
+with a headless LibreOffice (soffice) to PDF, and PDFs are rasterised with
+pdftoppm to page images (WebP when Pillow is installed, PNG otherwise). Both
+tools are optional; without them charts are served as they are.
+
+Renders live in charts/previews/<2 hex>/<sha256>/ next to the chart store and
+are keyed by the chart's content hash, so a chart is rendered again only when
+its content changes. A render is built in a temporary folder and published
+with a rename; a chart that fails to convert gets a marker instead of being
+retried on every request. Requests never wait for a conversion:
+request_preview() queues the render on a background thread (one per process,
+keyed by content hash) and callers fall back to the original file meanwhile.
+The chart store GC removes previews of charts no song references any more.
+
+Usage: python -m services.chart_preview [--status]   (renders every missing preview)
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from database import get_db
+from services.chart_store import CHART_PREVIEWS
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+SOFFICE = shutil.which('soffice') or shutil.which('libreoffice')
+PDFTOPPM = shutil.which('pdftoppm')
+
+# Converted to PDF with soffice first
+DOCUMENT_EXTENSIONS = {'.odt', '.doc', '.docx', '.txt'}
+PDF_EXTENSION = '.pdf'
+
+CHART_PREVIEW_TIMEOUT = int(os.getenv('CHART_PREVIEW_TIMEOUT', '120'))
+CHART_PREVIEW_MAX_PAGES = int(os.getenv('CHART_PREVIEW_MAX_PAGES', '20'))
+CHART_PREVIEW_DPI = int(os.getenv('CHART_PREVIEW_DPI', '110'))
+
+PREVIEW_PDF = 'chart.pdf'
+FAILED_MARKER = 'failed'
+PAGE_PREFIX = 'page-'
+
+# One soffice per process: concurrent runs on the same profile fail
+_render_lock = threading.Lock()
+
+# Background renders: digest -> Future
+_pending = {}
+_pending_lock = threading.Lock()
+_executor = None
+_executor_pid = None
+
+
+def preview_dir(digest):
+    """Folder holding the renders of the chart with this SHA-256."""
+    return os.path.join(CHART_PREVIEWS, digest[:2], digest)
+
+
+def can_preview(chart_path):
+    """True if this kind of chart gets a preview with the tools installed here."""
+    ext = os.path.splitext(chart_path or '')[1].lower()
+    if ext in DOCUMENT_EXTENSIONS:
+        return SOFFICE is not None
+    return ext == PDF_EXTENSION and PDFTOPPM is not None
+
+
+def load_preview(chart_path, digest):
+    """
+    {'pdf': path, 'pages': [image paths]} for a chart rendered before, None if it
+    has not been rendered or could not be.
+    """
+    folder = preview_dir(digest)
+    try:
+        names = sorted(os.listdir(folder))
+    except FileNotFoundError:
+        return None
+    if FAILED_MARKER in names:
+        return None
+    is_pdf = os.path.splitext(chart_path)[1].lower() == PDF_EXTENSION
+    return {
+        'pdf': chart_path if is_pdf else os.path.join(folder, PREVIEW_PDF),
+        'pages': [os.path.join(folder, name) for name in names if name.startswith(PAGE_PREFIX)],
+    }
+
+
+def _convert_to_pdf(source_path, out_folder):
+    """Convert a document with soffice; returns the PDF path or None."""
+    # A profile per process keeps soffice instances of other workers out of each other's way
+    profile = os.path.join(tempfile.gettempdir(), f'songtrainer-soffice-{os.getpid()}')
+    with tempfile.TemporaryDirectory(dir=out_folder) as work:
+        # soffice names its output after the input file, so convert a copy with a fixed name
+        source_copy = os.path.join(work, 'chart' + os.path.splitext(source_path)[1].lower())
+        shutil.copyfile(source_path, source_copy)
+        try:
+            subprocess.run(
+                [SOFFICE, f'-env:UserInstallation=file://{profile}', '--headless', '--norestore',
+                 '--convert-to', 'pdf', '--outdir', work, source_copy],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                timeout=CHART_PREVIEW_TIMEOUT, check=True,
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            print(f'Chart preview: converting {source_path} failed ({e})')
+            return None
+        converted = os.path.join(work, 'chart.pdf')
+        if not os.path.isfile(converted):
+            return None
+        pdf_path = os.path.join(out_folder, PREVIEW_PDF)
+        os.replace(converted, pdf_path)
+        return pdf_path
+
+
+def _render_pages(pdf_path, out_folder):
+    """Rasterise the first pages of a PDF with pdftoppm, as WebP if Pillow is installed."""
+    prefix = os.path.join(out_folder, PAGE_PREFIX.rstrip('-'))
+    try:
+        subprocess.run(
+            [PDFTOPPM, '-png', '-r', str(CHART_PREVIEW_DPI), '-l', str(CHART_PREVIEW_MAX_PAGES),
+             pdf_path, prefix],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            timeout=CHART_PREVIEW_TIMEOUT, check=True,
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f'Chart preview: rendering pages of {pdf_path} failed ({e})')
+        return
+    if not PIL_AVAILABLE:
+        return
+    for name in os.listdir(out_folder):
+        if name.startswith(PAGE_PREFIX) and name.endswith('.png'):
+            png_path = os.path.join(out_folder, name)
+            with Image.open(png_path) as image:
+                image.save(png_path[:-4] + '.webp', 'WEBP', quality=80)
+            os.remove(png_path)
+
+
+def render_preview(chart_path, digest):
+    """
+    Return the preview of a stored chart, rendering it first if needed (slow:
+    seconds per document, so request handlers use request_preview()). None if
+    no preview can be made.
+    """
+    preview = load_preview(chart_path, digest)
+    if preview is not None or os.path.isdir(preview_dir(digest)):
+        return preview
+    if not can_preview(chart_path) or not os.path.isfile(chart_path):
+        return None
+
+    parent = os.path.dirname(preview_dir(digest))
+    os.makedirs(parent, exist_ok=True)
+    with _render_lock:
+        # Rendered by another request while this one waited
+        if os.path.isdir(preview_dir(digest)):
+            return load_preview(chart_path, digest)
+        work = tempfile.mkdtemp(dir=parent, prefix='.rendering-')
+        try:
+            if os.path.splitext(chart_path)[1].lower() == PDF_EXTENSION:
+                pdf_path = chart_path
+            else:
+                pdf_path = _convert_to_pdf(chart_path, work)
+            if pdf_path is None:
+                open(os.path.join(work, FAILED_MARKER), 'w').close()
+            elif PDFTOPPM:
+                _render_pages(pdf_path, work)
+            try:
+                os.rename(work, preview_dir(digest))
+            except OSError:
+                pass  # published by another process meanwhile
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+    return load_preview(chart_path, digest)
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    # A forked worker must not reuse its parent's thread
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='chart-preview')
+        _executor_pid = os.getpid()
+        _pending.clear()
+    return _executor
+
+
+def _render_in_background(chart_path, digest):
+    try:
+        render_preview(chart_path, digest)
+    except Exception as e:
+        print(f'Chart preview: rendering {chart_path} failed ({e})')
+    finally:
+        with _pending_lock:
+            _pending.pop(digest, None)
+
+
+def request_preview(chart_path, digest):
+    """
+    (preview, pending) without waiting for a render: the finished preview, or None
+    with pending=True while it renders in the background, or None, False if the
+    chart gets no preview.
+    """
+    preview = load_preview(chart_path, digest)
+    if preview is not None or os.path.isdir(preview_dir(digest)):
+        return preview, False
+    if not can_preview(chart_path) or not os.path.isfile(chart_path):
+        return None, False
+    with _pending_lock:
+        executor = _get_executor()
+        if digest not in _pending:
+            _pending[digest] = executor.submit(_render_in_background, chart_path, digest)
+    return None, True
+
+
+def render_missing_previews():
+    """Render previews for every stored chart that has none yet. Returns the number rendered."""
+    with get_db() as conn:
+        charts = conn.execute('''
+            SELECT chart_hash, MIN(chart_path) AS chart_path FROM songs
+            WHERE chart_hash IS NOT NULL GROUP BY chart_hash
+        ''').fetchall()
+    rendered = 0
+    for row in charts:
+        if os.path.isdir(preview_dir(row['chart_hash'])) or not can_preview(row['chart_path']):
+            continue
+        if render_preview(row['chart_path'], row['chart_hash']) is not None:
+            rendered += 1
+    print(f'Chart previews: rendered {rendered} of {len(charts)} stored chart(s)')
+    return rendered
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if '--status' in argv:
+        print(f'soffice: {SOFFICE or "not found (no .odt/.docx previews)"}')
+        print(f'pdftoppm: {PDFTOPPM or "not found (no page images)"}')
+        print(f'Page images: {"WebP" if PIL_AVAILABLE else "PNG"}')
+        return
+    render_missing_previews()
+
+
+if __name__ == '__main__':
+    main()
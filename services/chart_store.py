@@ -0,0 +1,170 @@
+"""
+Content-addressed chart storage.
+
+Chart files are stored once under charts/store/<2 hex>/<sha256><ext> and songs
+point at them with chart_path (the blob) and chart_hash (its SHA-256). Importing
+a file that is already stored writes nothing; a new blob is copied to a temporary
+file and published with os.link(), which never replaces an existing blob, so
+concurrent imports of the same chart are safe. Blobs are never deleted when a
+song lets go of one; gc_charts() removes those no song references any more,
+along with their rendered previews (services.chart_preview).
+
+Usage: python -m services.chart_store [--gc] [--migrate]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from database import get_db
+from services.audio_metadata import content_hash
+
+CHARTS_FOLDER = os.path.join(os.getcwd(), 'charts')
+CHART_STORE = os.path.join(CHARTS_FOLDER, 'store')
+CHART_PREVIEWS = os.path.join(CHARTS_FOLDER, 'previews')
+# Blobs younger than this survive GC: an import stores the file before the
+# transaction that references it commits
+CHART_GC_GRACE_SECONDS = int(os.getenv('CHART_GC_GRACE_SECONDS', '3600'))
+
+
+def blob_path(digest, ext):
+    """Store path of the blob with this SHA-256 and extension."""
+    return os.path.join(CHART_STORE, digest[:2], digest + ext.lower())
+
+
+def chart_hash_of(path):
+    """The SHA-256 a store path is named after, or None for files outside the store."""
+    if not path or os.path.dirname(os.path.dirname(path)) != CHART_STORE:
+        return None
+    digest = os.path.splitext(os.path.basename(path))[0]
+    return digest if len(digest) == 64 else None
+
+
+def store_chart(source_path):
+    """
+    Store a chart file and return (blob path, sha256). A file whose content is
+    already stored is not written again.
+    """
+    digest = content_hash(source_path)
+    dest = blob_path(digest, os.path.splitext(source_path)[1])
+    if os.path.exists(dest):
+        return dest, digest
+
+    folder = os.path.dirname(dest)
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix='.incoming-')
+    try:
+        with os.fdopen(fd, 'wb') as tmp, open(source_path, 'rb') as source:
+            shutil.copyfileobj(source, tmp)
+        try:
+            os.link(tmp_path, dest)
+        except FileExistsError:
+            pass  # stored by a concurrent import meanwhile
+    finally:
+        os.remove(tmp_path)
+    return dest, digest
+
+
+def _adopt_file(path, digest):
+    """Move a file already inside charts/ into the store under its hash; duplicates are dropped."""
+    dest = blob_path(digest, os.path.splitext(path)[1])
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    try:
+        os.link(path, dest)
+    except FileExistsError:
+        pass
+    except OSError:
+        # No hard links on this filesystem; fall back to a copy
+        return store_chart(path)[0]
+    os.remove(path)
+    return dest
+
+
+def migrate_legacy_charts():
+    """
+    Move the per-song copies in charts/ (<song_id>_<title>.<ext>) into the store
+    and point their songs at the blobs. Songs sharing a file, or identical files,
+    end up on one blob. Returns the number of songs updated.
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        rows = cursor.execute(
+            '''SELECT id, chart_path FROM songs
+               WHERE chart_path IS NOT NULL AND chart_hash IS NULL AND chart_path LIKE ?''',
+            (CHARTS_FOLDER + os.sep + '%',)
+        ).fetchall()
+        moved = {}
+        updates = []
+        for row in rows:
+            path = row['chart_path']
+            if path not in moved:
+                if chart_hash_of(path):
+                    moved[path] = (path, chart_hash_of(path))
+                elif os.path.isfile(path):
+                    digest = content_hash(path)
+                    moved[path] = (_adopt_file(path, digest), digest)
+                else:
+                    continue
+            dest, digest = moved[path]
+            updates.append((dest, digest, row['id']))
+        cursor.executemany('UPDATE songs SET chart_path = ?, chart_hash = ? WHERE id = ?', updates)
+    if updates:
+        print(f'Moved {len(moved)} chart file(s) of {len(updates)} song(s) into the chart store')
+    return len(updates)
+
+
+def _unreferenced_entries(root, referenced, now):
+    """Entries below root/<2 hex>/ named after no referenced hash and older than the grace period."""
+    if not os.path.isdir(root):
+        return
+    for folder in os.scandir(root):
+        if not folder.is_dir():
+            continue
+        for entry in os.scandir(folder.path):
+            if os.path.splitext(entry.name)[0] in referenced:
+                continue
+            try:
+                # ctime moves when a blob is created or linked, unlike a copied mtime
+                if now - entry.stat().st_ctime >= CHART_GC_GRACE_SECONDS:
+                    yield entry
+            except OSError:
+                pass
+
+
+def gc_charts(now=None):
+    """Delete blobs and previews no song references, and leftover temporary files. Returns the number removed."""
+    now = now or time.time()
+    with get_db() as conn:
+        referenced = {
+            row['chart_hash']
+            for row in conn.execute('SELECT DISTINCT chart_hash FROM songs WHERE chart_hash IS NOT NULL')
+        }
+    removed = 0
+    for entry in _unreferenced_entries(CHART_STORE, referenced, now):
+        try:
+            os.remove(entry.path)
+            removed += 1
+        except OSError:
+            pass
+    for entry in _unreferenced_entries(CHART_PREVIEWS, referenced, now):
+        shutil.rmtree(entry.path, ignore_errors=True)
+        removed += 1
+    if removed:
+        print(f'Chart store: removed {removed} unreferenced file(s)')
+    return removed
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if '--migrate' in argv:
+        migrate_legacy_charts()
+    if '--gc' in argv:
+        gc_charts()
+    if not argv:
+        print(__doc__)
+
+
+if __name__ == '__main__':
+    main()
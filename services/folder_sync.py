@@ -0,0 +1,519 @@
+"""
+Folder sync for a repertoire: create songs from its audio folder, then link audio
+and sheet files to songs. Runs as a background job (see services/jobs.py).
+
+Each clean sync saves a manifest of the files it saw, (path, size, mtime_ns) per
+folder. The next sync lists each folder with a single os.scandir pass, diffs it
+against the manifest and only looks at files that were added or modified, plus
+songs that changed since; an unchanged folder costs one directory listing.
+"""
+
+import copy
+import os
+from contextlib import contextmanager
+from datetime import datetime
+
+from database import get_db, SONG_NUMBER_GAP
+from services.audio_metadata import AUDIO_EXTENSIONS, extract_durations, audio_duration
+from services.chart_store import CHARTS_FOLDER, store_chart
+from services.jobs import register_job
+from services.matcher import MatchIndex, best_of
+from services.practice_rollup import rebuild_practice_rollup
+from services.song_order import append_song_number
+from utils.data_version import read_data_versions
+
+SYNC_JOB = 'folder_sync'
+
+SHEET_EXTENSIONS = ['.pdf', '.png', '.jpg', '.jpeg', '.gif', '.txt', '.doc', '.docx', '.odt']
+
+# Stats that count changes; a step that moves none of them records no undo history
+SYNC_COUNTERS = ('songs_added', 'mp3_linked', 'sheets_linked', 'charts_migrated')
+
+# folder_manifest.kind of each scanned folder
+AUDIO_MANIFEST = 'audio'
+SHEET_MANIFEST = 'sheet'
+
+
+def resolve_chart_path(chart_path):
+    """
+    Resolve a chart path to work on any platform (Windows/WSL/Linux/Ubuntu).
+    Handles Windows paths (e:\\...), WSL paths (/mnt/e/...), and native Linux paths.
+    """
+    if not chart_path:
+        return None
+
+    # Normalize backslashes to forward slashes
+    normalized = chart_path.replace('\\', '/')
+
+    # If it's a Windows path (e.g., "e:/Drive/..."), convert to WSL
+    if ':' in normalized and not normalized.startswith('/'):
+        # Windows path like "e:/Drive/..." - convert to /mnt/e/Drive/...
+        drive_letter = normalized[0].lower()
+        rest = normalized[2:]  # Skip "e:/"
+        return f'/mnt/{drive_letter}{rest}'
+
+    # Otherwise return as-is (could be WSL /mnt/e/... or native /home/... or /root/...)
+    return normalized
+
+
+# ====== FOLDER MANIFEST ======
+
+def scan_folder(folder, extensions):
+    """
+    {path: (size, mtime_ns)} of the files directly inside `folder` with one of
+    `extensions` (any case), sorted by path. One os.scandir pass; hidden files
+    are skipped as glob always did.
+    """
+    if not folder or not os.path.isdir(folder):
+        return {}
+    extensions = {ext.lower() for ext in extensions}
+    files = {}
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            name = entry.name
+            if name.startswith('.') or name[name.rfind('.'):].lower() not in extensions:
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except OSError:
+                continue
+            files[entry.path] = (stat.st_size, stat.st_mtime_ns)
+    return dict(sorted(files.items()))
+
+
+def load_manifest(cursor, repertoire_id, kind):
+    """The files the last clean sync saw in one folder, as scan_folder() returns them."""
+    return {
+        row['path']: (row['size'], row['mtime_ns'])
+        for row in cursor.execute(
+            'SELECT path, size, mtime_ns FROM folder_manifest WHERE repertoire_id = ? AND kind = ?',
+            (repertoire_id, kind)
+        ).fetchall()
+    }
+
+
+def changed_files(current, previous):
+    """Paths in `current` that are new or whose size or mtime differ from `previous`."""
+    return [path for path, version in current.items() if previous.get(path) != version]
+
+
+def save_manifest(cursor, repertoire_id, kind, current, previous):
+    """Write the difference between two scans of a folder to folder_manifest."""
+    cursor.executemany(
+        'DELETE FROM folder_manifest WHERE repertoire_id = ? AND kind = ? AND path = ?',
+        [(repertoire_id, kind, path) for path in previous if path not in current]
+    )
+    cursor.executemany(
+        '''INSERT OR REPLACE INTO folder_manifest (repertoire_id, kind, path, size, mtime_ns)
+           VALUES (?, ?, ?, ?, ?)''',
+        [(repertoire_id, kind, path) + current[path] for path in changed_files(current, previous)]
+    )
+
+
+def clear_manifest(cursor, repertoire_id):
+    """Forget what the last sync saw, so the next one examines every file and song again."""
+    cursor.execute('DELETE FROM folder_manifest WHERE repertoire_id = ?', (repertoire_id,))
+    cursor.execute('DELETE FROM folder_sync_state WHERE repertoire_id = ?', (repertoire_id,))
+
+
+def match_floor(synced_version, changed):
+    """
+    updated_version above which unlinked songs still need matching: every song
+    without a manifest or when files changed, else only songs changed since.
+    """
+    return -1 if synced_version is None or changed else synced_version
+
+
+def match_plan(songs, synced_version, files, changed):
+    """
+    Pair unlinked songs with the files they still need to be matched against.
+    Songs changed since the last clean sync (all of them without one) are matched
+    against every file; the others only against changed files, since the rest
+    did not match them last time.
+    """
+    fresh, stale = [], []
+    for song in songs:
+        if synced_version is None or song['updated_version'] > synced_version:
+            fresh.append(song)
+        else:
+            stale.append(song)
+    plan = []
+    if fresh and files:
+        plan.append((fresh, files))
+    if stale and changed:
+        plan.append((stale, changed))
+    return plan
+
+
+# ====== SYNC JOB ======
+
+def new_sync_stats(rep):
+    """The counters a sync reports while it runs and when it is done."""
+    return {
+        'songs_added': 0,
+        'mp3_linked': 0,
+        'sheets_linked': 0,
+        'charts_migrated': 0,
+        'errors': [],
+        'debug': {
+            'songs_in_repertoire': 0,
+            'mp3_files_found': 0,
+            'sheet_files_found': 0,
+            'songlist_files_found': 0,
+            'external_charts_found': 0,
+            'mp3_files_changed': 0,
+            'sheet_files_changed': 0,
+            'songlist_folder_path': rep['songlist_folder'],
+            'mp3_folder_path': rep['mp3_folder'],
+            'sheet_folder_path': rep['sheet_folder']
+        }
+    }
+
+
+@contextmanager
+def sync_step(job, stats, phase, repertoire_id, sync_timestamp):
+    """
+    Run one sync step in its own transaction after reporting progress. If the step
+    is cancelled or fails, its writes roll back and the counters are restored, so
+    progress always matches committed work; charts it stored are left to the chart
+    store GC. The first step that changes something replaces the previous sync's undo
+    history; syncs that change nothing (most watcher syncs) keep it.
+    """
+    job.report(stats, phase)
+    before = copy.deepcopy(stats)
+    try:
+        with get_db() as conn:
+            cursor = conn.cursor()
+            yield cursor
+            if any(stats[key] != before[key] for key in SYNC_COUNTERS):
+                cursor.execute(
+                    'DELETE FROM sync_history WHERE repertoire_id = ? AND sync_timestamp <> ?',
+                    (repertoire_id, sync_timestamp)
+                )
+    except BaseException:
+        stats.clear()
+        stats.update(before)
+        raise
+
+
+def sync_repertoire_folders(job):
+    """Scan MP3 folder, create songs from filenames, then link MP3s and sheets. Returns the stats."""
+    repertoire_id = job.params['repertoire_id']
+    with get_db() as conn:
+        cursor = conn.cursor()
+        rep = cursor.execute('SELECT * FROM repertoires WHERE id = ?', (repertoire_id,)).fetchone()
+        if not rep:
+            raise ValueError('Repertoire not found')
+        linked_paths = {
+            row['audio_path']
+            for row in cursor.execute(
+                'SELECT audio_path FROM songs WHERE repertoire_id = ? AND audio_path IS NOT NULL',
+                (repertoire_id,)
+            ).fetchall()
+        }
+        # Songs changed after this point count as changed at the next sync too
+        song_version = read_data_versions(cursor, rep['user_id'])[0]
+        state = cursor.execute(
+            'SELECT song_version FROM folder_sync_state WHERE repertoire_id = ?',
+            (repertoire_id,)
+        ).fetchone()
+        synced_version = state['song_version'] if state else None
+        mp3_manifest = load_manifest(cursor, repertoire_id, AUDIO_MANIFEST)
+        sheet_manifest = load_manifest(cursor, repertoire_id, SHEET_MANIFEST)
+
+    stats = new_sync_stats(rep)
+    job.report(stats, 'Reading folders')
+
+    # One directory listing per folder; only files added or modified since the
+    # last clean sync can create songs or give unchanged songs a new match
+    mp3_scan = scan_folder(rep['mp3_folder'], AUDIO_EXTENSIONS)
+    sheet_scan = scan_folder(rep['sheet_folder'], SHEET_EXTENSIONS)
+    mp3_files, sheet_files = list(mp3_scan), list(sheet_scan)
+    changed_mp3_files = changed_files(mp3_scan, mp3_manifest)
+    changed_sheet_files = changed_files(sheet_scan, sheet_manifest)
+    stats['debug']['mp3_files_found'] = len(mp3_files)
+    stats['debug']['sheet_files_found'] = len(sheet_files)
+    stats['debug']['mp3_files_changed'] = len(changed_mp3_files)
+    stats['debug']['sheet_files_changed'] = len(changed_sheet_files)
+
+    # Probe new audio files in parallel before taking the write lock; the
+    # transactions below then only run the inserts and updates
+    durations = extract_durations([path for path in changed_mp3_files if path not in linked_paths])
+
+    sync_timestamp = datetime.now().isoformat()
+
+    try:
+        # Step 1: Scan MP3 folder and create songs from MP3 filenames
+        with sync_step(job, stats, 'Creating songs', repertoire_id, sync_timestamp) as cursor:
+            # Count existing songs
+            existing_songs_count = cursor.execute(
+                'SELECT COUNT(*) as cnt FROM songs WHERE repertoire_id = ?',
+                (repertoire_id,)
+            ).fetchone()['cnt']
+            stats['debug']['songs_in_repertoire'] = existing_songs_count
+
+            if changed_mp3_files:
+                try:
+                    # Get existing song titles and linked audio paths
+                    existing_titles = {
+                        row['title'].lower()
+                        for row in cursor.execute(
+                            'SELECT title FROM songs WHERE repertoire_id = ?',
+                            (repertoire_id,)
+                        ).fetchall()
+                    }
+                    linked_audio_paths = {
+                        row['audio_path']
+                        for row in cursor.execute(
+                            'SELECT audio_path FROM songs WHERE repertoire_id = ? AND audio_path IS NOT NULL',
+                            (repertoire_id,)
+                        ).fetchall()
+                    }
+
+                    # Every new song gets the repertoire's default skills (+1 on the target)
+                    default_skills = cursor.execute(
+                        'SELECT skill_id FROM repertoire_skills WHERE repertoire_id = ?',
+                        (repertoire_id,)
+                    ).fetchall()
+                    initial_target = max(1, len(default_skills) + 1)
+                    song_number = append_song_number(cursor, repertoire_id) - SONG_NUMBER_GAP
+
+                    # Create songs from the MP3 filenames added or modified since the last sync
+                    for mp3_path in changed_mp3_files:
+                        job.check_cancelled()
+
+                        # Skip if this MP3 is already linked to a song
+                        if mp3_path in linked_audio_paths:
+                            continue
+
+                        filename = os.path.basename(mp3_path)
+                        name_no_ext = os.path.splitext(filename)[0]
+
+                        # Parse filename format: "YYYY - Title - Artist" or "Title - Artist" or "Title"
+                        release_year = None
+                        artist = 'Unknown'
+                        title = name_no_ext.strip()
+
+                        if ' - ' in name_no_ext:
+                            parts = name_no_ext.split(' - ')
+
+                            # Check if first part is a 4-digit year
+                            if len(parts) >= 2 and parts[0].strip().isdigit() and len(parts[0].strip()) == 4:
+                                release_year = parts[0].strip()
+                                # Format: "YYYY - Title - Artist" or "YYYY - Title"
+                                if len(parts) >= 3:
+                                    title = parts[1].strip()
+                                    artist = parts[2].strip()
+                                else:
+                                    title = parts[1].strip()
+                                    artist = 'Unknown'
+                            else:
+                                # Format: "Title - Artist" or just "Title"
+                                if len(parts) >= 2:
+                                    title = parts[0].strip()
+                                    artist = parts[1].strip()
+                                else:
+                                    title = parts[0].strip()
+                                    artist = 'Unknown'
+
+                        # Check if song already exists by title
+                        if title.lower() not in existing_titles:
+                            # Append after the last song
+                            song_number += SONG_NUMBER_GAP
+
+                            # Duration was probed before the transaction opened
+                            duration = durations[mp3_path] if mp3_path in durations else audio_duration(mp3_path)
+
+                            # Create new song with MP3 linked
+                            cursor.execute('''
+                                INSERT INTO songs (
+                                    title, artist, song_number, repertoire_id, user_id,
+                                    priority, practice_count, practice_target, date_added, audio_path, release_date, duration
+                                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                            ''', (
+                                title, artist, song_number, repertoire_id, rep['user_id'],
+                                'mid', 0, initial_target, datetime.now().isoformat(), mp3_path, release_year, duration
+                            ))
+
+                            song_id = cursor.lastrowid
+
+                            # Record song creation in sync history
+                            cursor.execute('''
+                                INSERT INTO sync_history (
+                                    repertoire_id, sync_timestamp, operation_type, song_id, field_name, old_value, new_value
+                                ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                            ''', (repertoire_id, sync_timestamp, 'song_created', song_id, None, None, None))
+
+                            # Assign default skills
+                            cursor.executemany(
+                                'INSERT INTO song_skills (song_id, skill_id, is_mastered) VALUES (?, ?, ?)',
+                                [(song_id, skill['skill_id'], 0) for skill in default_skills]
+                            )
+
+                            stats['songs_added'] += 1
+                            stats['mp3_linked'] += 1
+                            existing_titles.add(title.lower())
+                except Exception as e:
+                    stats['errors'].append(f'MP3 scan error: {str(e)}')
+
+        # Step 2: Link MP3s to existing songs that don't have audio yet
+        if rep['mp3_folder'] and os.path.isdir(rep['mp3_folder']):
+            with sync_step(job, stats, 'Linking audio', repertoire_id, sync_timestamp) as cursor:
+                try:
+                    # Get songs without audio that may have a new match
+                    unlinked = cursor.execute(
+                        '''SELECT id, title, artist, updated_version FROM songs
+                           WHERE repertoire_id = ? AND audio_path IS NULL AND updated_version > ?''',
+                        (repertoire_id, match_floor(synced_version, changed_mp3_files))
+                    ).fetchall()
+
+                    for songs, files in match_plan(unlinked, synced_version, mp3_files, changed_mp3_files):
+                        # Index the files once; each song then only checks files sharing a trigram
+                        audio_index = MatchIndex(
+                            (os.path.splitext(os.path.basename(path))[0], path) for path in files
+                        )
+                        for song in songs:
+                            job.check_cancelled()
+
+                            # Names like "Artist - Title" contain the title, so one lookup covers them
+                            match = audio_index.best_match(song['title'])
+                            if match:
+                                mp3_path = match.value
+                                duration = durations[mp3_path] if mp3_path in durations else audio_duration(mp3_path)
+
+                                # Record old value before updating
+                                cursor.execute('''
+                                    INSERT INTO sync_history (
+                                        repertoire_id, sync_timestamp, operation_type, song_id, field_name, old_value, new_value
+                                    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                                ''', (repertoire_id, sync_timestamp, 'field_updated', song['id'], 'audio_path', None, mp3_path))
+
+                                cursor.execute(
+                                    'UPDATE songs SET audio_path = ?, duration = ? WHERE id = ?',
+                                    (mp3_path, duration, song['id'])
+                                )
+                                stats['mp3_linked'] += 1
+                except Exception as e:
+                    stats['errors'].append(f'MP3 linking error: {str(e)}')
+
+        # Step 3: Link sheets to songs
+        if rep['sheet_folder'] and os.path.isdir(rep['sheet_folder']):
+            with sync_step(job, stats, 'Linking sheets', repertoire_id, sync_timestamp) as cursor:
+                try:
+                    # Get songs without charts that may have a new match
+                    unlinked = cursor.execute(
+                        '''SELECT id, title, artist, updated_version FROM songs
+                           WHERE repertoire_id = ? AND chart_path IS NULL AND updated_version > ?''',
+                        (repertoire_id, match_floor(synced_version, changed_sheet_files))
+                    ).fetchall()
+
+                    for songs, files in match_plan(unlinked, synced_version, sheet_files, changed_sheet_files):
+                        sheet_index = MatchIndex(
+                            (os.path.splitext(os.path.basename(path))[0], path) for path in files
+                        )
+
+                        for song in songs:
+                            job.check_cancelled()
+
+                            # Find all matching sheets for this song
+                            matching_sheets = sheet_index.matches(song['title'])
+
+                            # Prioritize: "chords" first, then "chart", then the closest name
+                            best_sheet = None
+                            for keyword in ('chords', 'chart', ''):
+                                preferred = [m for m in matching_sheets if keyword in os.path.basename(m.value).lower()]
+                                if preferred:
+                                    best_sheet = best_of(preferred).value
+                                    break
+
+                            if best_sheet:
+                                # Store the chart once by content; songs share identical files
+                                dest_path, digest = store_chart(best_sheet)
+
+                                # Record old value before updating (None since chart_path was NULL)
+                                cursor.execute('''
+                                    INSERT INTO sync_history (
+                                        repertoire_id, sync_timestamp, operation_type, song_id, field_name, old_value, new_value
+                                    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                                ''', (repertoire_id, sync_timestamp, 'field_updated', song['id'], 'chart_path', None, dest_path))
+
+                                cursor.execute(
+                                    'UPDATE songs SET chart_path = ?, chart_hash = ? WHERE id = ?',
+                                    (dest_path, digest, song['id'])
+                                )
+                                stats['sheets_linked'] += 1
+                except Exception as e:
+                    stats['errors'].append(f'Sheet sync error: {str(e)}')
+
+        # Step 4: Check existing charts and copy to local folder if needed
+        with sync_step(job, stats, 'Copying external charts', repertoire_id, sync_timestamp) as cursor:
+            try:
+                # Get all songs with charts that are NOT in the charts folder
+                charts_folder_pattern = CHARTS_FOLDER + '%'
+
+                songs_with_external_charts = cursor.execute('''
+                    SELECT id, title, chart_path
+                    FROM songs
+                    WHERE repertoire_id = ?
+                    AND chart_path IS NOT NULL
+                    AND chart_path NOT LIKE ?
+                ''', (repertoire_id, charts_folder_pattern)).fetchall()
+
+                stats['debug']['external_charts_found'] = len(songs_with_external_charts)
+
+                for song in songs_with_external_charts:
+                    job.check_cancelled()
+                    old_chart_path = song['chart_path']
+
+                    # Resolve the path to work on any platform (Windows/WSL/Linux/Ubuntu)
+                    resolved_chart_path = resolve_chart_path(old_chart_path)
+
+                    # Check if the file exists
+                    if not os.path.exists(resolved_chart_path):
+                        continue
+
+                    # Store in the chart store
+                    dest_path, digest = store_chart(resolved_chart_path)
+
+                    # Record the change
+                    cursor.execute('''
+                        INSERT INTO sync_history (
+                            repertoire_id, sync_timestamp, operation_type, song_id, field_name, old_value, new_value
+                        ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ''', (repertoire_id, sync_timestamp, 'chart_moved', song['id'], 'chart_path', old_chart_path, dest_path))
+
+                    # Update the database
+                    cursor.execute(
+                        'UPDATE songs SET chart_path = ?, chart_hash = ? WHERE id = ?',
+                        (dest_path, digest, song['id'])
+                    )
+                    stats['charts_migrated'] += 1
+
+            except Exception as e:
+                stats['errors'].append(f'Chart migration error: {str(e)}')
+
+        # Remember what this sync saw; after errors the next sync looks at the same files again
+        if not stats['errors']:
+            with get_db() as conn:
+                cursor = conn.cursor()
+                save_manifest(cursor, repertoire_id, AUDIO_MANIFEST, mp3_scan, mp3_manifest)
+                save_manifest(cursor, repertoire_id, SHEET_MANIFEST, sheet_scan, sheet_manifest)
+                cursor.execute('''
+                    INSERT INTO folder_sync_state (repertoire_id, song_version, synced_at)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(repertoire_id) DO UPDATE SET
+                        song_version = excluded.song_version,
+                        synced_at = excluded.synced_at
+                ''', (repertoire_id, song_version, sync_timestamp))
+    finally:
+        # Newly linked MP3s give existing songs a duration; committed steps count even if a later one stopped
+        if stats['mp3_linked']:
+            with get_db() as conn:
+                rebuild_practice_rollup(conn.cursor(), [repertoire_id])
+
+    return stats
+
+
+register_job(SYNC_JOB, sync_repertoire_folders)
@@ -0,0 +1,274 @@
+"""
+Watch repertoire folders and run the incremental folder sync when files change.
+
+Runs as its own process next to the web app:
+    python -m services.folder_watcher [--poll] [--debounce SECONDS] [--once]
+
+Folders are watched with inotify when inotify_simple is installed (Linux) and
+polled otherwise, or when a watch cannot be added (missing folder, watch limit).
+Network and WSL mounts do not report changes made on the other side, so use
+--poll for those. Events for a repertoire are debounced: its sync starts once no
+change arrived for WATCH_DEBOUNCE_SECONDS (or WATCH_MAX_DELAY_SECONDS after the
+first one), so copying a hundred files results in one sync.
+"""
+
+import os
+import sys
+import time
+
+from database import get_db
+from services.audio_metadata import AUDIO_EXTENSIONS
+from services.folder_sync import SYNC_JOB, SHEET_EXTENSIONS, scan_folder
+from services.jobs import ACTIVE_STATUSES, active_job, submit_job
+
+try:
+    from inotify_simple import INotify, flags
+    INOTIFY_AVAILABLE = True
+except (ImportError, OSError):
+    INOTIFY_AVAILABLE = False
+
+# A repertoire syncs once its folders were quiet this long...
+WATCH_DEBOUNCE_SECONDS = float(os.getenv('WATCH_DEBOUNCE_SECONDS', '3'))
+# ...or this long after the first change, even if files keep arriving
+WATCH_MAX_DELAY_SECONDS = float(os.getenv('WATCH_MAX_DELAY_SECONDS', '60'))
+# Polled folders are listed this often
+WATCH_POLL_SECONDS = float(os.getenv('WATCH_POLL_SECONDS', '10'))
+# Repertoire folder settings are re-read this often
+WATCH_RELOAD_SECONDS = float(os.getenv('WATCH_RELOAD_SECONDS', '30'))
+
+WATCHED_EXTENSIONS = {ext.lower() for ext in AUDIO_EXTENSIONS + SHEET_EXTENSIONS}
+
+
+def is_watched_name(name):
+    """Files the sync looks at; hidden and temporary files (rsync, editors) are not."""
+    if not name or name.startswith('.'):
+        return False
+    return name[name.rfind('.'):].lower() in WATCHED_EXTENSIONS
+
+
+def load_watched_folders(cursor):
+    """{folder: {repertoire_id: owner user_id}} for every configured mp3 or sheet folder."""
+    folders = {}
+    rows = cursor.execute('''
+        SELECT id, user_id, mp3_folder, sheet_folder FROM repertoires
+        WHERE mp3_folder IS NOT NULL OR sheet_folder IS NOT NULL
+    ''').fetchall()
+    for row in rows:
+        for folder in (row['mp3_folder'], row['sheet_folder']):
+            if folder:
+                folders.setdefault(os.path.normpath(folder), {})[row['id']] = row['user_id']
+    return folders
+
+
+class FolderWatcher:
+    """Turns folder changes into at most one queued sync per repertoire at a time."""
+
+    def __init__(self, debounce=WATCH_DEBOUNCE_SECONDS, max_delay=WATCH_MAX_DELAY_SECONDS,
+                 poll_interval=WATCH_POLL_SECONDS, use_inotify=INOTIFY_AVAILABLE):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.folders = {}
+        self.owners = {}
+        # repertoire_id -> (first change, last change) not yet handed to a sync
+        self.pending = {}
+        # repertoire_id -> job id of the sync this watcher started
+        self.running = {}
+        self.inotify = None
+        if use_inotify:
+            try:
+                self.inotify = INotify()
+            except OSError as e:
+                print(f'Watcher: inotify unavailable ({e}), polling instead')
+        self.watches = {}
+        self.snapshots = {}
+        self.polled_at = 0.0
+        self.loaded_at = 0.0
+
+    # ====== FOLDERS ======
+
+    def reload(self, now):
+        """Re-read repertoire folders; add and drop watches or polling baselines to match."""
+        with get_db() as conn:
+            folders = load_watched_folders(conn.cursor())
+        self.folders = folders
+        self.owners = {rid: uid for reps in folders.values() for rid, uid in reps.items()}
+        self.loaded_at = now
+
+        for wd, folder in list(self.watches.items()):
+            if folder not in folders:
+                self._remove_watch(wd)
+        watched = set(self.watches.values())
+        for folder in folders:
+            if folder in watched or folder in self.snapshots:
+                continue
+            if not self._add_watch(folder):
+                # Baseline only: changes made while nobody watched are picked up by catch_up()
+                self.snapshots[folder] = self._scan(folder)
+        for folder in list(self.snapshots):
+            if folder not in folders:
+                del self.snapshots[folder]
+
+    def _add_watch(self, folder):
+        if self.inotify is None or not os.path.isdir(folder):
+            return False
+        mask = (flags.CREATE | flags.CLOSE_WRITE | flags.DELETE | flags.MOVED_FROM
+                | flags.MOVED_TO | flags.ATTRIB | flags.DELETE_SELF | flags.MOVE_SELF)
+        try:
+            wd = self.inotify.add_watch(folder, mask)
+        except OSError as e:
+            print(f'Watcher: polling {folder} ({e})')
+            return False
+        self.watches[wd] = folder
+        return True
+
+    def _remove_watch(self, wd):
+        self.watches.pop(wd, None)
+        try:
+            self.inotify.rm_watch(wd)
+        except OSError:
+            pass  # already gone with its folder
+
+    @staticmethod
+    def _scan(folder):
+        return scan_folder(folder, WATCHED_EXTENSIONS)
+
+    # ====== CHANGES ======
+
+    def folder_changed(self, folder, now):
+        """Mark every repertoire using `folder` as due for a sync after the debounce."""
+        for repertoire_id in self.folders.get(folder, ()):
+            first, _ = self.pending.get(repertoire_id, (now, now))
+            self.pending[repertoire_id] = (first, now)
+
+    def read_events(self, timeout):
+        """Wait up to `timeout` seconds for inotify events and record the folders they touch."""
+        if self.inotify is None or not self.watches:
+            time.sleep(timeout)
+            return
+        events = self.inotify.read(timeout=int(timeout * 1000))
+        now = time.monotonic()
+        for event in events:
+            if event.mask & flags.Q_OVERFLOW:
+                # Events were dropped; any folder may have changed
+                for folder in self.folders:
+                    self.folder_changed(folder, now)
+                continue
+            folder = self.watches.get(event.wd)
+            if folder is None:
+                continue
+            if event.mask & (flags.IGNORED | flags.DELETE_SELF | flags.MOVE_SELF):
+                # The folder itself went away; poll it until it can be watched again
+                self._remove_watch(event.wd)
+                self.snapshots[folder] = {}
+                self.folder_changed(folder, now)
+            elif is_watched_name(event.name):
+                self.folder_changed(folder, now)
+
+    def poll(self, now):
+        """List polled folders and record the ones whose files changed since the last poll."""
+        self.polled_at = now
+        for folder, previous in list(self.snapshots.items()):
+            current = self._scan(folder)
+            if current != previous:
+                self.snapshots[folder] = current
+                self.folder_changed(folder, now)
+            # A folder that came back is watched again instead of polled
+            if self.inotify is not None and not previous and current and self._add_watch(folder):
+                del self.snapshots[folder]
+
+    # ====== SYNCS ======
+
+    def catch_up(self, now):
+        """Queue a sync for repertoires synced before, for changes made while the watcher was down."""
+        with get_db() as conn:
+            synced = {row['repertoire_id'] for row in conn.execute('SELECT repertoire_id FROM folder_sync_state')}
+        for repertoire_id in self.owners:
+            if repertoire_id in synced:
+                self.pending.setdefault(repertoire_id, (now - self.max_delay, now - self.debounce))
+
+    def dispatch(self, now):
+        """Start syncs for repertoires whose changes settled. Returns the started job ids."""
+        started = []
+        with get_db() as conn:
+            cursor = conn.cursor()
+            for repertoire_id, job_id in list(self.running.items()):
+                row = cursor.execute('SELECT status FROM jobs WHERE id = ?', (job_id,)).fetchone()
+                if row is None or row['status'] not in ACTIVE_STATUSES:
+                    del self.running[repertoire_id]
+            due = []
+            for repertoire_id, (first, last) in self.pending.items():
+                if repertoire_id not in self.owners:
+                    continue
+                if now - last < self.debounce and now - first < self.max_delay:
+                    continue
+                # Changes during a running sync wait for it; the next sync only sees what it missed
+                if repertoire_id in self.running or active_job(cursor, SYNC_JOB, repertoire_id):
+                    continue
+                due.append(repertoire_id)
+
+        for repertoire_id in list(self.pending):
+            if repertoire_id not in self.owners:
+                del self.pending[repertoire_id]
+        for repertoire_id in due:
+            del self.pending[repertoire_id]
+            job_id = submit_job(SYNC_JOB, self.owners[repertoire_id], repertoire_id, {'repertoire_id': repertoire_id})
+            self.running[repertoire_id] = job_id
+            started.append(job_id)
+            print(f'Watcher: syncing repertoire {repertoire_id} (job {job_id})')
+        return started
+
+    def run_once(self, timeout):
+        """One iteration: reload settings, collect changes for up to `timeout` seconds, start due syncs."""
+        now = time.monotonic()
+        if now - self.loaded_at >= WATCH_RELOAD_SECONDS:
+            self.reload(now)
+        self.read_events(timeout)
+        now = time.monotonic()
+        if self.snapshots and now - self.polled_at >= self.poll_interval:
+            self.poll(now)
+        return self.dispatch(now)
+
+    def run(self):
+        now = time.monotonic()
+        self.reload(now)
+        self.catch_up(now)
+        mode = 'inotify' if self.inotify is not None else 'polling'
+        print(f'Watcher: {len(self.folders)} folder(s) of {len(self.owners)} repertoire(s), {mode}')
+        while True:
+            # Wake up often enough to start debounced syncs on time
+            self.run_once(min(self.debounce, self.poll_interval) / 2)
+
+    def close(self):
+        if self.inotify is not None:
+            self.inotify.close()
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    use_inotify = INOTIFY_AVAILABLE and '--poll' not in argv
+    debounce = WATCH_DEBOUNCE_SECONDS
+    if '--debounce' in argv:
+        debounce = float(argv[argv.index('--debounce') + 1])
+
+    watcher = FolderWatcher(debounce=debounce, use_inotify=use_inotify)
+    if '--once' in argv:
+        # Sync every watched repertoire that was synced before, then exit (cron-friendly)
+        from services.jobs import wait_for_job
+        now = time.monotonic()
+        watcher.reload(now)
+        watcher.catch_up(now)
+        for job_id in watcher.dispatch(now):
+            wait_for_job(job_id)
+        watcher.close()
+        return
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+
+if __name__ == '__main__':
+    main()
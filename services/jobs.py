@@ -0,0 +1,252 @@
+"""
+Background jobs: one row in `jobs` per run, executed on a small in-process thread pool.
+
+The table is the source of truth, so any worker process can report progress or
+take a cancellation request; only the process that queued a job runs it. That
+process refreshes heartbeat_at of its jobs while it lives; unfinished jobs whose
+heartbeat went stale (container restart, crash) are failed. PIDs cannot tell,
+since restarted workers get the same low PIDs again.
+"""
+
+import json
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from database import get_db
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+# Finished jobs are kept this long so clients can still read the outcome
+JOB_RETENTION_DAYS = int(os.getenv('JOB_RETENTION_DAYS', '7'))
+# A running job re-reads its cancel flag at most this often
+CANCEL_POLL_SECONDS = 1.0
+# Queued and running jobs are marked alive this often by their process...
+JOB_HEARTBEAT_SECONDS = float(os.getenv('JOB_HEARTBEAT_SECONDS', '15'))
+# ...and count as orphaned once their heartbeat is this old
+JOB_STALE_SECONDS = float(os.getenv('JOB_STALE_SECONDS', '120'))
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+_handlers = {}
+_futures = {}
+_executor = None
+_executor_pid = None
+_lock = threading.Lock()
+ORPHANED_ERROR = 'Interrupted: the worker process exited'
+
+
+class JobCancelled(BaseException):
+    """
+    Raised inside a job once cancellation was requested. A BaseException so the
+    broad `except Exception` error collection inside job steps does not swallow it.
+    """
+
+
+class Job:
+    """Handle passed to a job function: its parameters, progress reports and cancellation checks."""
+
+    def __init__(self, job_id, params):
+        self.id = job_id
+        self.params = params
+        self.progress = None
+        self._checked_at = 0.0
+
+    def report(self, progress, phase=None):
+        """
+        Store progress (a JSON-serializable dict) and the current phase.
+        Writes on its own connection, so call it between the job's transactions.
+        """
+        self.progress = progress
+        with get_db() as conn:
+            conn.execute(
+                'UPDATE jobs SET progress = ?, phase = COALESCE(?, phase), heartbeat_at = ? WHERE id = ?',
+                (json.dumps(progress), phase, _now(), self.id)
+            )
+        self.check_cancelled(force=True)
+
+    def check_cancelled(self, force=False):
+        """Raise JobCancelled if cancellation was requested. Cheap to call in loops."""
+        now = time.monotonic()
+        if not force and now - self._checked_at < CANCEL_POLL_SECONDS:
+            return
+        self._checked_at = now
+        with get_db() as conn:
+            row = conn.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (self.id,)).fetchone()
+        if row is None or row['cancel_requested']:
+            raise JobCancelled()
+
+
+def register_job(kind, fn):
+    """Register the function that runs jobs of `kind`; it receives a Job and returns the final progress."""
+    _handlers[kind] = fn
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    with _lock:
+        # A forked worker must not reuse its parent's threads
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=max(1, JOB_WORKERS), thread_name_prefix='songtrainer-job')
+            _executor_pid = os.getpid()
+            _futures.clear()
+            threading.Thread(target=_heartbeat_loop, name='songtrainer-job-heartbeat', daemon=True).start()
+        return _executor
+
+
+def _heartbeat_loop():
+    """Keep heartbeat_at of this process's queued and running jobs fresh."""
+    pid = os.getpid()
+    while _executor_pid == pid:
+        time.sleep(JOB_HEARTBEAT_SECONDS)
+        job_ids = list(_futures)
+        if not job_ids:
+            continue
+        try:
+            with get_db() as conn:
+                conn.execute(
+                    f"UPDATE jobs SET heartbeat_at = ? WHERE id IN ({','.join('?' * len(job_ids))})",
+                    [_now()] + job_ids
+                )
+        except Exception:
+            traceback.print_exc()
+
+
+def _now():
+    return datetime.now().isoformat()
+
+
+def _stale_cutoff(now=None):
+    return ((now or datetime.now()) - timedelta(seconds=JOB_STALE_SECONDS)).isoformat()
+
+
+def fail_orphaned_jobs(cursor, now=None):
+    """Fail queued and running jobs no live process heartbeats any more. Returns how many."""
+    now = now or datetime.now()
+    return cursor.execute(
+        f'''UPDATE jobs SET status = 'failed', error = ?, finished_at = ?
+            WHERE status IN ({','.join('?' * len(ACTIVE_STATUSES))})
+            AND COALESCE(heartbeat_at, created_at) < ?''',
+        (ORPHANED_ERROR, now.isoformat()) + ACTIVE_STATUSES + (_stale_cutoff(now),)
+    ).rowcount
+
+
+def active_job(cursor, kind, repertoire_id):
+    """The queued or running job of `kind` for a repertoire, or None. Orphaned jobs are failed first."""
+    fail_orphaned_jobs(cursor)
+    return cursor.execute(
+        f'''SELECT * FROM jobs WHERE status IN ({','.join('?' * len(ACTIVE_STATUSES))})
+            AND kind = ? AND repertoire_id = ? ORDER BY id LIMIT 1''',
+        ACTIVE_STATUSES + (kind, repertoire_id)
+    ).fetchone()
+
+
+def submit_job(kind, user_id, repertoire_id=None, params=None):
+    """Queue a job and hand it to the thread pool. Returns the job id."""
+    if kind not in _handlers:
+        raise ValueError(f'Unknown job kind: {kind}')
+    with get_db() as conn:
+        job_id = conn.execute(
+            '''INSERT INTO jobs (kind, user_id, repertoire_id, params, status, pid, heartbeat_at, created_at)
+               VALUES (?, ?, ?, ?, 'queued', ?, ?, ?)''',
+            (kind, user_id, repertoire_id, json.dumps(params or {}), os.getpid(), _now(), _now())
+        ).lastrowid
+    # Submitted after the commit, so the worker always finds the row
+    _futures[job_id] = _get_executor().submit(_run_job, job_id)
+    return job_id
+
+
+def wait_for_job(job_id, timeout=None):
+    """Block until a job queued by this process has finished (scripts and benchmarks)."""
+    future = _futures.get(job_id)
+    if future is not None:
+        future.result(timeout)
+
+
+def _run_job(job_id):
+    try:
+        with get_db() as conn:
+            claimed = conn.execute(
+                """UPDATE jobs SET status = 'running', started_at = ?, heartbeat_at = ?, pid = ?
+                   WHERE id = ? AND status = 'queued'""",
+                (_now(), _now(), os.getpid(), job_id)
+            ).rowcount
+            row = conn.execute('SELECT kind, params FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if not claimed:
+            return  # cancelled while queued
+
+        job = Job(job_id, json.loads(row['params']))
+        error = None
+        try:
+            job.progress = _handlers[row['kind']](job)
+            status = 'succeeded'
+        except JobCancelled:
+            status = 'cancelled'
+        except Exception as e:
+            print(f'Job {job_id} ({row["kind"]}) failed:')
+            traceback.print_exc()
+            status, error = 'failed', str(e)
+
+        with get_db() as conn:
+            conn.execute(
+                '''UPDATE jobs SET status = ?, error = ?, progress = COALESCE(?, progress), finished_at = ?
+                   WHERE id = ?''',
+                (status, error, json.dumps(job.progress) if job.progress is not None else None, _now(), job_id)
+            )
+    finally:
+        _futures.pop(job_id, None)
+
+
+def cancel_job(job_id):
+    """
+    Request cancellation. Queued jobs stop at once, running ones at their next check;
+    a running job no live process heartbeats any more is finished right away.
+    """
+    with get_db() as conn:
+        conn.execute(
+            "UPDATE jobs SET status = 'cancelled', cancel_requested = 1, finished_at = ? WHERE id = ? AND status = 'queued'",
+            (_now(), job_id)
+        )
+        conn.execute(
+            '''UPDATE jobs SET status = 'cancelled', cancel_requested = 1, finished_at = ?
+               WHERE id = ? AND status = 'running' AND COALESCE(heartbeat_at, created_at) < ?''',
+            (_now(), job_id, _stale_cutoff())
+        )
+        conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+
+
+def job_payload(row):
+    """API representation of a jobs row."""
+    return {
+        'id': row['id'],
+        'kind': row['kind'],
+        'repertoire_id': row['repertoire_id'],
+        'status': row['status'],
+        'phase': row['phase'],
+        'progress': json.loads(row['progress']) if row['progress'] else None,
+        'error': row['error'],
+        'cancel_requested': bool(row['cancel_requested']),
+        'created_at': row['created_at'],
+        'started_at': row['started_at'],
+        'finished_at': row['finished_at'],
+    }
+
+
+def sweep_jobs(now=None):
+    """
+    Fail unfinished jobs whose process is gone (restart, crash) and delete
+    finished jobs past the retention window. Returns (failed, deleted).
+    """
+    now = now or datetime.now()
+    with get_db() as conn:
+        orphaned = fail_orphaned_jobs(conn.cursor(), now)
+        cutoff = (now - timedelta(days=JOB_RETENTION_DAYS)).isoformat()
+        deleted = conn.execute(
+            f"DELETE FROM jobs WHERE status NOT IN ({','.join('?' * len(ACTIVE_STATUSES))}) AND finished_at < ?",
+            ACTIVE_STATUSES + (cutoff,)
+        ).rowcount
+    if orphaned or deleted:
+        print(f'Jobs: marked {orphaned} interrupted, deleted {deleted} old')
+    return orphaned, deleted
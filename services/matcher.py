@@ -0,0 +1,145 @@
+"""
+Fuzzy name matching for linking songs to audio, chart and Drive files.
+
+Names are normalized the way link_charts.py always has (lowercase, separators
+and bracketed parts dropped, punctuation collapsed to single spaces) and
+indexed once by trigram, so a query only looks at names sharing its rarest
+trigram instead of comparing every song against every file.
+"""
+
+import re
+from collections import defaultdict, namedtuple
+
+SEP_VARIANTS = [" – ", " - ", " — "]
+
+# One lookup result: the value stored with the name, the normalized name and a
+# 0..1 score (1.0 for an exact match, else the shorter/longer length ratio)
+Match = namedtuple('Match', ['value', 'name', 'score'])
+
+
+def normalize(text: str) -> str:
+    if not text:
+        return ''
+    text = text.lower()
+    # Replace separators with spaces
+    for sep in SEP_VARIANTS:
+        text = text.replace(sep, ' ')
+    # Remove anything in parentheses/brackets
+    text = re.sub(r"[\(\[][^\)\]]*[\)\]]", " ", text)
+    # Replace non-alnum with spaces
+    text = re.sub(r"[^a-z0-9]+", " ", text)
+    # Collapse spaces
+    text = re.sub(r"\s+", " ", text).strip()
+    return text
+
+
+def best_of(matches):
+    """Highest scoring Match; the earliest wins ties. None if there are none."""
+    best = None
+    for match in matches:
+        if best is None or match.score > best.score:
+            best = match
+    return best
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class MatchIndex:
+    """
+    Normalized names with attached values (paths, song ids, ...), indexed for
+    exact, substring and superstring lookups. Results keep insertion order
+    unless ranked by best_match().
+    """
+
+    def __init__(self, entries=()):
+        self.names = []
+        self.values = []
+        self._exact = defaultdict(list)
+        self._trigrams = defaultdict(list)
+        self._lengths = set()
+        for name, value in entries:
+            self.add(name, value)
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name, value):
+        """Index `value` under `name`; names that normalize to nothing are skipped."""
+        key = normalize(name)
+        if not key:
+            return
+        entry = len(self.names)
+        self.names.append(key)
+        self.values.append(value)
+        self._exact[key].append(entry)
+        self._lengths.add(len(key))
+        for gram in trigrams(key):
+            self._trigrams[gram].append(entry)
+
+    def _result(self, entries, query):
+        return [
+            Match(self.values[entry], self.names[entry], self._score(self.names[entry], query))
+            for entry in sorted(entries)
+        ]
+
+    @staticmethod
+    def _score(name, query):
+        if name == query:
+            return 1.0
+        shorter, longer = sorted((len(name), len(query)))
+        return shorter / longer
+
+    def exact(self, query):
+        """Entries whose normalized name equals the normalized query."""
+        query = normalize(query)
+        return self._result(self._exact.get(query, ()), query)
+
+    def _containing(self, query):
+        if len(query) < 3:
+            candidates = range(len(self.names))
+        else:
+            postings = [self._trigrams.get(gram, ()) for gram in trigrams(query)]
+            candidates = min(postings, key=len)
+        return {entry for entry in candidates if query in self.names[entry]}
+
+    def _contained_in(self, query):
+        # Every name that fits inside the query is one of its substrings
+        found = set()
+        for length in self._lengths:
+            if length > len(query):
+                continue
+            for start in range(len(query) - length + 1):
+                found.update(self._exact.get(query[start:start + length], ()))
+        return found
+
+    def containing(self, query):
+        """Entries whose name contains the query."""
+        query = normalize(query)
+        return self._result(self._containing(query), query) if query else []
+
+    def contained_in(self, query):
+        """Entries whose name is part of the query."""
+        query = normalize(query)
+        return self._result(self._contained_in(query), query) if query else []
+
+    def containing_all(self, words):
+        """Entries whose name contains every one of `words`."""
+        words = [normalize(word) for word in words]
+        words = [word for word in words if word]
+        if not words:
+            return []
+        entries = set.intersection(*(self._containing(word) for word in words))
+        return self._result(entries, ' '.join(words))
+
+    def matches(self, query):
+        """Entries whose name contains, or is contained in, the query."""
+        query = normalize(query)
+        if not query:
+            return []
+        return self._result(self._containing(query) | self._contained_in(query), query)
+
+    def best_match(self, query):
+        """Highest scoring entry of matches(query), or None."""
+        return best_of(self.matches(query))
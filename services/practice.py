@@ -0,0 +1,200 @@
+"""Apply practice taps (single or batched) to songs, the daily log, rollup and streaks."""
+
+import os
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from database import get_db
+from services.practice_rollup import DEFAULT_SONG_SECONDS, record_practice_totals
+from services.streaks import record_practice_day, rebuild_user_streaks
+
+MAX_BATCH_EVENTS = 500
+# Client event ids are only needed while an offline outbox may still replay them
+PRACTICE_EVENT_RETENTION_DAYS = int(os.getenv('PRACTICE_EVENT_RETENTION_DAYS', '30'))
+
+
+def parse_event_time(value, now=None):
+    """
+    Parse a client timestamp (ISO 8601 string or epoch seconds/milliseconds) into a
+    naive local datetime. Missing values mean now; future values are clamped to now.
+    Raises ValueError for anything else.
+    """
+    now = now or datetime.now()
+    if value is None or value == '':
+        return now
+    if isinstance(value, bool):
+        raise ValueError('invalid timestamp')
+    if isinstance(value, (int, float)):
+        # JavaScript's Date.now() is in milliseconds
+        seconds = value / 1000 if value > 1e11 else value
+        practiced_at = datetime.fromtimestamp(seconds)
+    elif isinstance(value, str):
+        practiced_at = datetime.fromisoformat(value)
+        if practiced_at.tzinfo is not None:
+            practiced_at = practiced_at.astimezone().replace(tzinfo=None)
+    else:
+        raise ValueError('invalid timestamp')
+    return min(practiced_at, now)
+
+
+def _in_clause(values):
+    return ','.join('?' * len(values))
+
+
+def _begin_write(cursor):
+    """Take the write lock up front so the state read below is what the writes update."""
+    if not cursor.connection.in_transaction:
+        cursor.execute('BEGIN IMMEDIATE')
+
+
+def apply_practice_events(cursor, user_id, events, now=None):
+    """
+    Record practice events in one transaction using executemany for every table.
+    `events` is a list of {'song_id', 'practiced_at' (datetime), 'client_event_id' (str or None)}
+    for songs the user may modify. Events whose client_event_id was already applied are skipped.
+    Returns (['applied' | 'duplicate' per event], affected song ids).
+    """
+    now = now or datetime.now()
+    _begin_write(cursor)
+
+    keyed_ids = sorted({e['client_event_id'] for e in events if e['client_event_id']})
+    seen = set()
+    if keyed_ids:
+        seen = {
+            row['client_event_id'] for row in cursor.execute(
+                f'''SELECT client_event_id FROM practice_events
+                    WHERE user_id = ? AND client_event_id IN ({_in_clause(keyed_ids)})''',
+                [user_id] + keyed_ids
+            ).fetchall()
+        }
+
+    song_ids = sorted({e['song_id'] for e in events})
+    if not song_ids:
+        return [], []
+    state = {
+        row['id']: dict(row) for row in cursor.execute(f'''
+            SELECT s.id, s.repertoire_id, s.duration, s.practice_count, s.practice_target, s.last_practiced,
+                   (SELECT COUNT(*) FROM song_skills ss
+                    WHERE ss.song_id = s.id AND ss.is_mastered = 0) AS not_mastered
+            FROM songs s
+            WHERE s.id IN ({_in_clause(song_ids)})
+        ''', song_ids).fetchall()
+    }
+
+    statuses = []
+    applied = []
+    for event in events:
+        event_id = event['client_event_id']
+        if event_id and event_id in seen:
+            statuses.append('duplicate')
+            continue
+        if event_id:
+            seen.add(event_id)
+        statuses.append('applied')
+
+        song = state[event['song_id']]
+        song['practice_count'] = (song['practice_count'] or 0) + 1
+        target = song['practice_target'] or 0
+        # Same rules as a single tap: the target never falls behind the count, and
+        # unmastered skills keep it ahead of the count
+        if song['practice_count'] > target:
+            song['practice_target'] = song['practice_count']
+        elif song['not_mastered'] > 0 and target <= song['practice_count'] + song['not_mastered']:
+            song['practice_target'] = target + 1
+        practiced_at = event['practiced_at'].isoformat()
+        if not song['last_practiced'] or song['last_practiced'] < practiced_at:
+            song['last_practiced'] = practiced_at
+        applied.append((event, practiced_at))
+
+    if not applied:
+        return statuses, song_ids
+
+    cursor.executemany(
+        '''INSERT INTO practice_events (user_id, client_event_id, song_id, practiced_at, received_at)
+           VALUES (?, ?, ?, ?, ?)''',
+        [
+            (user_id, event['client_event_id'], event['song_id'], practiced_at, now.isoformat())
+            for event, practiced_at in applied if event['client_event_id']
+        ]
+    )
+    touched = sorted({event['song_id'] for event, _ in applied})
+    cursor.executemany(
+        'UPDATE songs SET practice_count = ?, practice_target = ?, last_practiced = ? WHERE id = ?',
+        [
+            (state[sid]['practice_count'], state[sid]['practice_target'], state[sid]['last_practiced'], sid)
+            for sid in touched
+        ]
+    )
+    cursor.executemany(
+        'INSERT INTO practice_sessions (song_id, practiced_at) VALUES (?, ?)',
+        [(event['song_id'], practiced_at) for event, practiced_at in applied]
+    )
+
+    # Daily log: one upsert per (song, day); remember which pairs are new for the rollup
+    day_counts = Counter((event['song_id'], practiced_at[:10]) for event, practiced_at in applied)
+    dates = sorted({day for _, day in day_counts})
+    existing = {
+        (row['song_id'], row['practice_date']) for row in cursor.execute(f'''
+            SELECT song_id, practice_date FROM practice_date_log
+            WHERE user_id = ?
+            AND song_id IN ({_in_clause(touched)})
+            AND practice_date IN ({_in_clause(dates)})
+        ''', [user_id] + touched + dates).fetchall()
+    }
+    cursor.executemany('''
+        INSERT INTO practice_date_log (song_id, user_id, practice_date, practice_count)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(song_id, user_id, practice_date) DO UPDATE SET
+            practice_count = practice_count + excluded.practice_count
+    ''', [(sid, user_id, day, count) for (sid, day), count in day_counts.items()])
+
+    totals = defaultdict(lambda: [0, 0, 0, 0])
+    for (sid, day), count in day_counts.items():
+        song = state[sid]
+        if song['repertoire_id'] is None:
+            continue
+        duration = song['duration']
+        row = totals[(song['repertoire_id'], day)]
+        row[0] += count * (duration if duration is not None else DEFAULT_SONG_SECONDS)
+        row[1] += count * (duration or 0)
+        row[2] += count
+        row[3] += 0 if (sid, day) in existing else 1
+    record_practice_totals(cursor, user_id, [key + tuple(row) for key, row in totals.items()])
+
+    # Streaks fold days in order; a replayed day before the stored run needs a recompute
+    last = cursor.execute('SELECT last_date FROM user_streaks WHERE user_id = ?', (user_id,)).fetchone()
+    if last and last['last_date'] and dates[0] < last['last_date']:
+        rebuild_user_streaks(cursor, [user_id])
+    else:
+        for day in dates:
+            record_practice_day(cursor, user_id, day)
+
+    return statuses, song_ids
+
+
+def song_states(cursor, song_ids):
+    """Current practice fields for the given songs, as returned to clients after a batch."""
+    if not song_ids:
+        return []
+    rows = cursor.execute(f'''
+        SELECT id, practice_count, practice_target, last_practiced
+        FROM songs WHERE id IN ({_in_clause(song_ids)})
+        ORDER BY id
+    ''', list(song_ids)).fetchall()
+    states = []
+    for row in rows:
+        state = dict(row)
+        target = state['practice_target'] or 0
+        state['practice_progress'] = (state['practice_count'] / target * 100) if target > 0 else 0
+        states.append(state)
+    return states
+
+
+def prune_practice_events(now=None):
+    """Forget client event ids older than the retention window. Returns rows deleted."""
+    cutoff = ((now or datetime.now()) - timedelta(days=PRACTICE_EVENT_RETENTION_DAYS)).isoformat()
+    with get_db() as conn:
+        deleted = conn.execute('DELETE FROM practice_events WHERE received_at < ?', (cutoff,)).rowcount
+    if deleted:
+        print(f'Pruned {deleted} practice event id(s)')
+    return deleted
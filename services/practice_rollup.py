@@ -0,0 +1,118 @@
+"""Per-day practice totals in practice_daily_rollup, maintained on every practice write."""
+
+import sys
+
+from database import get_db
+
+# Songs without a known duration count as three minutes in the dashboard charts
+DEFAULT_SONG_SECONDS = 180
+
+# Rollup rows recomputed from practice_date_log; {where} narrows the rebuild
+ROLLUP_FROM_LOG_SQL = f'''
+    SELECT pl.user_id, s.repertoire_id, pl.practice_date,
+           SUM(COALESCE(s.duration, {DEFAULT_SONG_SECONDS}) * pl.practice_count) AS seconds,
+           COALESCE(SUM(s.duration * pl.practice_count), 0) AS measured_seconds,
+           SUM(pl.practice_count) AS sessions,
+           COUNT(DISTINCT pl.song_id) AS distinct_songs
+    FROM practice_date_log pl
+    JOIN songs s ON s.id = pl.song_id
+    WHERE s.repertoire_id IS NOT NULL {{where}}
+    GROUP BY pl.user_id, s.repertoire_id, pl.practice_date
+'''
+
+
+def record_practice_totals(cursor, user_id, deltas):
+    """
+    Add practice deltas to (user, repertoire, day) rollup rows with one executemany upsert.
+    `deltas` holds (repertoire_id, practice_date, seconds, measured_seconds, sessions, new_songs)
+    tuples, where new_songs counts songs practiced by the user for the first time that day.
+    """
+    cursor.executemany('''
+        INSERT INTO practice_daily_rollup (
+            user_id, repertoire_id, practice_date, seconds, measured_seconds, sessions, distinct_songs
+        ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(user_id, repertoire_id, practice_date) DO UPDATE SET
+            seconds = seconds + excluded.seconds,
+            measured_seconds = measured_seconds + excluded.measured_seconds,
+            sessions = sessions + excluded.sessions,
+            distinct_songs = distinct_songs + excluded.distinct_songs
+    ''', [(user_id,) + tuple(delta) for delta in deltas])
+
+
+def rebuild_practice_rollup(cursor, repertoire_ids=None):
+    """
+    Recompute rollup rows from practice_date_log, for all repertoires or just the given ones.
+    Run after durations change or songs move/disappear. Returns the number of rows written.
+    """
+    where, params = '', []
+    if repertoire_ids is not None:
+        repertoire_ids = sorted({rid for rid in repertoire_ids if rid is not None})
+        if not repertoire_ids:
+            return 0
+        placeholders = ','.join('?' * len(repertoire_ids))
+        where = f'AND s.repertoire_id IN ({placeholders})'
+        params = repertoire_ids
+        cursor.execute(
+            f'DELETE FROM practice_daily_rollup WHERE repertoire_id IN ({placeholders})',
+            repertoire_ids
+        )
+    else:
+        cursor.execute('DELETE FROM practice_daily_rollup')
+
+    cursor.execute(f'''
+        INSERT INTO practice_daily_rollup (
+            user_id, repertoire_id, practice_date, seconds, measured_seconds, sessions, distinct_songs
+        )
+        {ROLLUP_FROM_LOG_SQL.format(where=where)}
+    ''', params)
+    return cursor.rowcount
+
+
+def daily_totals(cursor, user_id, start_date, repertoire_id=None):
+    """Rows of (practice_date, total_seconds, session_count) per day since start_date."""
+    rep_condition = 'AND repertoire_id = ?' if repertoire_id else ''
+    params = [user_id, start_date] + ([repertoire_id] if repertoire_id else [])
+    return cursor.execute(f'''
+        SELECT practice_date,
+               SUM(seconds) AS total_seconds,
+               SUM(sessions) AS session_count
+        FROM practice_daily_rollup
+        WHERE user_id = ?
+        AND practice_date >= ?
+        {rep_condition}
+        GROUP BY practice_date
+        ORDER BY practice_date
+    ''', params).fetchall()
+
+
+def check_practice_rollup(cursor):
+    """Return the number of rollup rows that differ from a fresh aggregation of the log."""
+    row = cursor.execute(f'''
+        WITH expected AS ({ROLLUP_FROM_LOG_SQL.format(where='')}),
+        stored AS (
+            SELECT user_id, repertoire_id, practice_date, seconds, measured_seconds, sessions, distinct_songs
+            FROM practice_daily_rollup
+        )
+        SELECT (SELECT COUNT(*) FROM (SELECT * FROM expected EXCEPT SELECT * FROM stored))
+             + (SELECT COUNT(*) FROM (SELECT * FROM stored EXCEPT SELECT * FROM expected)) AS drift
+    ''').fetchone()
+    return row['drift']
+
+
+def main(argv=None):
+    """Rebuild practice_daily_rollup (optionally for given repertoire ids); --check only reports drift."""
+    argv = sys.argv[1:] if argv is None else argv
+    with get_db() as conn:
+        cursor = conn.cursor()
+        if '--check' in argv:
+            drift = check_practice_rollup(cursor)
+            print(f'{drift} rollup row(s) out of date')
+            return 1 if drift else 0
+        repertoire_ids = [int(arg) for arg in argv if arg.isdigit()] or None
+        written = rebuild_practice_rollup(cursor, repertoire_ids)
+    print(f'Rebuilt {written} practice rollup row(s)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
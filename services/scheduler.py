@@ -0,0 +1,54 @@
+"""Minimal in-process scheduler for periodic maintenance tasks."""
+
+import threading
+import time
+import traceback
+
+# Registered tasks: name -> {'interval': seconds, 'fn': callable, 'next_run': monotonic time}
+_tasks = {}
+_lock = threading.Lock()
+_thread = None
+
+TICK_SECONDS = 5
+
+
+def register_periodic_task(name, interval_seconds, fn, run_immediately=True):
+    """Register (or replace) a task that runs every interval_seconds in the background thread."""
+    with _lock:
+        _tasks[name] = {
+            'interval': max(1, int(interval_seconds)),
+            'fn': fn,
+            'next_run': time.monotonic() if run_immediately else time.monotonic() + interval_seconds,
+        }
+
+
+def run_due_tasks(now=None):
+    """Run every task whose next_run has passed. Errors are logged and never stop the loop."""
+    now = now if now is not None else time.monotonic()
+    with _lock:
+        due = [(name, task) for name, task in _tasks.items() if task['next_run'] <= now]
+        for _, task in due:
+            task['next_run'] = now + task['interval']
+
+    for name, task in due:
+        try:
+            task['fn']()
+        except Exception:
+            print(f'Scheduled task {name} failed:')
+            traceback.print_exc()
+
+
+def _loop():
+    while True:
+        run_due_tasks()
+        time.sleep(TICK_SECONDS)
+
+
+def start_scheduler():
+    """Start the scheduler thread once per process."""
+    global _thread
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        _thread = threading.Thread(target=_loop, name='songtrainer-scheduler', daemon=True)
+        _thread.start()
@@ -0,0 +1,192 @@
+"""
+Setlist PDF rendering with an on-disk cache.
+
+PDFs are cached under DATA_DIR/cache/setlists/<key>.pdf. The key hashes the
+request (repertoire, song number range, custom title) together with the rows
+and title that end up in the PDF, so any edit to a song in the range produces
+a new key, and the key doubles as the response ETag. Entries are evicted least
+recently used first (a hit touches the file's mtime) once the cache grows past
+SETLIST_CACHE_MAX_BYTES.
+
+Usage: python -m services.setlist_pdf [--clear]
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+from io import BytesIO
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import cm
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
+from database import DATA_DIR
+
+SETLIST_CACHE_DIR = os.path.join(DATA_DIR, 'cache', 'setlists')
+SETLIST_CACHE_MAX_BYTES = int(os.getenv('SETLIST_CACHE_MAX_BYTES', str(50 * 1024 * 1024)))
+
+# ====== STYLES ======
+# Built once per process; paragraphs only reference them
+
+_SAMPLE_STYLES = getSampleStyleSheet()
+
+TITLE_STYLE = ParagraphStyle(
+    'CustomTitle',
+    parent=_SAMPLE_STYLES['Heading1'],
+    fontSize=28,
+    textColor=colors.HexColor('#2c3e50'),
+    spaceAfter=30,
+    alignment=TA_CENTER,
+    fontName='Helvetica-Bold'
+)
+
+# Song title style - black text
+SONG_STYLE = ParagraphStyle(
+    'SongTitle',
+    parent=_SAMPLE_STYLES['Normal'],
+    fontSize=20,
+    textColor=colors.black,
+    fontName='Helvetica'
+)
+
+# Performance hints style - black text
+HINTS_STYLE = ParagraphStyle(
+    'PerformanceHints',
+    parent=_SAMPLE_STYLES['Normal'],
+    fontSize=14,
+    textColor=colors.black
+)
+
+# Three columns: number, title, hints
+COLUMN_WIDTHS = [2*cm, 10*cm, 6*cm]
+TABLE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (0, -1), 'CENTER'),
+    ('ALIGN', (1, 0), (2, -1), 'LEFT'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 20),
+    ('TOPPADDING', (0, 0), (-1, -1), 20),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+    ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')])
+])
+
+BOLD_MARKUP = re.compile(r'\*\*([^*]+)\*\*')
+
+
+# ====== RENDERING ======
+
+def render_setlist_pdf(title_text, songs):
+    """PDF bytes of a setlist: title, then one row per song (song_number, title, performance_hints)."""
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=2*cm, bottomMargin=2*cm)
+
+    elements = [Paragraph(title_text, TITLE_STYLE), Spacer(1, 0.5*cm)]
+
+    table_data = []
+    for song in songs:
+        # Song title cell: ♠ Song Title ♠
+        song_title_paragraph = Paragraph(f"♠ {song['title']} ♠", SONG_STYLE)
+
+        # Performance hints cell (if any)
+        hints_paragraph = ""
+        if song['performance_hints']:
+            hints_paragraph = Paragraph(BOLD_MARKUP.sub(r'\1', song['performance_hints']), HINTS_STYLE)
+
+        table_data.append([
+            str(song['song_number']),
+            song_title_paragraph,
+            hints_paragraph
+        ])
+
+    table = Table(table_data, colWidths=COLUMN_WIDTHS)
+    table.setStyle(TABLE_STYLE)
+    elements.append(table)
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+# ====== CACHE ======
+
+def setlist_cache_key(repertoire_id, min_song_number, max_song_number, custom_title, title_text, songs):
+    """Cache key and ETag: the request plus a hash of everything rendered into the PDF."""
+    rows = hashlib.sha256()
+    rows.update(title_text.encode('utf-8'))
+    for song in songs:
+        rows.update(json.dumps(
+            [song['song_number'], song['title'], song['performance_hints']], ensure_ascii=False
+        ).encode('utf-8'))
+    request_key = json.dumps([repertoire_id, min_song_number, max_song_number, custom_title, rows.hexdigest()])
+    return hashlib.sha256(request_key.encode('utf-8')).hexdigest()
+
+
+def _cache_path(key):
+    return os.path.join(SETLIST_CACHE_DIR, key + '.pdf')
+
+
+def cached_setlist_pdf(key):
+    """Path of a cached PDF, marked as recently used, or None."""
+    path = _cache_path(key)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def store_setlist_pdf(key, pdf_bytes):
+    """Write a rendered PDF to the cache, evicting the least recently used ones, and return its path."""
+    os.makedirs(SETLIST_CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=SETLIST_CACHE_DIR, prefix='.incoming-')
+    with os.fdopen(fd, 'wb') as tmp:
+        tmp.write(pdf_bytes)
+    path = _cache_path(key)
+    os.replace(tmp_path, path)
+    evict_setlist_cache()
+    return path
+
+
+def evict_setlist_cache(max_bytes=SETLIST_CACHE_MAX_BYTES):
+    """Delete the least recently used PDFs until the cache fits in max_bytes. Returns the number removed."""
+    entries = []
+    for entry in os.scandir(SETLIST_CACHE_DIR):
+        if entry.name.endswith('.pdf'):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+        removed += 1
+    return removed
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not os.path.isdir(SETLIST_CACHE_DIR):
+        print('Setlist cache is empty')
+        return
+    if '--clear' in argv:
+        print(f'Removed {evict_setlist_cache(0)} cached setlist PDF(s)')
+        return
+    sizes = [entry.stat().st_size for entry in os.scandir(SETLIST_CACHE_DIR) if entry.name.endswith('.pdf')]
+    print(f'{SETLIST_CACHE_DIR}: {len(sizes)} PDF(s), {sum(sizes) / 1024:.0f} KB '
+          f'of {SETLIST_CACHE_MAX_BYTES / 1024:.0f} KB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""Sparse song ordering: song_number stores a gapped sort key, the API shows 1..N."""
+
+from bisect import bisect_left
+
+from database import get_db, normalize_song_numbers, SONG_NUMBER_GAP
+
+# Repertoires whose tightest gap between neighbours drops below this get respaced
+REBALANCE_MIN_GAP = 8
+
+# Rank of each song within its repertoire, as exposed to the API and setlists
+POSITION_SQL = 'ROW_NUMBER() OVER (PARTITION BY repertoire_id ORDER BY song_number ASC, id ASC)'
+
+
+def song_position(cursor, song):
+    """Return the 1-based position of a song row within its repertoire."""
+    row = cursor.execute(
+        '''
+        SELECT COUNT(*) AS c FROM songs
+        WHERE repertoire_id IS ? AND (song_number < ? OR (song_number = ? AND id <= ?))
+        ''',
+        (song['repertoire_id'], song['song_number'], song['song_number'], song['id'])
+    ).fetchone()
+    return row['c']
+
+
+def append_song_number(cursor, repertoire_id):
+    """Return a key that appends after the last song of a repertoire."""
+    row = cursor.execute(
+        'SELECT MAX(song_number) AS max_num FROM songs WHERE repertoire_id IS ?',
+        (repertoire_id,)
+    ).fetchone()
+    return (row['max_num'] or 0) + SONG_NUMBER_GAP
+
+
+def _neighbour_keys(cursor, repertoire_id, position, exclude_id):
+    """Keys of the songs that would sit before and after `position` (None at either end)."""
+    if position <= 1:
+        rows = cursor.execute(
+            '''
+            SELECT song_number FROM songs WHERE repertoire_id IS ? AND id IS NOT ?
+            ORDER BY song_number ASC LIMIT 1
+            ''',
+            (repertoire_id, exclude_id)
+        ).fetchall()
+        return None, (rows[0]['song_number'] if rows else None)
+
+    rows = cursor.execute(
+        '''
+        SELECT song_number FROM songs WHERE repertoire_id IS ? AND id IS NOT ?
+        ORDER BY song_number ASC LIMIT 2 OFFSET ?
+        ''',
+        (repertoire_id, exclude_id, position - 2)
+    ).fetchall()
+    if not rows:
+        row = cursor.execute(
+            'SELECT MAX(song_number) AS max_num FROM songs WHERE repertoire_id IS ? AND id IS NOT ?',
+            (repertoire_id, exclude_id)
+        ).fetchone()
+        return row['max_num'], None
+    if len(rows) == 1:
+        return rows[0]['song_number'], None
+    return rows[0]['song_number'], rows[1]['song_number']
+
+
+def song_number_at(cursor, repertoire_id, position, exclude_id=None):
+    """
+    Return a free key that places a song at 1-based `position` in a repertoire.
+    Respaces the repertoire first when the neighbours have no room left between them.
+    """
+    position = max(1, int(position))
+    for _ in range(2):
+        prev_key, next_key = _neighbour_keys(cursor, repertoire_id, position, exclude_id)
+        lo = prev_key or 0
+        hi = next_key if next_key is not None else lo + 2 * SONG_NUMBER_GAP
+        if hi - lo >= 2:
+            return (lo + hi) // 2
+        normalize_song_numbers(cursor, [repertoire_id])
+    raise RuntimeError(f'No room to place song in repertoire {repertoire_id}')
+
+
+def move_song(cursor, song, position):
+    """Move a song row to `position` within its repertoire, writing only that row."""
+    if song_position(cursor, song) == position:
+        return False
+    key = song_number_at(cursor, song['repertoire_id'], position, exclude_id=song['id'])
+    cursor.execute('UPDATE songs SET song_number = ? WHERE id = ?', (key, song['id']))
+    return True
+
+
+def _longest_increasing_run(keys):
+    """Indices of a longest strictly increasing subsequence of `keys`."""
+    tails, tail_idx = [], []
+    parent = [-1] * len(keys)
+    for i, key in enumerate(keys):
+        j = bisect_left(tails, key)
+        if j == len(tails):
+            tails.append(key)
+            tail_idx.append(i)
+        else:
+            tails[j] = key
+            tail_idx[j] = i
+        parent[i] = tail_idx[j - 1] if j > 0 else -1
+
+    keep = []
+    i = tail_idx[-1] if tail_idx else -1
+    while i != -1:
+        keep.append(i)
+        i = parent[i]
+    return set(keep)
+
+
+def _write_keys(cursor, new_keys, taken):
+    """Write {song_id: key}, parking on negatives first if a key is still held by another row."""
+    if not new_keys:
+        return
+    if taken & set(new_keys.values()):
+        cursor.executemany(
+            'UPDATE songs SET song_number = ? WHERE id = ?',
+            [(-key, sid) for sid, key in new_keys.items()]
+        )
+    cursor.executemany(
+        'UPDATE songs SET song_number = ? WHERE id = ?',
+        [(key, sid) for sid, key in new_keys.items()]
+    )
+
+
+def apply_order(cursor, repertoire_id, ordered_ids):
+    """
+    Reorder a repertoire to match `ordered_ids` (every song id, in the new order).
+    Songs already in relative order keep their keys; only the moved ones are rewritten,
+    between their kept neighbours. Returns the number of songs written.
+    """
+    current = {
+        row['id']: row['song_number']
+        for row in cursor.execute(
+            'SELECT id, song_number FROM songs WHERE repertoire_id IS ?', (repertoire_id,)
+        ).fetchall()
+    }
+    keys = [current[sid] for sid in ordered_ids]
+    keep = _longest_increasing_run(keys)
+
+    new_keys = {}
+    i = 0
+    while i < len(ordered_ids):
+        if i in keep:
+            i += 1
+            continue
+        start = i
+        while i < len(ordered_ids) and i not in keep:
+            i += 1
+        lo = keys[start - 1] if start > 0 else 0
+        hi = keys[i] if i < len(ordered_ids) else lo + (i - start + 1) * SONG_NUMBER_GAP
+        step = (hi - lo) // (i - start + 1)
+        if step < 1:
+            # Not enough room between kept neighbours: respace the whole repertoire
+            new_keys = {
+                sid: n * SONG_NUMBER_GAP
+                for n, sid in enumerate(ordered_ids, start=1)
+                if current[sid] != n * SONG_NUMBER_GAP
+            }
+            break
+        for n, sid in enumerate(ordered_ids[start:i], start=1):
+            new_keys[sid] = lo + n * step
+
+    unchanged = {key for sid, key in current.items() if sid not in new_keys}
+    moved_from = {current[sid] for sid in new_keys}
+    _write_keys(cursor, new_keys, unchanged | moved_from)
+    return len(new_keys)
+
+
+def rebalance_crowded_repertoires(min_gap=REBALANCE_MIN_GAP):
+    """Respace every repertoire whose keys got too close together. Returns songs rewritten."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        rows = cursor.execute(
+            '''
+            SELECT repertoire_id FROM (
+                SELECT repertoire_id, song_number,
+                       song_number - LAG(song_number, 1, 0) OVER (
+                           PARTITION BY repertoire_id ORDER BY song_number ASC
+                       ) AS gap
+                FROM songs
+            )
+            GROUP BY repertoire_id
+            HAVING MIN(gap) < ?
+            ''',
+            (min_gap,)
+        ).fetchall()
+        _, updated = normalize_song_numbers(cursor, [row['repertoire_id'] for row in rows])
+
+    if updated:
+        print(f'Respaced song order keys for {updated} song(s) in {len(rows)} repertoire(s)')
+    return updated
+
+
+if __name__ == '__main__':
+    rebalance_crowded_repertoires()
@@ -0,0 +1,160 @@
+"""Practice streaks kept in user_streaks, updated in O(1) on every practice."""
+
+import sys
+from datetime import datetime, timedelta
+
+from database import get_db
+
+# One row per unbroken run of practice days per user (gaps-and-islands over the log)
+STREAK_RUNS_SQL = '''
+    WITH days AS (
+        SELECT DISTINCT user_id, practice_date FROM practice_date_log {where}
+    ),
+    runs AS (
+        SELECT user_id, practice_date,
+               julianday(practice_date) - ROW_NUMBER() OVER (
+                   PARTITION BY user_id ORDER BY practice_date
+               ) AS run_key
+        FROM days
+    ),
+    islands AS (
+        SELECT user_id, MAX(practice_date) AS last_date, COUNT(*) AS length
+        FROM runs
+        GROUP BY user_id, run_key
+    )
+    SELECT user_id,
+           MAX(last_date) AS last_date,
+           MAX(length) AS longest_streak,
+           (SELECT i2.length FROM islands i2
+            WHERE i2.user_id = islands.user_id
+            ORDER BY i2.last_date DESC LIMIT 1) AS current_streak
+    FROM islands
+    GROUP BY user_id
+'''
+
+
+def record_practice_day(cursor, user_id, practice_date):
+    """
+    Fold one practice day (YYYY-MM-DD) into the user's streak with a single upsert.
+    Same day is a no-op, the next day extends the run, anything later starts a new run.
+    """
+    cursor.execute('''
+        INSERT INTO user_streaks (user_id, current_streak, longest_streak, last_date)
+        VALUES (?, 1, 1, ?)
+        ON CONFLICT(user_id) DO UPDATE SET
+            current_streak = CASE
+                WHEN excluded.last_date <= last_date THEN current_streak
+                WHEN last_date = date(excluded.last_date, '-1 day') THEN current_streak + 1
+                ELSE 1
+            END,
+            longest_streak = MAX(longest_streak, CASE
+                WHEN excluded.last_date <= last_date THEN current_streak
+                WHEN last_date = date(excluded.last_date, '-1 day') THEN current_streak + 1
+                ELSE 1
+            END),
+            last_date = MAX(last_date, excluded.last_date)
+    ''', (user_id, practice_date))
+
+
+def read_streaks(cursor, user_id, today=None):
+    """Return the /api/dashboard/streaks payload from the stored streak row."""
+    row = cursor.execute(
+        'SELECT current_streak, longest_streak, last_date FROM user_streaks WHERE user_id = ?',
+        (user_id,)
+    ).fetchone()
+    if not row or not row['last_date']:
+        return {
+            'current_streak': 0,
+            'longest_streak': 0,
+            'last_practice_date': None,
+            'practiced_today': False
+        }
+
+    today = today or datetime.now().date()
+    last_date = datetime.strptime(row['last_date'], '%Y-%m-%d').date()
+    practiced_today = last_date == today
+    # A run only counts as current while it reaches today or yesterday
+    current_streak = row['current_streak'] if last_date >= today - timedelta(days=1) else 0
+    return {
+        'current_streak': current_streak,
+        'longest_streak': row['longest_streak'],
+        'last_practice_date': row['last_date'],
+        'practiced_today': practiced_today
+    }
+
+
+def compute_streaks(cursor, user_ids=None):
+    """Recompute {user_id: (current_streak, longest_streak, last_date)} from practice_date_log."""
+    where, params = '', []
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        where = 'WHERE user_id IN (%s)' % ','.join('?' * len(user_ids))
+        params = user_ids
+    rows = cursor.execute(STREAK_RUNS_SQL.format(where=where), params).fetchall()
+    return {
+        row['user_id']: (row['current_streak'], row['longest_streak'], row['last_date'])
+        for row in rows
+    }
+
+
+def rebuild_user_streaks(cursor, user_ids=None):
+    """Replace stored streaks with values recomputed from the log. Returns rows written."""
+    computed = compute_streaks(cursor, user_ids)
+    if user_ids is None:
+        cursor.execute('DELETE FROM user_streaks')
+    else:
+        cursor.executemany('DELETE FROM user_streaks WHERE user_id = ?', [(uid,) for uid in user_ids])
+    cursor.executemany(
+        'INSERT INTO user_streaks (user_id, current_streak, longest_streak, last_date) VALUES (?, ?, ?, ?)',
+        [(uid,) + state for uid, state in computed.items()]
+    )
+    return len(computed)
+
+
+def practice_log_users(cursor, song_ids_sql, params=()):
+    """
+    User ids with practice_date_log rows for the songs selected by `song_ids_sql`.
+    Collect these before deleting songs (the log rows cascade away) and rebuild after.
+    """
+    rows = cursor.execute(
+        f'SELECT DISTINCT user_id FROM practice_date_log WHERE song_id IN ({song_ids_sql})',
+        params
+    ).fetchall()
+    return [row['user_id'] for row in rows]
+
+
+def check_user_streaks(cursor):
+    """Return [(user_id, stored, expected)] for every user whose stored streak drifted from the log."""
+    expected = compute_streaks(cursor)
+    stored = {
+        row['user_id']: (row['current_streak'], row['longest_streak'], row['last_date'])
+        for row in cursor.execute(
+            'SELECT user_id, current_streak, longest_streak, last_date FROM user_streaks'
+        ).fetchall()
+    }
+    return [
+        (user_id, stored.get(user_id), expected.get(user_id))
+        for user_id in sorted(set(expected) | set(stored))
+        if stored.get(user_id) != expected.get(user_id)
+    ]
+
+
+def main(argv=None):
+    """Check stored streaks against practice_date_log; --rebuild rewrites them."""
+    argv = sys.argv[1:] if argv is None else argv
+    with get_db() as conn:
+        cursor = conn.cursor()
+        if '--rebuild' in argv:
+            print(f'Rebuilt streaks for {rebuild_user_streaks(cursor)} user(s)')
+            return 0
+        mismatches = check_user_streaks(cursor)
+    for user_id, stored, expected in mismatches:
+        print(f'user {user_id}: stored {stored}, expected {expected}')
+    print(f'{len(mismatches)} mismatched user(s)')
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
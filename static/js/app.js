@@ -49,6 +49,12 @@ function isRunningAsPWA() {
 
 // File extensions that can be viewed in an iframe
 const VIEWABLE_CHART_EXTENSIONS = ['.pdf', '.png', '.jpg', '.jpeg', '.gif'];
+// Charts the server can render to PDF and page images (when a converter is installed)
+const PREVIEW_CHART_EXTENSIONS = ['.pdf', '.odt', '.doc', '.docx', '.txt'];
+const CHART_PREVIEW_POLL_MS = 1500;
+const CHART_PREVIEW_MAX_POLLS = 20;
+// Bumped per opened chart, so a slow preview never lands in a later chart's viewer
+let chartPreviewToken = 0;
 
 function getFileExtension(path) {
     if (!path) return '';
@@ -60,9 +66,12 @@ function openChartViewer(songId) {
     const song = songs.find(s => s.id === songId);
     if (!song) return;
     
-    // In browser mode, open in new tab as usual
+    const ext = getFileExtension(song.chart_path);
+
+    // In browser mode, open in new tab as usual; documents open as their rendered PDF
     if (!isRunningAsPWA()) {
-        window.open(`/chart/${songId}`, '_blank');
+        const viewable = VIEWABLE_CHART_EXTENSIONS.includes(ext);
+        window.open(viewable ? `/chart/${songId}` : `/chart/${songId}/preview`, '_blank');
         return;
     }
     
@@ -75,10 +84,15 @@ function openChartViewer(songId) {
     title.textContent = song.title || 'Chart';
     
     // Check if the file format is viewable in an iframe
-    const ext = getFileExtension(song.chart_path);
     const isViewable = VIEWABLE_CHART_EXTENSIONS.includes(ext);
     
-    if (isViewable) {
+    if (song.chart_hash && PREVIEW_CHART_EXTENSIONS.includes(ext)) {
+        // Page images render on every phone, unlike PDFs and office documents
+        frame.src = '';
+        frame.style.display = 'block';
+        downloadFallback.style.display = 'none';
+        showChartPreview(songId, ext);
+    } else if (isViewable) {
         // Show iframe, hide download fallback
         frame.src = `/chart/${songId}`;
         frame.style.display = 'block';
@@ -98,11 +112,48 @@ function openChartViewer(songId) {
     document.body.style.overflow = 'hidden';
 }
 
+async function showChartPreview(songId, ext) {
+    const frame = document.getElementById('chartViewerFrame');
+    const downloadFallback = document.getElementById('chartViewerDownload');
+    const modal = document.getElementById('chartViewerModal');
+    const token = ++chartPreviewToken;
+    let preview = null;
+    try {
+        // The first view of a chart starts its render; poll until it is ready
+        for (let attempt = 0; attempt < CHART_PREVIEW_MAX_POLLS; attempt++) {
+            const res = await fetch(`/api/songs/${songId}/chart/preview`);
+            if (res.status !== 202) {
+                if (res.ok) preview = await res.json();
+                break;
+            }
+            await new Promise(resolve => setTimeout(resolve, CHART_PREVIEW_POLL_MS));
+            // Closed or replaced by another chart while waiting
+            if (modal.style.display === 'none' || token !== chartPreviewToken) return;
+        }
+    } catch (err) {
+        console.error('Chart preview failed', err);
+    }
+    if (token !== chartPreviewToken) return;
+    if (preview && preview.pages.length) {
+        const pages = preview.pages.map(url => `<img src="${url}" alt="">`).join('');
+        frame.srcdoc = `<!DOCTYPE html><html><head><meta name="viewport" content="width=device-width, initial-scale=1">` +
+            `<style>body{margin:0;background:#fff}img{display:block;width:100%;height:auto}</style></head><body>${pages}</body></html>`;
+    } else if (preview || VIEWABLE_CHART_EXTENSIONS.includes(ext)) {
+        frame.src = preview ? preview.pdf : `/chart/${songId}`;
+    } else {
+        frame.style.display = 'none';
+        downloadFallback.style.display = 'flex';
+        downloadFallback.querySelector('.download-link').href = `/chart/${songId}`;
+        downloadFallback.querySelector('.file-type').textContent = ext.toUpperCase().replace('.', '') || 'Document';
+    }
+}
+
 function closeChartViewer() {
     const modal = document.getElementById('chartViewerModal');
     const frame = document.getElementById('chartViewerFrame');
     
     modal.style.display = 'none';
+    frame.removeAttribute('srcdoc');
     frame.src = ''; // Clear iframe to stop any loading
     
     // Restore body scroll
@@ -539,13 +590,21 @@ async function loadRepertoires() {
     }
 }
 
+// Version of the loaded song list; later loads only fetch what changed since then
+let songsVersion = null;
+let songsScope = null;
+
 async function loadSongs() {
     try {
         const url = currentRepertoireId 
             ? `/api/songs?repertoire_id=${currentRepertoireId}`
             : '/api/songs';
-        const response = await fetch(url);
-        songs = await response.json();
+        if (!(songsVersion && songsScope === url && await loadSongChanges(url))) {
+            const response = await fetch(url);
+            songs = await response.json();
+            songsVersion = response.headers.get('X-Data-Version');
+            songsScope = url;
+        }
         renderSongs();
         updateOverallProgress();
     } catch (error) {
@@ -553,31 +612,147 @@ async function loadSongs() {
     }
 }
 
-async function practiceSong(songId) {
+async function loadSongChanges(url) {
+    // Patch the loaded list in place; returns false when a full reload is needed
+    const separator = url.includes('?') ? '&' : '?';
+    const response = await fetch(`${url}${separator}since=${encodeURIComponent(songsVersion)}`);
+    if (!response.ok) return false;
+    const delta = await response.json();
+    if (delta.full) {
+        songs = delta.songs;
+    } else {
+        const removed = new Set(delta.deleted);
+        const changed = new Map(delta.songs.map(song => [song.id, song]));
+        songs = songs.filter(song => !removed.has(song.id));
+        songs = songs.map(song => changed.get(song.id) || song);
+        const known = new Set(songs.map(song => song.id));
+        songs.push(...delta.songs.filter(song => !known.has(song.id)));
+        songs.forEach(song => {
+            if (delta.positions[song.id] !== undefined) {
+                song.song_number = delta.positions[song.id];
+            }
+        });
+        songs.sort((a, b) => (a.repertoire_id - b.repertoire_id) || (a.song_number - b.song_number));
+    }
+    songsVersion = delta.version;
+    return true;
+}
+
+// Practice taps are queued and sent together; the server ignores replayed client_event_ids
+const PRACTICE_FLUSH_DELAY_MS = 400;
+const PRACTICE_RETRY_DELAY_MS = 5000;
+let pendingPracticeEvents = [];
+let practiceFlushTimer = null;
+
+function newClientEventId() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return `${Date.now()}-${Math.random().toString(16).slice(2)}`;
+}
+
+function schedulePracticeFlush(delay) {
+    clearTimeout(practiceFlushTimer);
+    practiceFlushTimer = setTimeout(flushPracticeEvents, delay);
+}
+
+function applySongStates(states) {
+    states.forEach(state => {
+        const song = songs.find(s => s.id === state.id);
+        if (song) {
+            Object.assign(song, state);
+        }
+    });
+    renderSongs();
+    updateOverallProgress();
+}
+
+function practiceSong(songId) {
+    // Lock reordering to keep the same song under the cursor for quick repeated clicks
+    lockReordering();
+
+    // Show the tap right away; the batch response carries the authoritative values
+    const song = songs.find(s => s.id === songId);
+    if (song) {
+        song.practice_count = (song.practice_count || 0) + 1;
+        song.practice_target = Math.max(song.practice_target || 0, song.practice_count);
+        song.practice_progress = song.practice_count / song.practice_target * 100;
+        song.last_practiced = new Date().toISOString();
+        renderSongs();
+        updateOverallProgress();
+    }
+
+    pendingPracticeEvents.push({
+        song_id: songId,
+        timestamp: Date.now(),
+        client_event_id: newClientEventId()
+    });
+    schedulePracticeFlush(PRACTICE_FLUSH_DELAY_MS);
+}
+
+async function flushPracticeEvents() {
+    practiceFlushTimer = null;
+    if (pendingPracticeEvents.length === 0) return;
+    const events = pendingPracticeEvents;
+    pendingPracticeEvents = [];
+
     try {
-        // Lock reordering to keep the same song under the cursor for quick repeated clicks
-        lockReordering();
-        const response = await fetch(`/api/songs/${songId}/practice`, {
-            method: 'POST'
+        const response = await fetch('/api/practice/batch', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ events })
         });
-        
         if (response.ok) {
+            // 202 from the service worker: queued offline, replayed later from its outbox
+            const result = await response.json();
+            applySongStates(result.songs);
+        } else if (response.status >= 500) {
+            throw new Error(`Server error ${response.status}`);
+        } else {
+            // Rejected batch: nothing will change on retry, so resync instead
+            console.error('Practice batch rejected:', response.status);
             loadSongs();
         }
     } catch (error) {
         console.error('Error recording practice:', error);
+        // Safe to resend: already applied events are skipped by client_event_id
+        pendingPracticeEvents = events.concat(pendingPracticeEvents);
+        schedulePracticeFlush(PRACTICE_RETRY_DELAY_MS);
     }
 }
 
+// Send queued taps when the page goes away
+window.addEventListener('pagehide', () => {
+    if (pendingPracticeEvents.length === 0 || !navigator.sendBeacon) return;
+    const body = new Blob([JSON.stringify({ events: pendingPracticeEvents })], { type: 'application/json' });
+    if (navigator.sendBeacon('/api/practice/batch', body)) {
+        pendingPracticeEvents = [];
+    }
+});
+
 async function toggleSkill(songId, skillId) {
     try {
         // Lock reordering to avoid resort/removal while toggling multiple skills
         lockReordering();
+
+        // Send the desired state rather than a bare toggle so an offline replay cannot flip it back
+        const song = songs.find(s => s.id === songId);
+        const skill = song && song.skills.find(s => s.id === skillId);
+        const body = {};
+        if (skill && skill.is_mastered !== null) {
+            body.is_mastered = skill.is_mastered ? 0 : 1;
+            skill.is_mastered = body.is_mastered;
+            renderSongs();
+        }
+
         const response = await fetch(`/api/songs/${songId}/skills/${skillId}/toggle`, {
-            method: 'POST'
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(body)
         });
-        
-        if (response.ok) {
+
+        // 202 means the service worker queued it offline; keep the optimistic state
+        if (response.ok && response.status !== 202) {
             loadSongs();
         }
     } catch (error) {
@@ -585,6 +760,23 @@ async function toggleSkill(songId, skillId) {
     }
 }
 
+// The service worker (sw.js) replays its offline outbox; nudge it when the connection returns
+if ('serviceWorker' in navigator) {
+    window.addEventListener('online', () => {
+        navigator.serviceWorker.ready.then((registration) => {
+            if (registration.active) {
+                registration.active.postMessage({ type: 'flush-outbox' });
+            }
+        });
+        flushPracticeEvents();
+    });
+    navigator.serviceWorker.addEventListener('message', (event) => {
+        if (event.data && event.data.type === 'outbox-flushed') {
+            loadSongs();
+        }
+    });
+}
+
 function isInArchive() {
     const currentRep = repertoires.find(r => r.id === currentRepertoireId);
     return currentRep && currentRep.name === 'Archive';
@@ -2120,40 +2312,82 @@ async function moveRepertoireToArchive(repertoireId) {
     }
 }
 
+// Folder syncs run as background jobs; the sync button shows progress while one runs
+let activeSyncJob = null;
+const SYNC_POLL_MS = 1000;
+
+function syncProgressLabel(job) {
+    const progress = job.progress || {};
+    const counts = `${progress.songs_added || 0} added, ${progress.mp3_linked || 0} MP3s, ${progress.sheets_linked || 0} sheets`;
+    return `⏳ ${job.phase || 'Queued'} (${counts}) - click to cancel`;
+}
+
 async function syncRepertoireFolders(repertoireId) {
+    if (activeSyncJob && activeSyncJob.repertoireId === repertoireId) {
+        if (confirm('A sync is running. Cancel it? Changes from the current step are rolled back.')) {
+            await fetch(`/api/jobs/${activeSyncJob.id}/cancel`, { method: 'POST' });
+        }
+        return;
+    }
     if (!confirm('Scan linked folders and import missing songs, MP3s, and sheets?')) return;
     
+    const syncBtn = document.getElementById('syncRepertoireBtn');
+    const originalLabel = syncBtn ? syncBtn.textContent : '';
     try {
         const response = await fetch(`/api/repertoires/${repertoireId}/sync`, {
             method: 'POST'
         });
         
-        if (response.ok) {
-            const stats = await response.json();
-            let msg = 'Sync completed:\n\n';
-            msg += `Songs added: ${stats.songs_added}\n`;
-            msg += `MP3s linked: ${stats.mp3_linked}\n`;
-            msg += `Sheets linked: ${stats.sheets_linked}\n`;
-            if (stats.debug) {
-                msg += `\nDebug Info:\n`;
-                msg += `Songs in repertoire: ${stats.debug.songs_in_repertoire}\n`;
-                msg += `MP3 files found: ${stats.debug.mp3_files_found}\n`;
-                msg += `Sheet files found: ${stats.debug.sheet_files_found}\n`;
-            }
-            if (stats.errors.length > 0) {
-                msg += `\nErrors:\n${stats.errors.join('\n')}`;
-            }
-            alert(msg);
-            closeRepertoireModal();
-            loadRepertoires();
-            loadSongs();
-        } else {
+        if (!response.ok) {
             const error = await response.json();
             alert(error.error || 'Error syncing folders');
+            return;
         }
+        
+        const started = await response.json();
+        activeSyncJob = { id: started.job_id, repertoireId };
+        
+        let job;
+        while (true) {
+            const statusResponse = await fetch(started.status_url);
+            if (!statusResponse.ok) throw new Error(`Job status ${statusResponse.status}`);
+            job = await statusResponse.json();
+            if (job.status !== 'queued' && job.status !== 'running') break;
+            if (syncBtn) syncBtn.textContent = syncProgressLabel(job);
+            await new Promise(resolve => setTimeout(resolve, SYNC_POLL_MS));
+        }
+        
+        const stats = job.progress || { songs_added: 0, mp3_linked: 0, sheets_linked: 0, errors: [] };
+        let msg;
+        if (job.status === 'succeeded') {
+            msg = 'Sync completed:\n\n';
+        } else if (job.status === 'cancelled') {
+            msg = 'Sync cancelled. Completed steps were kept:\n\n';
+        } else {
+            msg = `Sync failed: ${job.error || 'unknown error'}\nCompleted steps were kept:\n\n`;
+        }
+        msg += `Songs added: ${stats.songs_added}\n`;
+        msg += `MP3s linked: ${stats.mp3_linked}\n`;
+        msg += `Sheets linked: ${stats.sheets_linked}\n`;
+        if (stats.debug) {
+            msg += `\nDebug Info:\n`;
+            msg += `Songs in repertoire: ${stats.debug.songs_in_repertoire}\n`;
+            msg += `MP3 files found: ${stats.debug.mp3_files_found}\n`;
+            msg += `Sheet files found: ${stats.debug.sheet_files_found}\n`;
+        }
+        if (stats.errors && stats.errors.length > 0) {
+            msg += `\nErrors:\n${stats.errors.join('\n')}`;
+        }
+        alert(msg);
+        closeRepertoireModal();
+        loadRepertoires();
+        loadSongs();
     } catch (error) {
         console.error('Error syncing folders:', error);
         alert('Error syncing folders');
+    } finally {
+        activeSyncJob = null;
+        if (syncBtn) syncBtn.textContent = originalLabel;
     }
 }
 
@@ -2349,15 +2583,11 @@ async function generateSetlistPDF() {
     }
     
     try {
-        const response = await fetch(`/api/repertoires/${repertoireId}/setlist-pdf`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-                min_song_number: minSongNumber ? parseInt(minSongNumber) : null,
-                max_song_number: maxSongNumber ? parseInt(maxSongNumber) : null,
-                custom_title: customTitle || defaultTitle
-            })
-        });
+        // GET, so the browser cache revalidates an unchanged setlist (304) instead of downloading it again
+        const params = new URLSearchParams({ custom_title: customTitle || defaultTitle });
+        if (minSongNumber) params.set('min_song_number', parseInt(minSongNumber));
+        if (maxSongNumber) params.set('max_song_number', parseInt(maxSongNumber));
+        const response = await fetch(`/api/repertoires/${repertoireId}/setlist-pdf?${params}`);
         
         if (response.ok) {
             // Download the PDF
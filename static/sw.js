@@ -1,4 +1,5 @@
-const CACHE_NAME = 'songtrainer-v1';
+// Bumped when runtime caching changes; activate drops the older caches
+const CACHE_NAME = 'songtrainer-v3';
 const OFFLINE_URL = '/';
 
 // Assets to cache immediately on install
@@ -33,29 +34,53 @@ self.addEventListener('activate', (event) => {
           .map((name) => caches.delete(name))
       );
     }).then(() => self.clients.claim())
+      .then(() => flushOutbox())
   );
 });
 
 // Fetch event - network first, fallback to cache
 self.addEventListener('fetch', (event) => {
-  // Skip non-GET requests
-  if (event.request.method !== 'GET') {
+  // Practice taps and skill changes are queued when the network is down
+  const url = new URL(event.request.url);
+  if (event.request.method === 'POST' && url.origin === self.location.origin && isQueueable(url.pathname)) {
+    event.respondWith(sendOrQueue(event.request, url.pathname));
     return;
   }
 
-  // Skip API requests - always go to network
-  if (event.request.url.includes('/api/')) {
+  // Skip non-GET requests, other origins and partial (Range) requests such as audio seeks
+  if (event.request.method !== 'GET' || url.origin !== self.location.origin || event.request.headers.has('Range')) {
     return;
   }
 
+  // Pages: network first; only the app shell is kept, as the offline fallback
+  if (event.request.mode === 'navigate') {
+    event.respondWith(
+      fetch(event.request)
+        .then((response) => {
+          if (response.status === 200 && url.pathname === OFFLINE_URL) {
+            const responseClone = response.clone();
+            caches.open(CACHE_NAME).then((cache) => cache.put(OFFLINE_URL, responseClone));
+          }
+          return response;
+        })
+        .catch(() => caches.match(OFFLINE_URL))
+    );
+    return;
+  }
+
+  // Everything else except static assets (API, /media/, /chart/ and previews) is left to
+  // the network and the HTTP cache, so audio and charts never pile up in this cache
+  if (!url.pathname.startsWith('/static/')) {
+    return;
+  }
+
+  // Static assets: network first, fallback to cache
   event.respondWith(
     fetch(event.request)
       .then((response) => {
-        // Clone the response before caching
-        const responseClone = response.clone();
-        
         // Cache successful responses
         if (response.status === 200) {
+          const responseClone = response.clone();
           caches.open(CACHE_NAME).then((cache) => {
             cache.put(event.request, responseClone);
           });
@@ -66,15 +91,228 @@ self.addEventListener('fetch', (event) => {
       .catch(() => {
         // Network failed, try cache
         return caches.match(event.request).then((cachedResponse) => {
-          if (cachedResponse) {
-            return cachedResponse;
-          }
-          // If no cache, return offline page for navigation requests
-          if (event.request.mode === 'navigate') {
-            return caches.match(OFFLINE_URL);
-          }
-          return new Response('Offline', { status: 503, statusText: 'Offline' });
+          return cachedResponse || new Response('Offline', { status: 503, statusText: 'Offline' });
         });
       })
   );
 });
+
+// ==================== OFFLINE OUTBOX ====================
+// Mutations that fail for lack of a connection are kept in IndexedDB and replayed
+// once the network is back. Replays are safe: practice events carry a
+// client_event_id the server applies only once, and skill changes carry the
+// desired is_mastered state rather than a bare toggle.
+
+const OUTBOX_DB = 'songtrainer-outbox';
+const OUTBOX_STORE = 'mutations';
+const OUTBOX_SYNC_TAG = 'songtrainer-outbox';
+const PRACTICE_BATCH_URL = '/api/practice/batch';
+const PRACTICE_BATCH_SIZE = 500;
+const PRACTICE_PATH = /^\/api\/songs\/(\d+)\/practice$/;
+const SKILL_TOGGLE_PATH = /^\/api\/songs\/\d+\/skills\/\d+\/toggle$/;
+// Client errors that may succeed later; any other 4xx drops the mutation
+const RETRYABLE_STATUSES = [401, 408, 429];
+
+function isQueueable(path) {
+  return path === PRACTICE_BATCH_URL || PRACTICE_PATH.test(path) || SKILL_TOGGLE_PATH.test(path);
+}
+
+function newClientEventId() {
+  if (self.crypto && crypto.randomUUID) {
+    return crypto.randomUUID();
+  }
+  return `${Date.now()}-${Math.random().toString(16).slice(2)}`;
+}
+
+function openOutbox() {
+  return new Promise((resolve, reject) => {
+    const request = indexedDB.open(OUTBOX_DB, 1);
+    request.onupgradeneeded = () => {
+      request.result.createObjectStore(OUTBOX_STORE, { keyPath: 'id', autoIncrement: true });
+    };
+    request.onsuccess = () => resolve(request.result);
+    request.onerror = () => reject(request.error);
+  });
+}
+
+// Run fn(store) in one transaction; resolves with the result of the IDBRequest fn returns, if any
+function withOutbox(mode, fn) {
+  return openOutbox().then((db) => new Promise((resolve, reject) => {
+    const tx = db.transaction(OUTBOX_STORE, mode);
+    const request = fn(tx.objectStore(OUTBOX_STORE));
+    tx.oncomplete = () => {
+      db.close();
+      resolve(request ? request.result : undefined);
+    };
+    tx.onerror = tx.onabort = () => {
+      db.close();
+      reject(tx.error);
+    };
+  }));
+}
+
+function addToOutbox(entries) {
+  return withOutbox('readwrite', (store) => {
+    entries.forEach((entry) => store.add(entry));
+  });
+}
+
+function readOutbox() {
+  return withOutbox('readonly', (store) => store.getAll());
+}
+
+function removeFromOutbox(ids) {
+  if (ids.length === 0) return Promise.resolve();
+  return withOutbox('readwrite', (store) => {
+    ids.forEach((id) => store.delete(id));
+  });
+}
+
+// Turn a failed request into outbox entries
+function outboxEntries(path, bodyText) {
+  let body = {};
+  try {
+    body = bodyText ? JSON.parse(bodyText) : {};
+  } catch (error) {
+    body = {};
+  }
+  const queuedAt = Date.now();
+
+  if (path === PRACTICE_BATCH_URL) {
+    return (body.events || []).map((event) => ({
+      kind: 'practice',
+      event: { ...event, client_event_id: event.client_event_id || newClientEventId() },
+      queuedAt
+    }));
+  }
+  const practice = path.match(PRACTICE_PATH);
+  if (practice) {
+    return [{
+      kind: 'practice',
+      event: {
+        song_id: Number(practice[1]),
+        timestamp: queuedAt,
+        client_event_id: body.client_event_id || newClientEventId()
+      },
+      queuedAt
+    }];
+  }
+  return [{ kind: 'skill', path, body, queuedAt }];
+}
+
+function registerOutboxSync() {
+  if (self.registration.sync) {
+    self.registration.sync.register(OUTBOX_SYNC_TAG).catch(() => {});
+  }
+}
+
+async function sendOrQueue(request, path) {
+  const bodyText = await request.clone().text();
+  try {
+    const response = await fetch(request);
+    // This one got through, so earlier queued mutations can go too
+    flushOutbox();
+    return response;
+  } catch (error) {
+    await addToOutbox(outboxEntries(path, bodyText));
+    registerOutboxSync();
+    return new Response(JSON.stringify({ queued: true, events: [], songs: [] }), {
+      status: 202,
+      headers: { 'Content-Type': 'application/json' }
+    });
+  }
+}
+
+function isSettled(response) {
+  return response.ok || (response.status >= 400 && response.status < 500 && !RETRYABLE_STATUSES.includes(response.status));
+}
+
+function postJson(url, body) {
+  return fetch(url, {
+    method: 'POST',
+    credentials: 'same-origin',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(body)
+  });
+}
+
+// Replay queued mutations in order; resolves with the number still queued
+async function replayOutbox() {
+  const entries = await readOutbox();
+  if (entries.length === 0) return 0;
+  const done = [];
+
+  // Only the last desired state per song skill matters; bare toggles are replayed as queued
+  const latestSkill = new Map();
+  entries.forEach((entry) => {
+    if (entry.kind === 'skill' && 'is_mastered' in entry.body) latestSkill.set(entry.path, entry);
+  });
+
+  let batch = [];
+  const sendBatch = async () => {
+    if (batch.length === 0) return true;
+    const response = await postJson(PRACTICE_BATCH_URL, { events: batch.map((entry) => entry.event) });
+    if (!isSettled(response)) return false;
+    done.push(...batch.map((entry) => entry.id));
+    batch = [];
+    return true;
+  };
+
+  try {
+    let sending = true;
+    for (const entry of entries) {
+      if (entry.kind === 'practice') {
+        batch.push(entry);
+        sending = batch.length < PRACTICE_BATCH_SIZE || await sendBatch();
+      } else if ('is_mastered' in entry.body && latestSkill.get(entry.path) !== entry) {
+        done.push(entry.id);
+      } else {
+        // Consecutive practice taps go out as one batch before the next skill change
+        sending = await sendBatch() && isSettled(await postJson(entry.path, entry.body));
+        if (sending) done.push(entry.id);
+      }
+      if (!sending) break;
+    }
+    if (sending) await sendBatch();
+  } catch (error) {
+    // Still offline; whatever was not confirmed stays queued
+  } finally {
+    await removeFromOutbox(done);
+    if (done.length > 0) {
+      const clients = await self.clients.matchAll({ type: 'window' });
+      clients.forEach((client) => client.postMessage({ type: 'outbox-flushed', replayed: done.length }));
+    }
+  }
+  return entries.length - done.length;
+}
+
+let outboxFlush = null;
+
+function flushOutbox() {
+  if (!outboxFlush) {
+    outboxFlush = replayOutbox()
+      .catch((error) => {
+        console.log('Outbox replay failed:', error);
+        return 1;
+      })
+      .finally(() => {
+        outboxFlush = null;
+      });
+  }
+  return outboxFlush;
+}
+
+// Background Sync where supported; otherwise pages ask for a flush when they come back online
+self.addEventListener('sync', (event) => {
+  if (event.tag === OUTBOX_SYNC_TAG) {
+    event.waitUntil(flushOutbox().then((remaining) => {
+      if (remaining > 0) throw new Error('Outbox not yet replayed');
+    }));
+  }
+});
+
+self.addEventListener('message', (event) => {
+  if (event.data && event.data.type === 'flush-outbox') {
+    event.waitUntil(flushOutbox());
+  }
+});
@@ -8,57 +8,17 @@ If no repertoire_name provided, updates all songs with linked audio.
 import sqlite3
 import os
 import sys
-import json
-import subprocess
 
 # Ensure UTF-8 handling
 import io
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
-try:
-    from mutagen.mp3 import MP3
-    MUTAGEN_AVAILABLE = True
-except ImportError:
-    MUTAGEN_AVAILABLE = False
-    print("ERROR: mutagen not installed. Run: pip install mutagen")
-    sys.exit(1)
-
-
-def extract_duration_mutagen(file_path):
-    """Extract duration using mutagen."""
-    if not file_path or not os.path.isfile(file_path):
-        return None
-    try:
-        audio = MP3(file_path)
-        if audio.info.length:
-            return int(audio.info.length)
-    except Exception:
-        return None
-
-def extract_duration_ffprobe(file_path):
-    """Extract duration using ffprobe (fallback for problematic MP3s)."""
-    if not file_path or not os.path.isfile(file_path):
-        return None
-    try:
-        result = subprocess.run(
-            ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'json', file_path],
-            capture_output=True, text=True, timeout=10
-        )
-        if result.returncode == 0:
-            data = json.loads(result.stdout)
-            duration = int(float(data['format']['duration']))
-            return duration if duration > 0 else None
-    except Exception:
-        pass
-    return None
+from database import DATABASE
+from services.audio_metadata import MUTAGEN_AVAILABLE, FFPROBE, extract_durations
 
-def extract_duration(file_path):
-    """Extract duration in seconds from an MP3 file. Tries mutagen first, then ffprobe."""
-    duration = extract_duration_mutagen(file_path)
-    if duration:
-        return duration
-    # Fallback to ffprobe for problematic MP3s
-    return extract_duration_ffprobe(file_path)
+if not (MUTAGEN_AVAILABLE or FFPROBE):
+    print("ERROR: neither mutagen nor ffprobe is available. Run: pip install mutagen")
+    sys.exit(1)
 
 
 def convert_windows_path_to_wsl(win_path):
@@ -108,7 +68,7 @@ def find_mp3_by_title(title, folder_path):
 
 def update_durations(repertoire_name=None):
     """Update durations for songs with linked audio."""
-    conn = sqlite3.connect('songs.db')
+    conn = sqlite3.connect(DATABASE)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     
@@ -125,7 +85,7 @@ def update_durations(repertoire_name=None):
     else:
         songs = cursor.execute('''
             SELECT s.id, s.title, s.audio_path
-            FROM songs
+            FROM songs s
             WHERE s.audio_path IS NOT NULL AND (s.duration IS NULL OR s.duration = 0)
             ORDER BY s.id
         ''').fetchall()
@@ -138,22 +98,23 @@ def update_durations(repertoire_name=None):
     
     print(f"Found {len(songs)} songs to process.\n")
     
-    updated = 0
+    updates = []
     failed = 0
     
+    # Convert Windows paths to WSL if needed
+    local_paths = {song['id']: convert_windows_path_to_wsl(song['audio_path']) or song['audio_path'] for song in songs}
+    
+    # Cached durations come straight from media_metadata; new or changed files are probed in parallel
+    durations = extract_durations(local_paths.values())
+    
     for i, song in enumerate(songs, 1):
         song_id = song['id']
         title = song['title']
-        audio_path = song['audio_path']
-        
-        # Convert Windows path to WSL if needed
-        wsl_path = convert_windows_path_to_wsl(audio_path)
-        if not wsl_path:
-            wsl_path = audio_path
+        wsl_path = local_paths[song_id]
         
         print(f"[{i}/{len(songs)}] {title}...", end=' ', flush=True)
         
-        duration = extract_duration(wsl_path)
+        duration = durations.get(wsl_path)
         
         # Fallback: search by title if exact path failed
         if duration is None:
@@ -165,17 +126,27 @@ def update_durations(repertoire_name=None):
             if folder and os.path.isdir(folder):
                 fallback_path = find_mp3_by_title(title, folder)
                 if fallback_path:
-                    duration = extract_duration(fallback_path)
+                    duration = extract_durations([fallback_path])[fallback_path]
         
         if duration is not None:
-            cursor.execute('UPDATE songs SET duration = ? WHERE id = ?', (duration, song_id))
-            conn.commit()
+            updates.append((duration, song_id))
             print(f"✓ ({duration}s)")
-            updated += 1
         else:
             print("✗ (failed to extract)")
             failed += 1
     
+    # Probing writes to media_metadata, so songs are only updated once it is done
+    updated = len(updates)
+    cursor.executemany('UPDATE songs SET duration = ? WHERE id = ?', updates)
+    conn.commit()
+    
+    if updated:
+        # Practice time totals depend on durations; refresh the daily rollup
+        from services.practice_rollup import rebuild_practice_rollup
+        rows = rebuild_practice_rollup(cursor)
+        conn.commit()
+        print(f"Rebuilt {rows} practice rollup row(s)")
+    
     conn.close()
     
     print(f"\n\nSummary:")
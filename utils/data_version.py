@@ -0,0 +1,84 @@
+"""Strong ETags for the list APIs, derived from the per-user data_versions counters."""
+
+import os
+from datetime import datetime, timedelta
+
+from flask import request, current_app
+from database import GLOBAL_DATA_VERSION_USER, get_db
+
+# Bump when a list payload changes shape so cached copies are not revalidated
+PAYLOAD_FORMAT = 1
+# Clients may keep the payload but must revalidate it on every use
+LIST_CACHE_CONTROL = 'private, no-cache'
+# Tombstones for delta sync; clients that were away longer get the full list
+SONG_CHANGE_LOG_RETENTION_DAYS = int(os.getenv('SONG_CHANGE_LOG_RETENTION_DAYS', '30'))
+
+
+def read_data_versions(cursor, user_id):
+    """Return (user_version, global_version) for user_id; missing rows count as 0."""
+    rows = cursor.execute(
+        'SELECT user_id, version FROM data_versions WHERE user_id IN (?, ?)',
+        (user_id, GLOBAL_DATA_VERSION_USER)
+    ).fetchall()
+    versions = {row['user_id']: row['version'] for row in rows}
+    return versions.get(user_id, 0), versions.get(GLOBAL_DATA_VERSION_USER, 0)
+
+
+def version_token(versions):
+    """Opaque "<user>.<global>" token clients hand back as ?since=."""
+    return '%d.%d' % versions
+
+
+def parse_version_token(token):
+    """Parse a version token into (user_version, global_version); raises ValueError."""
+    user_version, global_version = token.split('.')
+    return int(user_version), int(global_version)
+
+
+def data_version_etag(cursor, resource, user_id, *parts, versions=None):
+    """
+    ETag for `resource` as seen by user_id: the user's and the global data version
+    plus any extra `parts` that select the payload (e.g. a repertoire filter).
+    Reads only data_versions, so a match costs one primary key lookup.
+    """
+    user_version, global_version = versions or read_data_versions(cursor, user_id)
+    fields = [resource, PAYLOAD_FORMAT, user_id, *parts, user_version, global_version]
+    return '-'.join(str(field) for field in fields)
+
+
+def not_modified(etag):
+    """Return a 304 response when the request's If-None-Match already holds `etag`, else None."""
+    if not request.if_none_match.contains(etag):
+        return None
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = LIST_CACHE_CONTROL
+    return response
+
+
+def with_etag(response, etag):
+    """Attach the ETag and revalidation headers to a full list response."""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = LIST_CACHE_CONTROL
+    return response
+
+
+def change_log_floor(cursor, user_id):
+    """Highest song_change_log version pruned for user_id; deltas from before it are incomplete."""
+    row = cursor.execute('SELECT version FROM song_change_log_floor WHERE user_id = ?', (user_id,)).fetchone()
+    return row['version'] if row else 0
+
+
+def prune_song_change_log(now=None):
+    """Drop song_change_log rows older than the retention window, raising each user's floor. Returns rows deleted."""
+    cutoff = ((now or datetime.now()) - timedelta(days=SONG_CHANGE_LOG_RETENTION_DAYS)).isoformat()
+    with get_db() as conn:
+        conn.execute('''
+            INSERT INTO song_change_log_floor (user_id, version)
+            SELECT user_id, MAX(version) FROM song_change_log WHERE changed_at < ? GROUP BY user_id
+            ON CONFLICT(user_id) DO UPDATE SET version = MAX(version, excluded.version)
+        ''', (cutoff,))
+        deleted = conn.execute('DELETE FROM song_change_log WHERE changed_at < ?', (cutoff,)).rowcount
+    if deleted:
+        print(f'Pruned {deleted} song change log row(s)')
+    return deleted
@@ -1,27 +1,6 @@
-"""Helper functions for MP3 extraction and time calculations."""
+"""Helper functions for time calculations."""
 
-import os
 from datetime import datetime
-try:
-    from mutagen.mp3 import MP3
-    MUTAGEN_AVAILABLE = True
-except ImportError:
-    MUTAGEN_AVAILABLE = False
-
-
-def extract_mp3_duration(file_path):
-    """Extract duration in seconds from an MP3 file. Returns None if extraction fails."""
-    if not MUTAGEN_AVAILABLE or not file_path:
-        return None
-    try:
-        if not os.path.isfile(file_path):
-            return None
-        audio = MP3(file_path)
-        if audio.info.length:
-            return int(audio.info.length)
-    except Exception:
-        pass
-    return None
 
 
 def calculate_time_practiced_since(get_db, start_date_str, repertoire_id=None, user_id=None):
@@ -38,29 +17,18 @@ def calculate_time_practiced_since(get_db, start_date_str, repertoire_id=None, u
     with get_db() as conn:
         cursor = conn.cursor()
         
+        # Only songs with a known duration count here (measured_seconds)
+        query = '''
+            SELECT SUM(measured_seconds) as total_seconds
+            FROM practice_daily_rollup
+            WHERE user_id = ?
+            AND practice_date >= ?
+        '''
+        params = [user_id, start_date_str]
         if repertoire_id:
-            # Time for specific repertoire
-            query = '''
-                SELECT SUM(s.duration * pl.practice_count) as total_seconds
-                FROM practice_date_log pl
-                JOIN songs s ON pl.song_id = s.id
-                WHERE s.repertoire_id = ?
-                AND pl.user_id = ?
-                AND pl.practice_date >= ?
-                AND s.duration IS NOT NULL
-            '''
-            result = cursor.execute(query, (repertoire_id, user_id, start_date_str)).fetchone()
-        else:
-            # Total time across all repertoires
-            query = '''
-                SELECT SUM(s.duration * pl.practice_count) as total_seconds
-                FROM practice_date_log pl
-                JOIN songs s ON pl.song_id = s.id
-                WHERE pl.user_id = ?
-                AND pl.practice_date >= ?
-                AND s.duration IS NOT NULL
-            '''
-            result = cursor.execute(query, (user_id, start_date_str)).fetchone()
+            query += ' AND repertoire_id = ?'
+            params.append(repertoire_id)
+        result = cursor.execute(query, params).fetchone()
         
         total_seconds = result['total_seconds'] or 0
         hours = total_seconds // 3600
@@ -1,22 +1,21 @@
 """Permission and scope resolution utilities."""
 
 from flask import g, abort
+from utils.user_cache import get_cached_user
 
 
 def resolve_scope_user_id(get_db, requested_user_id):
     """
     Admin can request another user_id; others stay on their own.
     Returns the effective user_id for the request.
+    The requested user is looked up through the user cache rather than get_db.
     """
     current = getattr(g, 'current_user', None)
     if not current:
         return None
     if current['role'] == 'admin' and requested_user_id:
-        with get_db() as conn:
-            cursor = conn.cursor()
-            exists = cursor.execute('SELECT id FROM users WHERE id = ?', (requested_user_id,)).fetchone()
-            if exists:
-                return requested_user_id
+        if get_cached_user(requested_user_id):
+            return requested_user_id
     return current['id']
 
 
@@ -56,3 +55,40 @@ def require_song(cursor, song_id, scope_user_id=None):
     if g.current_user['role'] != 'admin' and song['owner_id'] != scope:
         abort(403)
     return song
+
+
+def require_job(cursor, job_id):
+    """
+    Fetch a background job and verify access permissions.
+    Raises 404 if not found, 403 if not authorized.
+    Returns the job row.
+    """
+    job = cursor.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    if not job:
+        abort(404)
+    if g.current_user['role'] != 'admin' and job['user_id'] != g.current_user['id']:
+        abort(403)
+    return job
+
+
+def accessible_song_ids(cursor, song_ids, scope_user_id=None):
+    """
+    Return the subset of song_ids the current user may modify, with the
+    same rules as require_song but in a single query.
+    """
+    song_ids = sorted(set(song_ids))
+    if not song_ids:
+        return set()
+    scope = scope_user_id or (g.current_user['id'] if g.current_user else None)
+    placeholders = ','.join('?' * len(song_ids))
+    rows = cursor.execute(
+        f'''
+        SELECT s.id, r.user_id AS owner_id
+        FROM songs s
+        JOIN repertoires r ON r.id = s.repertoire_id
+        WHERE s.id IN ({placeholders})
+        ''',
+        song_ids
+    ).fetchall()
+    is_admin = g.current_user['role'] == 'admin'
+    return {row['id'] for row in rows if is_admin or row['owner_id'] == scope}
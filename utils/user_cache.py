@@ -0,0 +1,107 @@
+"""In-process TTL/LRU caches for authenticated users and validated remember-me tokens."""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from database import get_db
+
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '1024'))
+# Other workers only see an account change once their entry expires
+USER_CACHE_TTL_SECONDS = float(os.getenv('USER_CACHE_TTL_SECONDS', '60'))
+
+
+class TTLCache:
+    """Thread-safe LRU mapping whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def discard_where(self, predicate):
+        """Drop every entry whose value matches `predicate`."""
+        with self._lock:
+            for key in [k for k, (v, _) in self._data.items() if predicate(v)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_users = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
+_remember_tokens = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
+
+
+def get_cached_user(user_id, min_version=0):
+    """
+    Return {'id', 'email', 'role', 'auth_version'} for a user, or None.
+    A cached record older than `min_version` (the stamp carried in the session) is reloaded.
+    """
+    if not user_id:
+        return None
+    user = _users.get(user_id)
+    if user is not None and user['auth_version'] >= min_version:
+        return user
+
+    with get_db() as conn:
+        row = conn.execute(
+            'SELECT id, email, role, auth_version FROM users WHERE id = ?',
+            (user_id,)
+        ).fetchone()
+    if not row:
+        _users.pop(user_id)
+        return None
+    user = dict(row)
+    _users.set(user_id, user)
+    return user
+
+
+def invalidate_user(user_id):
+    """Forget a user and any remember-me tokens cached for them."""
+    _users.pop(user_id)
+    _remember_tokens.discard_where(lambda token: token['user_id'] == user_id)
+
+
+def get_remember_token(token_id):
+    """Return the cached {'user_id', 'token_hash', 'expires_at'} of a validated token, or None."""
+    return _remember_tokens.get(token_id)
+
+
+def remember_token_validated(token_id, user_id, token_hash, expires_at):
+    """Cache a token that just passed hash and expiry checks."""
+    _remember_tokens.set(token_id, {
+        'user_id': user_id,
+        'token_hash': token_hash,
+        'expires_at': expires_at,
+    })
+
+
+def forget_remember_token(token_id):
+    _remember_tokens.pop(token_id)